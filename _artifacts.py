@@ -0,0 +1,178 @@
+# Lifecycle of the intermediate audio of a channel run, and admission by the disk space it takes.
+
+# Each processed video used to leave its full-size <video_id>.wav (about 700 MB per hour at 48 kHz stereo) next to
+# its transcript. Once _merged08.py has finished with it (fingerprint, transcription, diarization), --audio-policy decides:
+#   keep           leave it where it is, as before
+#   delete         remove it
+#   compress       re-encode it as <video_id>.opus (about 30 MB per hour) and remove the .wav
+#   keep-for-mp4   move it to the folder _wav_to_mp4_03.py converts (--mp4-dir), which deletes it after converting
+#                  when run with --delete-wav, its last consumer
+# A failed run keeps its .wav, so --resumable can reuse it.
+
+# _process_channel_videos02.py --spool-budget-gb pauses starting new videos while the audio in the working directory
+# (and the --mp4-dir queue) plus the expected downloads of the videos in progress would exceed the budget.
+
+import errno
+import glob
+import os
+import shutil
+import threading
+import time
+
+from _supervisor import run_supervised, file_sizes, FFMPEG_PROGRESS
+
+AUDIO_POLICIES = ["keep", "delete", "compress", "keep-for-mp4"]
+MP4_DIR = "./temp"  # the AUDIO_FOLDER of _wav_to_mp4_03.py
+# Downloads, yt-dlp's partial files and extracted audio
+SPOOL_PATTERNS = ["*.wav", "*.part", "*.ytdl", "*.webm", "*.m4a"]
+WAV_BYTES_PER_SECOND = 48000 * 2 * 2  # 48 kHz, stereo, 16-bit
+UNKNOWN_DURATION = 3600  # seconds assumed when the duration is unknown
+IDLE_WAIT = 600.0  # seconds an idle gate waits for a queue which is not shrinking
+
+
+def compress_audio(wav_path, stall_timeout=600.0):
+    """Re-encode a .wav as Opus next to it (atomically), remove the .wav, and return the new path."""
+    opus_path = os.path.splitext(wav_path)[0] + ".opus"
+    tmp_path = f"{opus_path}.tmp.opus"
+    try:
+        run_supervised(["ffmpeg", "-y", "-nostdin", "-progress", "pipe:1", "-nostats", "-i", wav_path,
+                        "-c:a", "libopus", "-b:a", "48k", tmp_path],
+                       check=True, capture_output=True, progress_pattern=FFMPEG_PROGRESS, stall_timeout=stall_timeout)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, opus_path)
+    os.remove(wav_path)
+    return opus_path
+
+
+def move_atomically(path, destination):
+    """
+    Move a file so that destination never holds a partial copy, also to another filesystem (e.g., a media disk).
+
+    _wav_to_mp4_03.py --watch picks up every new .wav, so a copy is written under a .part name and renamed when complete.
+    """
+    try:
+        os.replace(path, destination)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    tmp_path = f"{destination}.part"
+    try:
+        shutil.copyfile(path, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, destination)
+    os.remove(path)
+
+
+def finish_audio(wav_path, policy, mp4_dir=MP4_DIR):
+    """
+    Apply the audio policy to a .wav every consumer in _merged08.py is done with.
+
+    Returns:
+        str: What happened, for the log.
+
+    Raises:
+        subprocess.CalledProcessError: If compressing failed (the .wav is kept then).
+    """
+    if policy == "keep" or not os.path.exists(wav_path):
+        return f"kept {wav_path}" if policy == "keep" else f"no {wav_path} to clean up"
+    size = os.path.getsize(wav_path)
+    if policy == "delete":
+        os.remove(wav_path)
+        return f"deleted {wav_path} ({size / (1 << 20):.0f} MB)"
+    if policy == "compress":
+        opus_path = compress_audio(wav_path)
+        return f"compressed {wav_path} to {opus_path} ({size / (1 << 20):.0f} MB -> {os.path.getsize(opus_path) / (1 << 20):.0f} MB)"
+    if policy == "keep-for-mp4":
+        os.makedirs(mp4_dir, exist_ok=True)
+        destination = os.path.join(mp4_dir, os.path.basename(wav_path))
+        move_atomically(wav_path, destination)
+        return f"moved {wav_path} to {destination} for the .mp4 conversion"
+    raise ValueError(f"Unknown audio policy: {policy}")
+
+
+def spool_bytes(directories):
+    """The size of the audio intermediates in the directories."""
+    total = 0
+    for directory in directories:
+        for pattern in SPOOL_PATTERNS:
+            for path in glob.glob(os.path.join(directory, pattern)):
+                try:
+                    total += os.path.getsize(path)
+                except OSError:
+                    # Renamed or removed while listing
+                    pass
+    return total
+
+
+class SpoolGate:
+    """
+    Admit videos while the audio on disk plus the downloads still expected from the videos in progress fits the budget.
+
+    A video in progress is expected to grow to WAV_BYTES_PER_SECOND times its duration; what it has already written
+    is counted on disk, so only the rest is reserved. With nothing in progress one video is always admitted,
+    unless there is audio in the wait_on directories: another program (e.g., _wav_to_mp4_03.py --delete-wav on the
+    --mp4-dir queue) frees those, so the gate waits for it. Audio left elsewhere is nobody's to free and never holds an idle gate.
+    An idle gate whose queue has not shrunk for idle_wait seconds (the converter is not running) admits the video anyway.
+    """
+
+    def __init__(self, directories, budget_bytes, wait_on=(), poll_interval=10.0, idle_wait=IDLE_WAIT):
+        self.directories = directories
+        self.budget_bytes = budget_bytes
+        self.wait_on = wait_on
+        self.poll_interval = poll_interval
+        self.idle_wait = idle_wait
+        self.in_progress = {}  # video_id -> expected bytes
+        self.changed = threading.Condition()
+
+    def expected_bytes(self, seconds):
+        return (seconds or UNKNOWN_DURATION) * WAV_BYTES_PER_SECOND
+
+    def reserved_bytes(self):
+        reserved = 0
+        for video_id, expected in self.in_progress.items():
+            written = sum(file_sizes(os.path.join(directory, f"{glob.escape(video_id)}.*")) for directory in self.directories)
+            reserved += max(0, expected - written)
+        return reserved
+
+    def acquire(self, video_id, seconds):
+        expected = self.expected_bytes(seconds)
+        paused = False
+        queued, shrunk = None, time.monotonic()
+        with self.changed:
+            while True:
+                used = spool_bytes(self.directories) + self.reserved_bytes()
+                if used + expected <= self.budget_bytes:
+                    break
+                if not self.in_progress:
+                    # Waiting while idle only makes sense if there is audio in a queue someone else empties
+                    previous, queued = queued, spool_bytes(self.wait_on)
+                    if not queued:
+                        break
+                    if previous is None or queued < previous:
+                        shrunk = time.monotonic()
+                    elif time.monotonic() - shrunk >= self.idle_wait:
+                        print(f"The audio queue has not shrunk for {self.idle_wait:.0f} seconds (is _wav_to_mp4_03.py --delete-wav "
+                              f"running?): starting {video_id} over budget")
+                        paused = False
+                        break
+                if not paused:
+                    print(f"Spool over budget ({used / (1 << 30):.1f} GB in use or expected, {expected / (1 << 30):.1f} GB more "
+                          f"needed, budget {self.budget_bytes / (1 << 30):.1f} GB): pausing before {video_id}")
+                    paused = True
+                self.changed.wait(timeout=self.poll_interval)
+            self.in_progress[video_id] = expected
+        if paused:
+            print(f"Spool has room again: starting {video_id}")
+
+    def release(self, video_id):
+        with self.changed:
+            self.in_progress.pop(video_id, None)
+            self.changed.notify_all()
+
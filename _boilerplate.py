@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _boilerplate.py ./ --min-videos 5
+
+# Finds the intros, sponsor reads and outros a channel repeats in every video, and writes transcripts without them.
+
+# Every segment of every merged transcript (<video_id>.json) is reduced to a MinHash signature of its word 3-grams.
+# Locality sensitive hashing splits each signature into bands: segments which share a band are near-duplicates.
+# A segment is flagged as boilerplate when it shares a band with segments from more than --min-videos different videos.
+# Bucketing and counting are done with NumPy over all signatures at once, so hundreds of thousands of segments
+# are handled in seconds on one machine.
+
+# The originals are left alone. Next to each transcript this script writes:
+#   <video_id>.filtered.json   the transcript without boilerplate segments
+#   <video_id>.filtered.txt    the matching segmented .txt file
+# and boilerplate_report.json lists the most repeated boilerplate texts.
+
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+from _transcripts import find_transcripts
+from _speakers import write_transcript_json, write_segment_txt
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def normalize(text):
+    """Lowercase and keep only words, so punctuation and casing do not hide duplicates."""
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def shingle_hashes(words, size=3):
+    """Hash the word n-grams of a segment to 32-bit integers."""
+    if len(words) < size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in shingles], dtype=np.uint64)
+
+
+class MinHasher:
+    """MinHash with universal hash functions h(x) = (a * x + b) mod p, truncated to 32 bits."""
+
+    def __init__(self, num_perm, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        # a and x are below 2**32, so a * x + b does not overflow 64 bits
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def flag_boilerplate(signatures, video_index, bands, min_videos):
+    """
+    Flag every signature which shares an LSH band with signatures from more than min_videos videos.
+
+    Args:
+        signatures: (segments, bands * rows) uint32 array.
+        video_index: (segments,) array with the video each segment belongs to.
+        bands: The number of LSH bands.
+        min_videos: Segments repeated in more videos than this are flagged.
+
+    Returns:
+        (flags, videos_seen): A boolean array, and for each segment the largest number of videos sharing one of its bands.
+    """
+    rows = signatures.shape[1] // bands
+    n_videos = int(video_index.max()) + 1
+    videos_seen = np.zeros(len(signatures), dtype=np.int64)
+    for band in range(bands):
+        band_values = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        # View each band as a single opaque value so np.unique groups identical bands
+        keys = band_values.view(np.dtype((np.void, band_values.dtype.itemsize * rows))).ravel()
+        _, bucket = np.unique(keys, return_inverse=True)
+        bucket = bucket.ravel()
+        # Count the distinct videos in each bucket
+        pairs = np.unique(bucket.astype(np.int64) * n_videos + video_index)
+        videos_per_bucket = np.bincount(pairs // n_videos, minlength=bucket.max() + 1)
+        videos_seen = np.maximum(videos_seen, videos_per_bucket[bucket])
+    return videos_seen > min_videos, videos_seen
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Detect intros, outros and sponsor reads repeated across a channel's videos and write filtered transcripts.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns or merged <video_id>.json files of one channel.")
+    parser.add_argument("--min-videos", type=int, default=5, help="Flag segments whose near-duplicates appear in more than this many videos.")
+    parser.add_argument("--min-words", type=int, default=4, help="Never flag segments with fewer words than this (e.g., \"Thank you.\").")
+    parser.add_argument("--bands", type=int, default=16, help="The number of LSH bands.")
+    parser.add_argument("--rows", type=int, default=4, help="The number of MinHash values per band. More rows means stricter matching.")
+    parser.add_argument("--report", default="boilerplate_report.json", help="Where to write the report of repeated texts.")
+    args = parser.parse_args()
+
+    json_files = find_transcripts(args.inputs)
+    started = time.time()
+    hasher = MinHasher(args.bands * args.rows)
+
+    # Pass 1: a signature for every segment long enough to be considered
+    signatures = []
+    video_index = []
+    refs = []  # (file number, segment number) of each signature
+    transcripts = []
+    for json_file in json_files:
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                segments = json.load(f)['segments']
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            print(f"Skipping {json_file}: {e}")
+            continue
+        file_number = len(transcripts)
+        transcripts.append(json_file)
+        for segment_number, segment in enumerate(segments):
+            words = normalize(segment['text'])
+            if len(words) < args.min_words:
+                continue
+            signatures.append(hasher.signature(shingle_hashes(words)))
+            video_index.append(file_number)
+            refs.append((file_number, segment_number))
+
+    if not signatures:
+        print("No segments found. Nothing to filter.")
+        exit(0)
+
+    flags, videos_seen = flag_boilerplate(np.vstack(signatures), np.array(video_index, dtype=np.int64), args.bands, args.min_videos)
+    print(f"Indexed {len(signatures)} segments from {len(transcripts)} videos in {time.time() - started:.1f} seconds. "
+          f"{int(flags.sum())} segments flagged as boilerplate.")
+
+    flagged_by_file = {}
+    for (file_number, segment_number), flagged, seen in zip(refs, flags, videos_seen):
+        if flagged:
+            flagged_by_file.setdefault(file_number, {})[segment_number] = int(seen)
+
+    # Pass 2: filtered transcripts next to the originals
+    repeated = {}  # normalized text -> number of videos it was seen in
+    for file_number, json_file in enumerate(transcripts):
+        with open(json_file, 'r', encoding='utf-8') as f:
+            transcript_data = json.load(f)
+        flagged = flagged_by_file.get(file_number, {})
+        kept = []
+        for segment_number, segment in enumerate(transcript_data['segments']):
+            if segment_number in flagged:
+                text = ' '.join(normalize(segment['text']))
+                repeated[text] = max(repeated.get(text, 0), flagged[segment_number])
+            else:
+                kept.append(segment)
+        transcript_data['segments'] = kept
+        transcript_data['text'] = ''.join(segment['text'] for segment in kept)
+
+        base = os.path.splitext(json_file)[0]
+        if 'metadata' in transcript_data:
+            write_transcript_json(f"{base}.filtered.json", transcript_data)
+        else:
+            with open(f"{base}.filtered.json", 'w') as f:
+                json.dump(transcript_data, f, indent=4)
+        if all('speaker' in segment for segment in kept):
+            write_segment_txt(f"{base}.filtered.txt", kept)
+
+    with open(args.report, 'w', encoding='utf-8') as f:
+        report = sorted(repeated.items(), key=lambda item: item[1], reverse=True)
+        json.dump([{"text": text, "videos": videos} for text, videos in report], f, indent=4)
+    print(f"Filtered transcripts written in {time.time() - started:.1f} seconds. Report saved: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
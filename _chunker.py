@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _chunker.py ./ --output chunks.jsonl --max-tokens 1200
+
+# Builds RAG chunks from the merged transcripts (<video_id>.json) written by _merged08.py.
+
+# The <video_id>.txt files have one line per Whisper segment and LightRAG re-chunks them blindly,
+# splitting in the middle of an utterance and across speakers.
+# This script packs whole speaker turns (consecutive segments with the same speaker) into chunks within a token budget.
+# A turn is only split when it does not fit in a chunk on its own, and then at segment boundaries
+# (a single segment longer than the budget is split between words).
+
+# Each chunk is one line of JSONL with its content and provenance:
+# {"id", "video_id", "source", "channel", "title", "url", "start", "end", "speakers", "turns", "tokens", "content"}
+# The content uses the same "[start > end] (speaker) text" lines as <video_id>.txt, one line per turn.
+
+# Transcripts are read and written one at a time, so memory stays bounded however large the channel is.
+# Tokens are counted with tiktoken (the tokenizer LightRAG uses) when it is installed and its encoding can be loaded,
+# otherwise estimated from the word count.
+
+import argparse
+import json
+import os
+import time
+
+from _transcripts import find_transcripts
+
+_encoding = None  # tiktoken's encoding, loaded on first use (it may be downloaded then); False if unavailable
+
+
+def count_tokens(text):
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except ImportError:
+            _encoding = False
+        except Exception as e:
+            # Installed, but the encoding could not be downloaded (e.g., offline)
+            print(f"Could not load the tiktoken encoding, estimating token counts from word counts: {e}")
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    # About 4 tokens for every 3 English words
+    return (len(text.split()) * 4 + 2) // 3
+
+
+def speaker_turns(segments):
+    """Group consecutive segments with the same speaker into turns."""
+    turns = []
+    for segment in segments:
+        if not segment['text'].strip():
+            continue
+        if turns and turns[-1][0]['speaker'] == segment['speaker']:
+            turns[-1].append(segment)
+        else:
+            turns.append([segment])
+    return turns
+
+
+def turn_line(segments):
+    start = round(segments[0]['start'], 2)
+    end = round(segments[-1]['end'], 2)
+    text = ' '.join(segment['text'].strip() for segment in segments)
+    return f"[{start} > {end}] ({segments[0]['speaker']}) {text}"
+
+
+def split_segment(segment, max_tokens):
+    """Split a segment whose text alone exceeds the budget into pieces between words, spreading its time evenly."""
+    words = segment['text'].split()
+    pieces = []
+    piece = []
+    for word in words:
+        if piece and count_tokens(' '.join(piece + [word])) > max_tokens:
+            pieces.append(piece)
+            piece = []
+        piece.append(word)
+    if piece:
+        pieces.append(piece)
+
+    duration = (segment['end'] - segment['start']) / len(words)
+    position = 0
+    for piece in pieces:
+        yield {
+            'start': segment['start'] + position * duration,
+            'end': segment['start'] + (position + len(piece)) * duration,
+            'speaker': segment['speaker'],
+            'text': ' '.join(piece),
+        }
+        position += len(piece)
+
+
+def chunk_transcript(segments, max_tokens):
+    """
+    Pack speaker turns into chunks of at most max_tokens.
+
+    Yields:
+        list: The turns of one chunk, each a list of segments with the same speaker.
+    """
+    chunk = []
+    chunk_tokens = 0
+
+    def add(turn, tokens):
+        nonlocal chunk_tokens
+        if chunk and chunk[-1][0]['speaker'] == turn[0]['speaker']:
+            chunk[-1].extend(turn)  # continuation of a turn split across chunks
+        else:
+            chunk.append(turn)
+        chunk_tokens += tokens
+
+    for turn in speaker_turns(segments):
+        tokens = count_tokens(turn_line(turn))
+        if chunk and chunk_tokens + tokens > max_tokens:
+            yield chunk
+            chunk, chunk_tokens = [], 0
+        if tokens <= max_tokens:
+            add(turn, tokens)
+            continue
+
+        # The turn does not fit in a chunk on its own: split it at segment boundaries
+        for segment in turn:
+            pieces = [segment] if count_tokens(turn_line([segment])) <= max_tokens else split_segment(segment, max_tokens)
+            for piece in pieces:
+                piece_tokens = count_tokens(turn_line([piece]))
+                if chunk and chunk_tokens + piece_tokens > max_tokens:
+                    yield chunk
+                    chunk, chunk_tokens = [], 0
+                add([piece], piece_tokens)
+    if chunk:
+        yield chunk
+
+
+def chunk_records(json_file, max_tokens):
+    """Yield the JSONL records for one transcript."""
+    video_id = os.path.basename(json_file).split('.')[0]
+    with open(json_file, 'r', encoding='utf-8') as f:
+        transcript_data = json.load(f)
+    metadata = transcript_data['metadata']
+
+    for number, chunk in enumerate(chunk_transcript(transcript_data['segments'], max_tokens)):
+        lines = [turn_line(turn) for turn in chunk]
+        content = '\n'.join(lines)
+        yield {
+            "id": f"{video_id}-{number:04d}",
+            "video_id": video_id,
+            "source": f"{video_id}.txt",
+            "channel": metadata['channelName'],
+            "title": metadata['videoTitle'],
+            "url": metadata['url'],
+            "start": chunk[0][0]['start'],
+            "end": chunk[-1][-1]['end'],
+            "speakers": list(dict.fromkeys(turn[0]['speaker'] for turn in chunk)),
+            "turns": [{"speaker": turn[0]['speaker'], "start": turn[0]['start'], "end": turn[-1]['end']} for turn in chunk],
+            "tokens": count_tokens(content),
+            "content": content,
+        }
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Build speaker-turn-aligned, token-bounded RAG chunks from merged transcripts.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns or merged <video_id>.json files.")
+    parser.add_argument("--output", default="chunks.jsonl", help="The JSONL file to write.")
+    parser.add_argument("--max-tokens", type=int, default=1200, help="The token budget per chunk.")
+    parser.add_argument("--filtered", action="store_true", help="Use the transcripts without boilerplate (<video_id>.filtered.json) where they exist.")
+    args = parser.parse_args()
+
+    if args.max_tokens < 1:
+        print("Error: --max-tokens must be at least 1.")
+        exit(1)
+
+    json_files = find_transcripts(args.inputs, filtered=args.filtered)
+    started = time.time()
+    chunks = 0
+    failures = 0
+    with open(args.output, 'w', encoding='utf-8') as out:
+        for json_file in json_files:
+            try:
+                for record in chunk_records(json_file, args.max_tokens):
+                    out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    chunks += 1
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                # Raw Whisper output and other JSON files without metadata or speakers end up here
+                print(f"Skipping {json_file}: {e}")
+                failures += 1
+
+    elapsed = time.time() - started
+    print(f"Wrote {chunks} chunks from {len(json_files) - failures} transcripts to {args.output} in {elapsed:.1f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
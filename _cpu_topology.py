@@ -0,0 +1,128 @@
+# CPU placement for running several _merged08.py processes side by side (see _process_channel_videos02.py --workers).
+
+# torch, Whisper and pyannote each default to one thread per core, so N processes on an N core machine run N x N threads
+# and spend their time preempting each other. Each worker instead gets its own set of cores (sched_setaffinity) and
+# a matching thread count (OMP_NUM_THREADS etc. for the BLAS pools, --asr-threads/--diar-threads for torch).
+# Worker sets stay within one NUMA node unless there are fewer workers than nodes, and hyperthread siblings stay in the same set.
+
+import glob
+import os
+import re
+
+
+def parse_cpu_list(text):
+    """Parse a kernel CPU list such as "0-3,8-11" into a list of CPU numbers."""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def available_cpus():
+    """The CPUs this process may run on (which respects taskset and container limits), in order."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not Linux
+        return list(range(os.cpu_count() or 1))
+
+
+def read_cpu_list(path):
+    try:
+        with open(path, 'r') as f:
+            return parse_cpu_list(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def numa_nodes(cpus=None):
+    """
+    Group the available CPUs by NUMA node, with hyperthread siblings next to each other.
+
+    Returns:
+        list: One list of CPU numbers per node. A single node when the topology cannot be read.
+    """
+    cpus = available_cpus() if cpus is None else cpus
+    allowed = set(cpus)
+    nodes = []
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist"), key=lambda p: int(re.findall(r'node(\d+)', p)[-1])):
+        node = [cpu for cpu in read_cpu_list(path) or [] if cpu in allowed]
+        if node:
+            nodes.append(node)
+    if sorted(cpu for node in nodes for cpu in node) != sorted(allowed):
+        nodes = [sorted(allowed)]
+    return [order_siblings(node) for node in nodes]
+
+
+def order_siblings(cpus):
+    """Order CPUs so that the hyperthreads of one physical core are adjacent (and so end up in the same worker)."""
+    ordered = []
+    seen = set()
+    for cpu in cpus:
+        if cpu in seen:
+            continue
+        siblings = read_cpu_list(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") or [cpu]
+        for sibling in [cpu] + [s for s in siblings if s != cpu and s in cpus]:
+            if sibling not in seen:
+                seen.add(sibling)
+                ordered.append(sibling)
+    return ordered
+
+
+def plan_workers(workers, nodes=None):
+    """
+    Split the CPUs into disjoint sets, one per worker.
+
+    Workers are spread over the NUMA nodes in proportion to their size, and each node's CPUs are divided among its
+    workers in contiguous blocks. With more workers than nodes' CPUs allow, the sets are as even as possible.
+
+    Returns:
+        list: workers lists of CPU numbers.
+    """
+    nodes = numa_nodes() if nodes is None else nodes
+    total = sum(len(node) for node in nodes)
+    workers = max(1, min(workers, total))
+    if workers < len(nodes):
+        # Fewer workers than nodes: sets spanning nodes are better than idle nodes
+        nodes = [[cpu for node in nodes for cpu in node]]
+    # Workers per node, proportional to the node's CPUs (largest remainders first), at least one CPU each
+    shares = [workers * len(node) / total for node in nodes]
+    counts = [int(share) for share in shares]
+    for i in sorted(range(len(nodes)), key=lambda i: shares[i] - counts[i], reverse=True)[:workers - sum(counts)]:
+        counts[i] += 1
+    plan = []
+    for node, count in zip(nodes, counts):
+        count = min(count, len(node))
+        for k in range(count):
+            plan.append(node[k * len(node) // count:(k + 1) * len(node) // count])
+    return plan
+
+
+def thread_environment(threads, environment=None):
+    """A copy of the environment with the OpenMP and BLAS thread pools limited to threads."""
+    environment = dict(os.environ if environment is None else environment)
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        environment[name] = str(threads)
+    return environment
+
+
+def pin_to(cpus):
+    """A preexec_fn for subprocess.Popen which pins the child to cpus (does nothing where affinity is not supported)."""
+    def pin():
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+    return pin
+
+
+def describe_cpus(cpus):
+    """Format CPU numbers as a kernel CPU list, e.g., "0-3,8-11"."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
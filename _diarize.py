@@ -0,0 +1,373 @@
+# Diarization stage shared by _merged08.py and _recluster.py.
+
+# The expensive part of pyannote's speaker diarization is the segmentation and embedding inference.
+# diarize() saves both to <video_id>.diarization.npz while the pipeline runs.
+# recluster() rebuilds the diarization from that file with other clustering settings in seconds,
+# repeating only the clustering and reconstruction steps of SpeakerDiarization.apply() (pyannote.audio 3.3).
+# The same file checkpoints a running diarization: diarize(resume=True) continues after the last finished stage.
+
+# diarize_windowed() diarizes very long recordings (5-10 hour streams) in overlapping windows with bounded memory
+# and links the speakers of the windows by embedding similarity.
+
+import json
+import os
+import warnings
+
+import numpy as np
+from pyannote.audio import Pipeline
+from pyannote.audio.utils.signal import binarize
+from pyannote.core import Annotation, SlidingWindow, SlidingWindowFeature
+
+from _stream_audio import AudioBuffer, SAMPLE_RATE as STREAM_SAMPLE_RATE
+
+
+def load_pipeline():
+    """Load the pretrained pyannote speaker diarization pipeline."""
+    return Pipeline.from_pretrained(
+        "pyannote/speaker-diarization",
+        use_auth_token=os.environ["HuggingFace_API_KEY"]
+    )
+
+
+def embedding_cache_path(video_id):
+    return f"{video_id}.diarization.npz"
+
+
+def save_embedding_cache(path, uri, segmentations, embeddings=None):
+    """Save segmentation scores and speaker embeddings from a pipeline run (embeddings=None checkpoints the segmentation alone)."""
+    window = segmentations.sliding_window
+    arrays = {
+        "uri": np.array(uri),
+        "segmentation": segmentations.data.astype(np.float32),
+        "window": np.array([window.start, window.duration, window.step]),
+    }
+    if embeddings is not None:
+        arrays["embeddings"] = embeddings.astype(np.float32)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_embedding_cache(path):
+    """Return (uri, segmentations, embeddings) saved by save_embedding_cache(). embeddings is None for a segmentation checkpoint."""
+    with np.load(path) as cache:
+        start, duration, step = cache['window']
+        segmentations = SlidingWindowFeature(
+            cache['segmentation'],
+            SlidingWindow(start=start, duration=duration, step=step),
+        )
+        embeddings = cache['embeddings'] if 'embeddings' in cache.files else None
+        return str(cache['uri']), segmentations, embeddings
+
+
+def binarize_segmentations(pipeline, segmentations):
+    """Binarize segmentation scores as SpeakerDiarization.apply() does."""
+    if pipeline._segmentation.model.specifications.powerset:
+        return segmentations
+    return binarize(segmentations, onset=pipeline.segmentation.threshold, initial_state=False)
+
+
+def diarize(pipeline, audio, video_id, cache_path=None, resume=False):
+    """
+    Run the pipeline on an audio file and save its segmentation and embeddings for later re-clustering.
+
+    The cache doubles as a checkpoint: the segmentation is saved as soon as that stage finishes,
+    and the embeddings once they have been computed. With resume=True an existing cache is picked up
+    and only the stages after it are run.
+
+    Args:
+        pipeline: A loaded pyannote SpeakerDiarization pipeline.
+        audio: The audio file (or a pyannote {"waveform", "sample_rate"} dict).
+        video_id: Used as the uri of the diarization.
+        cache_path: Where to save the segmentation and embeddings, or None to not save them.
+        resume: Whether to continue from the stages already in cache_path.
+
+    Returns:
+        pyannote.core.Annotation: The diarization.
+    """
+    file = {"uri": video_id, "audio": audio} if isinstance(audio, str) else {"uri": video_id, **audio}
+
+    if resume and cache_path is not None and os.path.exists(cache_path):
+        uri, segmentations, embeddings = load_embedding_cache(cache_path)
+        if uri == video_id:
+            if embeddings is None:
+                print(f"Resuming diarization of {video_id} after the segmentation stage")
+                binarized_segmentations = binarize_segmentations(pipeline, segmentations)
+                count = pipeline.speaker_count(binarized_segmentations, pipeline._segmentation.model.receptive_field, warm_up=(0.0, 0.0))
+                if np.nanmax(count.data) == 0.0:
+                    # Nobody ever speaks: the pipeline returns an empty diarization without computing embeddings
+                    return Annotation(uri=video_id)
+                embeddings = pipeline.get_embeddings(file, binarized_segmentations, exclude_overlap=pipeline.embedding_exclude_overlap)
+                save_embedding_cache(cache_path, video_id, segmentations, embeddings)
+                print(f"Diarization embeddings cached: {cache_path}")
+            else:
+                print(f"Resuming diarization of {video_id} after the embedding stage")
+            return recluster(pipeline, cache_path)
+
+    artifacts = {}
+
+    def hook(step_name, step_artifact, file=None, total=None, completed=None):
+        # Progress updates come first (with partial or no artifacts), the complete artifact of each step comes last
+        if step_artifact is not None and step_name in ("segmentation", "embeddings"):
+            artifacts[step_name] = step_artifact
+            if step_name == "segmentation" and completed is None and cache_path is not None:
+                # Checkpoint the finished segmentation stage before the long embedding stage starts
+                save_embedding_cache(cache_path, video_id, step_artifact)
+
+    diarization = pipeline(file, hook=hook)
+
+    if cache_path is not None:
+        if "segmentation" in artifacts and "embeddings" in artifacts:
+            save_embedding_cache(cache_path, video_id, artifacts["segmentation"], artifacts["embeddings"])
+            print(f"Diarization embeddings cached: {cache_path}")
+        else:
+            # The pipeline returns early when nobody ever speaks, before embeddings are computed
+            print(f"No embeddings to cache for {video_id}.")
+    return diarization
+
+
+def window_bounds(duration, window, overlap):
+    """Return (start, end, owned_start, owned_end) for each window. Each moment is owned by exactly one window."""
+    step = window - overlap
+    starts = [0.0]
+    while starts[-1] + window < duration:
+        starts.append(starts[-1] + step)
+    bounds = []
+    for k, start in enumerate(starts):
+        end = min(start + window, duration)
+        owned_start = 0.0 if k == 0 else start + overlap / 2
+        owned_end = duration if k == len(starts) - 1 else end - overlap / 2
+        bounds.append((start, end, owned_start, owned_end))
+    return bounds
+
+
+def link_speakers(windows, threshold):
+    """
+    Link the local speakers of consecutive windows into global speakers.
+
+    Every window's speakers are matched to the global speakers found so far by the cosine distance between their
+    embedding and the global speaker's centroid (Hungarian assignment, so two local speakers never share a global one).
+    Matches further apart than threshold start a new global speaker. A local speaker without a usable embedding
+    (too little clean speech) is linked to the global speaker it overlaps most in the previous window, if any.
+
+    Args:
+        windows: [{"turns": [[start, end, label], ...], "labels": [...], "embeddings": [[...], ...]}] in time order.
+        threshold: The largest cosine distance at which two speakers are the same person.
+
+    Returns:
+        list: One {local label: global speaker number} dict per window.
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    centroids = []  # duration-weighted sums of unit embeddings, one per global speaker (None until it has one)
+    mappings = []
+    previous_turns = []  # (start, end, global speaker) of the previous window
+    for window in windows:
+        labels = window["labels"]
+        if not labels:
+            # No speech in this window
+            mappings.append({})
+            previous_turns = []
+            continue
+        embeddings = np.array(window["embeddings"], dtype=np.float64)
+        if embeddings.ndim != 2 or len(embeddings) != len(labels):
+            embeddings = np.zeros((len(labels), 0))
+        # pyannote returns NaN rows for speakers with too little clean speech, and zero rows past the detected count
+        usable = [i for i in range(len(labels))
+                  if embeddings.shape[1] and np.all(np.isfinite(embeddings[i])) and np.linalg.norm(embeddings[i]) > 0]
+        durations = {label: 0.0 for label in labels}
+        for start, end, label in window["turns"]:
+            durations[label] += end - start
+
+        mapping = {}
+        candidates = [speaker for speaker, centroid in enumerate(centroids) if centroid is not None]
+        if candidates and usable:
+            local = embeddings[usable] / np.linalg.norm(embeddings[usable], axis=1, keepdims=True)
+            known = np.array([centroids[speaker] for speaker in candidates])
+            known = known / np.maximum(np.linalg.norm(known, axis=1, keepdims=True), 1e-12)
+            cost = 1.0 - local @ known.T
+            for row, column in zip(*linear_sum_assignment(cost)):
+                if cost[row, column] <= threshold:
+                    mapping[labels[usable[row]]] = candidates[column]
+
+        for i, label in enumerate(labels):
+            if label in mapping:
+                continue
+            if i not in usable:
+                overlap = {}
+                for start, end, local_label in window["turns"]:
+                    if local_label != label:
+                        continue
+                    for previous_start, previous_end, speaker in previous_turns:
+                        shared = min(end, previous_end) - max(start, previous_start)
+                        if shared > 0:
+                            overlap[speaker] = overlap.get(speaker, 0.0) + shared
+                taken = set(mapping.values())
+                candidates = [speaker for speaker in sorted(overlap, key=overlap.get, reverse=True) if speaker not in taken]
+                if candidates:
+                    mapping[label] = candidates[0]
+                    continue
+            mapping[label] = len(centroids)
+            centroids.append(None)
+
+        for i in usable:
+            speaker = mapping[labels[i]]
+            unit = embeddings[i] / np.linalg.norm(embeddings[i])
+            weighted = unit * max(durations[labels[i]], 1e-3)
+            centroids[speaker] = weighted if centroids[speaker] is None else centroids[speaker] + weighted
+        mappings.append(mapping)
+        previous_turns = [(start, end, mapping[label]) for start, end, label in window["turns"]]
+    return mappings
+
+
+def load_window_checkpoint(path, video_id, window, overlap):
+    """Return the finished windows saved by diarize_windowed(), or [] if there are none for these settings."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+    if (data.get("video_id"), data.get("window"), data.get("overlap")) != (video_id, window, overlap):
+        return []
+    return data["windows"]
+
+
+def save_window_checkpoint(path, video_id, window, overlap, windows):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"video_id": video_id, "window": window, "overlap": overlap, "windows": windows}, f)
+    os.replace(tmp_path, path)
+
+
+def diarize_windowed(pipeline, audio, video_id, window=1800.0, overlap=120.0, threshold=None, checkpoint_path=None):
+    """
+    Diarize a long recording in fixed-length overlapping windows, so peak memory depends on the window and not on the duration.
+
+    Each window is read from the file (or the streamed AudioBuffer) on its own and diarized by the pipeline, which also returns one embedding per
+    local speaker. The local speakers are then linked across windows into global SPEAKER_00, SPEAKER_01, ... labels
+    (see link_speakers), and each window contributes the turns of the part it owns: the overlap is split in the middle.
+
+    Args:
+        pipeline: A loaded pyannote SpeakerDiarization pipeline.
+        audio: The audio file, a pyannote {"waveform", "sample_rate"} dict, or a finished _stream_audio.AudioBuffer.
+        video_id: Used as the uri of the diarization.
+        window, overlap: The window length and the overlap between consecutive windows, in seconds.
+        threshold: The cosine distance for linking speakers. Defaults to the pipeline's clustering threshold.
+        checkpoint_path: A JSON file where each finished window is saved. A new run continues after the last saved window.
+
+    Returns:
+        pyannote.core.Annotation: The diarization, like diarize() returns.
+    """
+    from pyannote.audio import Audio
+    from pyannote.core import Segment
+
+    if overlap >= window:
+        raise ValueError("The overlap must be shorter than the window.")
+    if threshold is None:
+        threshold = pipeline.clustering.threshold
+
+    if isinstance(audio, AudioBuffer):
+        # Streamed audio: each window is read from the buffer (or its spill file) when it is reached,
+        # instead of turning the whole recording into one waveform
+        import torch
+        duration = audio.duration
+
+        def crop(start, end):
+            samples = audio.read(int(start * STREAM_SAMPLE_RATE), int((end - start) * STREAM_SAMPLE_RATE))
+            return torch.from_numpy(samples)[None], STREAM_SAMPLE_RATE
+    else:
+        file = {"uri": video_id, "audio": audio} if isinstance(audio, str) else {"uri": video_id, **audio}
+        loader = Audio(mono="downmix")
+        duration = loader.get_duration(file)
+
+        def crop(start, end):
+            return loader.crop(file, Segment(start, end))
+    bounds = window_bounds(duration, window, overlap)
+
+    windows = load_window_checkpoint(checkpoint_path, video_id, window, overlap) if checkpoint_path else []
+    if windows:
+        print(f"Resuming windowed diarization of {video_id} after window {len(windows)}/{len(bounds)}")
+    for k in range(len(windows), len(bounds)):
+        start, end, _, _ = bounds[k]
+        # Only this window's samples are read
+        waveform, sample_rate = crop(start, end)
+        local, embeddings = pipeline({"uri": f"{video_id}_{k}", "waveform": waveform, "sample_rate": sample_rate}, return_embeddings=True)
+        labels = local.labels()
+        windows.append({
+            "turns": [[turn.start + start, turn.end + start, label] for turn, _, label in local.itertracks(yield_label=True)],
+            "labels": labels,
+            "embeddings": np.asarray(embeddings)[:len(labels)].tolist() if embeddings is not None else [],
+        })
+        if checkpoint_path:
+            save_window_checkpoint(checkpoint_path, video_id, window, overlap, windows)
+        print(f"Diarized window {k + 1}/{len(bounds)} ({start / 60:.0f}-{end / 60:.0f} min): {len(labels)} speakers")
+
+    mappings = link_speakers(windows, threshold)
+
+    # Number the global speakers in order of first appearance, like a whole-file run
+    diarization = Annotation(uri=video_id)
+    names = {}
+    turns = []
+    for (_, _, owned_start, owned_end), result, mapping in zip(bounds, windows, mappings):
+        for turn_start, turn_end, label in result["turns"]:
+            turn_start, turn_end = max(turn_start, owned_start), min(turn_end, owned_end)
+            if turn_end > turn_start:
+                turns.append((turn_start, turn_end, mapping[label]))
+    for turn_start, turn_end, speaker in sorted(turns):
+        names.setdefault(speaker, f"SPEAKER_{len(names):02d}")
+        diarization[Segment(turn_start, turn_end), len(diarization)] = names[speaker]
+    # Join the pieces of turns cut at window boundaries
+    return diarization.support()
+
+
+def recluster(pipeline, cache_path, num_speakers=None, min_speakers=None, max_speakers=None):
+    """
+    Rebuild a diarization from cached segmentation and embeddings using the pipeline's current clustering settings.
+
+    Args:
+        pipeline: A loaded pyannote SpeakerDiarization pipeline, instantiated with the settings to try.
+        cache_path: A file written by save_embedding_cache().
+        num_speakers, min_speakers, max_speakers: The same speaker count constraints pipeline() accepts.
+
+    Returns:
+        pyannote.core.Annotation: The diarization.
+    """
+    uri, segmentations, embeddings = load_embedding_cache(cache_path)
+    if embeddings is None:
+        raise ValueError(f"{cache_path} only holds a segmentation checkpoint. Run the diarization again to compute the embeddings.")
+    num_speakers, min_speakers, max_speakers = pipeline.set_num_speakers(
+        num_speakers=num_speakers, min_speakers=min_speakers, max_speakers=max_speakers
+    )
+
+    binarized_segmentations = binarize_segmentations(pipeline, segmentations)
+    count = pipeline.speaker_count(binarized_segmentations, pipeline._segmentation.model.receptive_field, warm_up=(0.0, 0.0))
+
+    hard_clusters, _, _ = pipeline.clustering(
+        embeddings=embeddings,
+        segmentations=binarized_segmentations,
+        num_clusters=num_speakers,
+        min_clusters=min_speakers,
+        max_clusters=max_speakers,
+        file={"uri": uri},
+        frames=pipeline._segmentation.model.receptive_field,
+    )
+
+    num_different_speakers = np.max(hard_clusters) + 1
+    if num_different_speakers < min_speakers or num_different_speakers > max_speakers:
+        warnings.warn(f"Found {num_different_speakers} speakers in {uri}, outside of [{min_speakers}, {max_speakers}].")
+
+    count.data = np.minimum(count.data, max_speakers).astype(np.int8)
+    inactive_speakers = np.sum(binarized_segmentations.data, axis=1) == 0
+    hard_clusters[inactive_speakers] = -2
+    discrete_diarization = pipeline.reconstruct(segmentations, hard_clusters, count)
+
+    diarization = pipeline.to_annotation(
+        discrete_diarization,
+        min_duration_on=0.0,
+        min_duration_off=pipeline.segmentation.min_duration_off,
+    )
+    diarization.uri = uri
+
+    # Use the same SPEAKER_00, SPEAKER_01, ... labels a live run produces
+    mapping = {label: expected_label for label, expected_label in zip(diarization.labels(), pipeline.classes())}
+    return diarization.rename_labels(mapping=mapping)
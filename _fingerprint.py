@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _fingerprint.py <video_id>.wav --index-dir ./
+
+# Audio fingerprints to find re-uploads and clips of videos which have already been transcribed.
+
+# The first --seconds of audio are decoded by ffmpeg at 5 kHz mono and reduced to one 32-bit sub-fingerprint every 12.8 ms
+# (the Haitsma-Kalker scheme: the signs of energy differences between 33 log-spaced bands from 300 to 2000 Hz,
+# across neighbouring bands and frames). Re-encoding, resampling and volume changes flip only a few bits.
+# Each processed video keeps its fingerprint in <video_id>.fingerprint.npz next to its transcript.
+
+# Matching first looks up identical sub-fingerprints in a sorted index of every stored fingerprint,
+# and each hit votes for a (video, time offset) pair. The best offsets are then checked by the bit error rate
+# over the aligned frames, block by block:
+#   duplicate   the same audio from the start (offset within 1 second), with the same total duration
+#   partial     an aligned stretch of at least --min-match seconds, e.g., a clip cut from a longer video
+
+# _merged08.py checks every download against the index and copies the transcript of a duplicate instead of running
+# Whisper and pyannote again (see copy_outputs). Partial overlaps are only reported.
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+
+from _kg_template import render_custom_kg
+from _speakers import read_rttm, write_rttm, write_transcript_json, write_segment_txt
+
+SAMPLE_RATE = 5000
+FRAME_SIZE = 2048
+HOP_SIZE = 64
+FRAME_SECONDS = HOP_SIZE / SAMPLE_RATE
+BAND_EDGES = np.geomspace(300, 2000, 34)
+FINGERPRINT_SECONDS = 180
+
+BLOCK_FRAMES = 256  # about 3.3 seconds, the unit over which bit errors are judged
+BER_THRESHOLD = 0.35  # Haitsma and Kalker's threshold for a matching block
+MAX_HITS = 64  # sub-fingerprints more frequent than this in the index (silence, tones) do not vote
+MIN_VOTES = 3
+DUPLICATE_OFFSET = 1.0  # seconds
+DUPLICATE_DURATION = 2.0  # seconds
+
+
+def fingerprint_path(directory, video_id):
+    return os.path.join(directory, f"{video_id}.fingerprint.npz")
+
+
+def decode_audio(audio_path, seconds=FINGERPRINT_SECONDS):
+    """Decode the first seconds of a media file to mono float32 samples at SAMPLE_RATE."""
+    command = ['ffmpeg', '-nostdin', '-v', 'error', '-t', str(seconds), '-i', audio_path,
+               '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', '-']
+    result = subprocess.run(command, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def audio_duration(audio_path):
+    """Return the duration of a media file in seconds, using ffprobe."""
+    command = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', audio_path]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip())
+
+
+def resample(samples, sample_rate):
+    """Resample decoded audio (e.g., the 16 kHz buffer of _stream_audio.py) to SAMPLE_RATE, low-pass filtered like ffmpeg's resampler."""
+    from math import gcd
+    from scipy.signal import resample_poly
+    divisor = gcd(SAMPLE_RATE, sample_rate)
+    return resample_poly(samples, SAMPLE_RATE // divisor, sample_rate // divisor).astype(np.float32)
+
+
+def compute_fingerprint(samples, block=2048):
+    """
+    Return one uint32 sub-fingerprint per frame of the samples.
+
+    The spectrum is computed block by block so memory stays small for long inputs.
+    """
+    if len(samples) < FRAME_SIZE + HOP_SIZE:
+        return np.zeros(0, dtype=np.uint32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+    bins = np.fft.rfftfreq(FRAME_SIZE, 1 / SAMPLE_RATE)
+    # (bins, bands) matrix summing the power of each band
+    bands = ((bins[:, None] >= BAND_EDGES[None, :-1]) & (bins[:, None] < BAND_EDGES[None, 1:])).astype(np.float32)
+
+    energies = np.empty((len(frames), len(BAND_EDGES) - 1), dtype=np.float64)
+    for start in range(0, len(frames), block):
+        power = np.abs(np.fft.rfft(frames[start:start + block] * window, axis=1)) ** 2
+        energies[start:start + block] = power @ bands
+
+    band_difference = energies[:, :-1] - energies[:, 1:]
+    bits = (band_difference[1:] - band_difference[:-1]) > 0
+    return (bits.astype(np.uint64) << np.arange(32, dtype=np.uint64)).sum(axis=1).astype(np.uint32)
+
+
+def save_fingerprint(path, fingerprint, duration):
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, fingerprint=fingerprint, duration=np.array(duration))
+    os.replace(tmp_path, path)
+
+
+def bit_errors(a, b):
+    """Return the number of differing bits between two equally long uint32 arrays, per element."""
+    return np.unpackbits((a ^ b).view(np.uint8)).reshape(len(a), 32).sum(axis=1)
+
+
+class FingerprintIndex:
+    """The stored fingerprints of a directory, with a sorted table of all sub-fingerprints for lookups."""
+
+    def __init__(self, directory):
+        self.video_ids = []
+        self.fingerprints = []
+        self.durations = []
+        for path in sorted(glob.glob(os.path.join(directory, "*.fingerprint.npz"))):
+            with np.load(path) as stored:
+                self.video_ids.append(os.path.basename(path)[:-len(".fingerprint.npz")])
+                self.fingerprints.append(stored['fingerprint'])
+                self.durations.append(float(stored['duration']))
+
+        lengths = [len(fingerprint) for fingerprint in self.fingerprints]
+        values = np.concatenate(self.fingerprints) if self.fingerprints else np.zeros(0, dtype=np.uint32)
+        videos = np.repeat(np.arange(len(lengths)), lengths)
+        frames = np.concatenate([np.arange(length) for length in lengths]) if lengths else np.zeros(0, dtype=np.int64)
+        order = np.argsort(values, kind='stable')
+        self.values = values[order]
+        self.videos = videos[order]
+        self.frames = frames[order]
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    def candidates(self, fingerprint):
+        """Return [(video number, frame offset, votes)] for the best offset of every video with enough votes."""
+        left = np.searchsorted(self.values, fingerprint, side='left')
+        right = np.searchsorted(self.values, fingerprint, side='right')
+        hits = right - left
+        usable = (hits > 0) & (hits <= MAX_HITS)
+        if not usable.any():
+            return []
+        query_frames = np.repeat(np.flatnonzero(usable), hits[usable])
+        # Positions left[i] .. right[i] - 1 of every usable query frame, flattened
+        starts = np.repeat(left[usable], hits[usable])
+        positions = starts + np.arange(len(starts)) - np.repeat(np.cumsum(hits[usable]) - hits[usable], hits[usable])
+
+        offsets = self.frames[positions] - query_frames
+        pairs, votes = np.unique(np.stack([self.videos[positions], offsets], axis=1), axis=0, return_counts=True)
+        best = {}
+        for (video, offset), count in zip(pairs.tolist(), votes.tolist()):
+            if count >= MIN_VOTES and count > best.get(video, (0, 0))[1]:
+                best[video] = (offset, count)
+        return [(video, offset, count) for video, (offset, count) in best.items()]
+
+    def match(self, fingerprint, duration, min_match=10.0):
+        """
+        Compare a fingerprint against the index.
+
+        Returns:
+            list: {"video_id", "kind", "offset", "matched_seconds", "bit_error_rate"} for every duplicate or partial overlap,
+                  best matches first. offset is where the new audio starts in the stored video, in seconds.
+        """
+        matches = []
+        for video, offset, _ in self.candidates(fingerprint):
+            reference = self.fingerprints[video]
+            query_start = max(0, -offset)
+            reference_start = query_start + offset
+            length = min(len(fingerprint) - query_start, len(reference) - reference_start)
+            if length <= 0:
+                continue
+            errors = bit_errors(fingerprint[query_start:query_start + length], reference[reference_start:reference_start + length])
+
+            # A block matches when its bit error rate is below the threshold
+            n_blocks = max(1, length // BLOCK_FRAMES)
+            block_errors = np.array([block.mean() / 32 for block in np.array_split(errors, n_blocks)])
+            matched_frames = sum(len(block) for block, rate in zip(np.array_split(errors, n_blocks), block_errors) if rate < BER_THRESHOLD)
+            matched_seconds = matched_frames * FRAME_SECONDS
+            if matched_seconds < min(min_match, length * FRAME_SECONDS):
+                continue
+
+            offset_seconds = offset * FRAME_SECONDS
+            whole = length >= 0.9 * min(len(fingerprint), len(reference)) and matched_frames >= 0.9 * length
+            same_audio = (abs(offset_seconds) <= DUPLICATE_OFFSET
+                          and abs(duration - self.durations[video]) <= DUPLICATE_DURATION)
+            matches.append({
+                "video_id": self.video_ids[video],
+                "kind": "duplicate" if whole and same_audio else "partial",
+                "offset": round(offset_seconds, 2),
+                "matched_seconds": round(matched_seconds, 1),
+                "bit_error_rate": round(float(errors.mean()) / 32, 3),
+            })
+        matches.sort(key=lambda match: (match["kind"] != "duplicate", -match["matched_seconds"]))
+        return matches
+
+
+def copy_outputs(source_id, video_id, metadata):
+    """
+    Write the outputs of video_id from the finished transcript of source_id, with video_id's own metadata.
+
+    Returns:
+        bool: False if source_id has no finished transcript to copy.
+    """
+    try:
+        with open(f"{source_id}.json", 'r') as f:
+            transcript_data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    if 'metadata' not in transcript_data:
+        return False
+
+    transcript_data['metadata'] = metadata
+    transcript_data['duplicate_of'] = source_id
+    write_transcript_json(f"{video_id}.json", transcript_data)
+    write_segment_txt(f"{video_id}.txt", transcript_data['segments'])
+    if os.path.exists(f"{source_id}.rttm"):
+        write_rttm(f"{video_id}.rttm", video_id, read_rttm(f"{source_id}.rttm"))
+    if os.path.exists(f"{source_id}.diarization.npz"):
+        shutil.copyfile(f"{source_id}.diarization.npz", f"{video_id}.diarization.npz")
+    with open(f"{video_id}_metadata.json", 'w', encoding='utf-8') as f:
+        json.dump(render_custom_kg(video_id, metadata, transcript_data['language']), f, indent=4)
+    return True
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Fingerprint audio files and report duplicates and partial overlaps with the videos already indexed.")
+    parser.add_argument("audio_files", nargs="+", help="Audio files named <video_id>.<ext>.")
+    parser.add_argument("--index-dir", default=".", help="The directory with the <video_id>.fingerprint.npz files.")
+    parser.add_argument("--seconds", type=float, default=FINGERPRINT_SECONDS, help="How much audio from the start is fingerprinted.")
+    parser.add_argument("--min-match", type=float, default=10.0, help="The shortest aligned stretch reported as a partial overlap, in seconds.")
+    parser.add_argument("--add", action="store_true", help="Add the fingerprints to the index (e.g., to backfill videos processed before fingerprinting).")
+    args = parser.parse_args()
+
+    index = FingerprintIndex(args.index_dir)
+    print(f"{len(index)} fingerprints in the index.")
+    for audio_path in args.audio_files:
+        video_id = os.path.basename(audio_path).split('.')[0]
+        try:
+            duration = audio_duration(audio_path)
+            fingerprint = compute_fingerprint(decode_audio(audio_path, args.seconds))
+        except (subprocess.CalledProcessError, ValueError) as e:
+            print(f"Skipping {audio_path}: {e}")
+            continue
+        matches = [match for match in index.match(fingerprint, duration, args.min_match) if match["video_id"] != video_id]
+        if not matches:
+            print(f"{video_id}: no match")
+        for match in matches:
+            print(f"{video_id}: {match['kind']} of {match['video_id']} at {match['offset']}s "
+                  f"({match['matched_seconds']}s matched, bit error rate {match['bit_error_rate']})")
+        if args.add:
+            save_fingerprint(fingerprint_path(args.index_dir, video_id), fingerprint, duration)
+
+
+if __name__ == "__main__":
+    main()
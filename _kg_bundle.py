@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _kg_bundle.py ./ --output-dir ./kg_bundles
+# python3 _kg_bundle.py ./ --output-dir ./kg_bundles --per-videos 200
+
+# Bundles the per-video KG files (<video_id>_metadata.json) into one custom KG per channel for bulk LightRAG ingestion.
+
+# Every per-video KG file repeats the source-document-global-hub and metadata-global-hub entities and the same channel
+# and platform entities, so ingesting a channel one file at a time makes LightRAG merge thousands of identical nodes.
+# This script streams the files one at a time and merges duplicates the way LightRAG would:
+#   entities are deduplicated by entity_name, relationships by (src_id, tgt_id);
+#   source_ids and distinct descriptions are joined with LightRAG's <SEP> separator, keywords with commas;
+#   the most common entity_type wins and relationship weights are summed.
+# Chunks are unique per video and are kept as they are.
+
+# With --per-videos N a bundle is written every N videos of a channel, which bounds memory and request size.
+
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from collections import Counter
+
+from _kg_template import kg_channel
+
+GRAPH_FIELD_SEP = "<SEP>"  # The separator LightRAG uses between merged source_ids and descriptions
+
+
+# Fields whose values are merged as ordered sets of parts, and the separator used for each
+MERGED_FIELDS = {"description": GRAPH_FIELD_SEP, "keywords": ",", "source_id": GRAPH_FIELD_SEP}
+
+
+class Bundle:
+    """Accumulates deduplicated chunks, entities and relationships for one output file."""
+
+    def __init__(self):
+        self.chunks = []
+        self.entities = {}
+        self.relationships = {}
+        self.videos = 0
+        self.items_in = 0
+
+    @staticmethod
+    def _merge(merged, item, is_first):
+        """Merge item into merged, which holds the first copy and the distinct parts of each merged field."""
+        first, parts, entity_types = merged
+        for field, sep in MERGED_FIELDS.items():
+            if field in item:
+                # dicts keep insertion order, so they work as ordered sets
+                parts.setdefault(field, {}).update(dict.fromkeys(part for part in item[field].split(sep) if part))
+        if "entity_type" in item:
+            entity_types[item["entity_type"]] += 1
+        if not is_first and "weight" in item:
+            first["weight"] = first.get("weight", 0.0) + item["weight"]
+
+    def add(self, custom_kg):
+        self.videos += 1
+        self.chunks.extend(custom_kg.get("chunks", []))
+        entities = custom_kg.get("entities", [])
+        relationships = custom_kg.get("relationships", [])
+        self.items_in += len(entities) + len(relationships)
+
+        for merged_items, key_fields, items in ((self.entities, ("entity_name",), entities),
+                                                (self.relationships, ("src_id", "tgt_id"), relationships)):
+            for item in items:
+                key = tuple(item[field] for field in key_fields)
+                is_first = key not in merged_items
+                if is_first:
+                    merged_items[key] = (dict(item), {}, Counter())
+                self._merge(merged_items[key], item, is_first)
+
+    @staticmethod
+    def _finish(merged):
+        first, parts, entity_types = merged
+        item = dict(first)
+        for field, values in parts.items():
+            item[field] = MERGED_FIELDS[field].join(values)
+        if entity_types:
+            item["entity_type"] = entity_types.most_common(1)[0][0]
+        return item
+
+    def custom_kg(self):
+        return {
+            "chunks": self.chunks,
+            "entities": [self._finish(merged) for merged in self.entities.values()],
+            "relationships": [self._finish(merged) for merged in self.relationships.values()],
+        }
+
+    @property
+    def items_out(self):
+        return len(self.entities) + len(self.relationships)
+
+
+def slugify(name):
+    """Make a channel name safe to use in a file name."""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "unknown_channel"
+
+
+def find_kg_files(inputs):
+    """Expand directories and glob patterns into *_metadata.json files."""
+    kg_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            kg_files.extend(sorted(glob.glob(os.path.join(item, "*_metadata.json"))))
+        elif glob.has_magic(item):
+            kg_files.extend(sorted(glob.glob(item)))
+        else:
+            kg_files.append(item)
+    return kg_files
+
+
+def write_bundle(bundle, output_dir, channel, part):
+    suffix = f".part{part:04d}" if part is not None else ""
+    output_path = os.path.join(output_dir, f"{slugify(channel)}{suffix}.custom_kg.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(bundle.custom_kg(), f, indent=4)
+    print(f"Bundle saved: {output_path} ({bundle.videos} videos, {bundle.items_in} entities and relationships merged into {bundle.items_out})")
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Bundle per-video KG files into deduplicated per-channel custom KGs for LightRAG.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns or <video_id>_metadata.json files.")
+    parser.add_argument("--output-dir", default="kg_bundles", help="Where to write the bundles.")
+    parser.add_argument("--per-videos", type=int, default=None, help="Write a bundle every N videos of a channel instead of one per channel.")
+    args = parser.parse_args()
+
+    if args.per_videos is not None and args.per_videos < 1:
+        print("Error: --per-videos must be at least 1.")
+        exit(1)
+
+    kg_files = find_kg_files(args.inputs)
+    if not kg_files:
+        print("No KG files found. Nothing to bundle.")
+        exit(0)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.time()
+    bundles = {}
+    parts = Counter()
+    failures = 0
+    for kg_file in kg_files:
+        try:
+            with open(kg_file, 'r', encoding='utf-8') as f:
+                custom_kg = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading {kg_file}: {e}")
+            failures += 1
+            continue
+
+        channel = kg_channel(custom_kg) or "unknown_channel"
+        bundle = bundles.setdefault(channel, Bundle())
+        bundle.add(custom_kg)
+
+        if args.per_videos is not None and bundle.videos >= args.per_videos:
+            write_bundle(bundle, args.output_dir, channel, parts[channel])
+            parts[channel] += 1
+            bundles[channel] = Bundle()
+
+    for channel, bundle in bundles.items():
+        if bundle.videos:
+            write_bundle(bundle, args.output_dir, channel, parts[channel] if args.per_videos is not None else None)
+
+    elapsed = time.time() - started
+    print(f"Bundled {len(kg_files) - failures} KG files in {elapsed:.1f} seconds.")
+    if failures:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _kg_delta.py ./ --state .kg_state.json --output-dir ./kg_deltas
+
+# Exports only what changed in the per-video KG files (<video_id>_metadata.json) since the last export,
+# so re-syncing a channel or changing the KG template does not mean re-ingesting every file into LightRAG.
+
+# A content hash is kept per chunk, entity and relationship in the state file. Items are keyed by the file they came from
+# (source_id) plus entity_name, or src_id and tgt_id for relationships, or their position for chunks.
+# Each run writes kg_delta_<UTC time>.json with:
+#   chunks, entities, relationships   items which were added or changed, in custom KG format (ready for insert_custom_kg)
+#   removed                           keys of items which no longer exist, for deletion downstream
+#   summary                           counts of added, changed and removed items
+# The state file is only updated after the delta has been written. Its default name is a dot-file, so the scripts that
+# scan the transcript directory for .json inputs never pick it up.
+
+# _meta_only.py --delta-state .kg_state.json runs this after regenerating the KG files.
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from _kg_bundle import find_kg_files
+
+SECTIONS = ("chunks", "entities", "relationships")
+STATE_FILE = ".kg_state.json"
+
+
+def item_key(section, item, index):
+    """Return the identity of an item, independent of its content."""
+    if section == "entities":
+        return [item.get("source_id"), item["entity_name"]]
+    if section == "relationships":
+        return [item.get("source_id"), item["src_id"], item["tgt_id"]]
+    return [item.get("source_id"), index]
+
+
+def removed_item(section, key):
+    """Turn a state key back into the fields needed to delete the item downstream."""
+    if section == "entities":
+        return {"source_id": key[0], "entity_name": key[1]}
+    if section == "relationships":
+        return {"source_id": key[0], "src_id": key[1], "tgt_id": key[2]}
+    return {"source_id": key[0], "index": key[1]}
+
+
+def content_hash(item):
+    return hashlib.sha1(json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def load_state(state_path):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {section: {} for section in SECTIONS}
+
+
+def compute_delta(kg_files, state):
+    """
+    Compare the KG files against the last exported state.
+
+    Returns:
+        (delta, new_state): The delta document and the state to save once it has been written.
+    """
+    delta = {section: [] for section in SECTIONS}
+    summary = {"added": 0, "changed": 0, "removed": 0}
+    new_state = {section: {} for section in SECTIONS}
+
+    for kg_file in kg_files:
+        with open(kg_file, 'r', encoding='utf-8') as f:
+            custom_kg = json.load(f)
+        for section in SECTIONS:
+            previous = state.get(section, {})
+            current = new_state[section]
+            for index, item in enumerate(custom_kg.get(section, [])):
+                key = json.dumps(item_key(section, item, index), ensure_ascii=False)
+                digest = content_hash(item)
+                current[key] = digest
+                old_digest = previous.get(key)
+                if old_digest == digest:
+                    continue
+                summary["added" if old_digest is None else "changed"] += 1
+                delta[section].append(item)
+
+    delta["removed"] = {section: [] for section in SECTIONS}
+    for section in SECTIONS:
+        for key in state.get(section, {}):
+            if key not in new_state[section]:
+                delta["removed"][section].append(removed_item(section, json.loads(key)))
+                summary["removed"] += 1
+
+    delta["summary"] = summary
+    return delta, new_state
+
+
+def export_delta(kg_files, state_path, output_dir):
+    """
+    Write a delta of the KG files against the state file and update the state file.
+
+    Returns:
+        str or None: The path of the delta file, or None if nothing changed.
+    """
+    delta, new_state = compute_delta(kg_files, load_state(state_path))
+    summary = delta["summary"]
+    print(f"KG delta: {summary['added']} added, {summary['changed']} changed, {summary['removed']} removed.")
+    if not any(summary.values()):
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ')
+    delta_path = os.path.join(output_dir, f"kg_delta_{timestamp}.json")
+    with open(delta_path, 'w', encoding='utf-8') as f:
+        json.dump(delta, f, indent=4)
+
+    # Replace the state only once the delta is safely on disk
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(new_state, f)
+    os.replace(tmp_path, state_path)
+    print(f"KG delta saved: {delta_path}")
+    return delta_path
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Export the KG items which were added, changed or removed since the last export.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns or <video_id>_metadata.json files.")
+    parser.add_argument("--state", default=STATE_FILE, help="The file holding the content hashes of the last export.")
+    parser.add_argument("--output-dir", default="kg_deltas", help="Where to write kg_delta_<UTC time>.json.")
+    args = parser.parse_args()
+
+    kg_files = find_kg_files(args.inputs)
+    try:
+        export_delta(kg_files, args.state, args.output_dir)
+    except (OSError, json.JSONDecodeError, KeyError) as e:
+        print(f"Error exporting KG delta: {e}")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
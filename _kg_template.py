@@ -0,0 +1,279 @@
+# The custom KG (knowledge graph) template for <video_id>_metadata.json, shared by _merged08.py and _meta_only.py.
+# Edit KG_SCHEMA to change the KG files. Regenerate existing files with: python3 _meta_only.py ./
+
+# KG_SCHEMA is declarative. Strings may contain {PLACEHOLDERS} which are filled in per video:
+#   {METADATA_FILE}  <video_id>_metadata.json
+#   {SOURCE_FILE}    <video_id>.txt
+#   {VIDEO_URL}, {VIDEO_PLATFORM}, {VIDEO_CHANNEL}, {VIDEO_TITLE}, {VIDEO_POST_DATETIME}, {VIDEO_LANGUAGE}
+# Every chunk, entity and relationship gets "source_id": "<video_id>_metadata.json" added as its last field.
+
+# The schema is compiled once on import. Fields without placeholders become constants which are shared by every
+# rendered file, and fields with placeholders keep a bound str.format_map, so rendering a file costs one
+# C-level format call per templated field.
+
+from string import Formatter
+
+KG_SCHEMA = {
+    "chunks": [
+        {
+            "content": (
+                "The video URL is {VIDEO_URL}\n"
+                "The video platform is {VIDEO_PLATFORM}\n"
+                "The video channel is {VIDEO_CHANNEL}\n"
+                "The video title is {VIDEO_TITLE}\n"
+                "The video was posted on {VIDEO_POST_DATETIME}\n"
+                "The video language is {VIDEO_LANGUAGE}"
+            )
+        }
+    ],
+    "entities": [
+        {
+            "entity_name": "source-document-global-hub",
+            "entity_type": "source-document-global-hub",
+            "description": "The source-document-global-hub joins all source documents via edge relationships. source-document-global-hub can be referenced to list all source documents"
+        },
+        {
+            "entity_name": "metadata-global-hub",
+            "entity_type": "metadata-global-hub",
+            "description": "The metadata-global-hub joins all metadata-hub entities via edge relationships. metadata-global-hub can be referenced to list all metadata-hubs"
+        },
+        {
+            "entity_name": "{METADATA_FILE}",
+            "entity_type": "metadata-hub",
+            "description": "{METADATA_FILE} is a meta-data-hub. All metadata for the source document {SOURCE_FILE} can be located by referencing {METADATA_FILE}"
+        },
+        {
+            "entity_name": "{SOURCE_FILE}",
+            "entity_type": "source-document",
+            "description": "{SOURCE_FILE} is the file name of a source document used to populate this index with information. {SOURCE_FILE} contains a video transcript"
+        },
+        {
+            "entity_name": "{VIDEO_URL}",
+            "entity_type": "metadata-for-{SOURCE_FILE}",
+            "description": "URL for source video"
+        },
+        {
+            "entity_name": "{VIDEO_PLATFORM}",
+            "entity_type": "metadata-for-{SOURCE_FILE}",
+            "description": "video platform which hosted the source video."
+        },
+        {
+            "entity_name": "{VIDEO_CHANNEL}",
+            "entity_type": "metadata-for-{SOURCE_FILE}",
+            "description": "Video channel which published the source video."
+        },
+        {
+            "entity_name": "{VIDEO_TITLE}",
+            "entity_type": "metadata-for-{SOURCE_FILE}",
+            "description": "Video title for source video"
+        },
+        {
+            "entity_name": "{VIDEO_POST_DATETIME}",
+            "entity_type": "metadata-for-{SOURCE_FILE}",
+            "description": "Date source video was posted."
+        },
+        {
+            "entity_name": "{VIDEO_LANGUAGE}",
+            "entity_type": "metadata-for-{SOURCE_FILE}",
+            "description": "Language spoken in the source video"
+        }
+    ],
+    "relationships": [
+        {
+            "src_id": "{VIDEO_URL}",
+            "tgt_id": "{VIDEO_PLATFORM}",
+            "description": "The source video found at the URL {VIDEO_URL} was hosted by {VIDEO_PLATFORM} platform",
+            "keywords": "source video URL host platform",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{VIDEO_URL}",
+            "tgt_id": "{VIDEO_CHANNEL}",
+            "description": "The source video found at URL {VIDEO_URL} was produced by the {VIDEO_CHANNEL} video channel",
+            "keywords": "source video URL channel produced",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{VIDEO_URL}",
+            "tgt_id": "{VIDEO_TITLE}",
+            "description": "The source video at URL {VIDEO_URL} is titled {VIDEO_TITLE}",
+            "keywords": "source video URL title",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{VIDEO_URL}",
+            "tgt_id": "{VIDEO_POST_DATETIME}",
+            "description": "The source video at URL {VIDEO_URL} was posted at the date and time of {VIDEO_POST_DATETIME}",
+            "keywords": "source video URL posted date time",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{VIDEO_PLATFORM}",
+            "tgt_id": "{VIDEO_CHANNEL}",
+            "description": "{VIDEO_PLATFORM} was the platform hosting the {VIDEO_CHANNEL} channel",
+            "keywords": "platform hosting channel",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{VIDEO_CHANNEL}",
+            "tgt_id": "{VIDEO_TITLE}",
+            "description": "The {VIDEO_CHANNEL} channel produced the video titled {VIDEO_TITLE}",
+            "keywords": "channel content creator produced video",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{VIDEO_TITLE}",
+            "tgt_id": "{VIDEO_POST_DATETIME}",
+            "description": "The video titled {VIDEO_TITLE} was posted on {VIDEO_POST_DATETIME}",
+            "keywords": "titled video posted date time",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{VIDEO_TITLE}",
+            "tgt_id": "{VIDEO_LANGUAGE}",
+            "description": "The video titled {VIDEO_TITLE} was presented in the {VIDEO_LANGUAGE} language",
+            "keywords": "titled video spoken language",
+            "weight": 7.0
+        },
+        {
+            "src_id": "metadata-global-hub",
+            "tgt_id": "{METADATA_FILE}",
+            "description": "{METADATA_FILE} is an element of the set metadata-global-hub",
+            "keywords": "element of metadata-global-hub",
+            "weight": 7.0
+        },
+        {
+            "src_id": "source-document-global-hub",
+            "tgt_id": "{SOURCE_FILE}",
+            "description": "{SOURCE_FILE} is an element of the set source-document-global-hub",
+            "keywords": "element of source-document-global-hub",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{METADATA_FILE}",
+            "tgt_id": "{SOURCE_FILE}",
+            "description": "{METADATA_FILE} is the metadata hub for the source document {SOURCE_FILE}",
+            "keywords": "metadata for {SOURCE_FILE}",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{METADATA_FILE}",
+            "tgt_id": "{VIDEO_URL}",
+            "description": "{METADATA_FILE} is the metadata hub for the URL {VIDEO_URL}",
+            "keywords": "URL {METADATA_FILE}",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{METADATA_FILE}",
+            "tgt_id": "{VIDEO_PLATFORM}",
+            "description": "{METADATA_FILE} is the metadata hub for the video platform {VIDEO_PLATFORM}",
+            "keywords": "video platform {METADATA_FILE}",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{METADATA_FILE}",
+            "tgt_id": "{VIDEO_CHANNEL}",
+            "description": "{METADATA_FILE} is the metadata hub for the video channel {VIDEO_CHANNEL}",
+            "keywords": "video channel {METADATA_FILE}",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{METADATA_FILE}",
+            "tgt_id": "{VIDEO_TITLE}",
+            "description": "{METADATA_FILE} is the metadata hub for the video titled {VIDEO_TITLE}",
+            "keywords": "video title {METADATA_FILE}",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{METADATA_FILE}",
+            "tgt_id": "{VIDEO_POST_DATETIME}",
+            "description": "{METADATA_FILE} is the metadata hub for the video posting time and date of {VIDEO_POST_DATETIME}",
+            "keywords": "posting date time {METADATA_FILE}",
+            "weight": 7.0
+        },
+        {
+            "src_id": "{METADATA_FILE}",
+            "tgt_id": "{VIDEO_LANGUAGE}",
+            "description": "{METADATA_FILE} is the metadata hub for {VIDEO_LANGUAGE}, the spoken language in the video",
+            "keywords": "{VIDEO_LANGUAGE} spoken language {METADATA_FILE}",
+            "weight": 7.0
+        }
+    ]
+}
+
+PLACEHOLDERS = ("METADATA_FILE", "SOURCE_FILE", "VIDEO_URL", "VIDEO_PLATFORM", "VIDEO_CHANNEL",
+                "VIDEO_TITLE", "VIDEO_POST_DATETIME", "VIDEO_LANGUAGE")
+
+
+def _compile_item(item):
+    """Turn one schema item into a tuple of (key, format function or None, constant value)."""
+    compiled = []
+    for key, value in item.items():
+        if isinstance(value, str):
+            names = {name for _, name, _, _ in Formatter().parse(value) if name is not None}
+            unknown = names - set(PLACEHOLDERS)
+            if unknown:
+                raise ValueError(f"Unknown placeholder(s) {sorted(unknown)} in KG_SCHEMA value {value!r}")
+            if names:
+                compiled.append((key, value.format_map, None))
+                continue
+        compiled.append((key, None, value))
+    return tuple(compiled)
+
+
+def compile_schema(schema):
+    """Compile a KG schema into {section: (compiled item, ...)}."""
+    return {section: tuple(_compile_item(item) for item in items) for section, items in schema.items()}
+
+
+COMPILED_SCHEMA = compile_schema(KG_SCHEMA)
+
+
+def metadata_values(video_id, metadata, language):
+    """Prepare the placeholder values for one video."""
+    # Extract platform from URL
+    platform = metadata['url'].split('/')[2].split('?')[0]
+    return {
+        "METADATA_FILE": f"{video_id}_metadata.json",
+        "SOURCE_FILE": f"{video_id}.txt",
+        "VIDEO_URL": metadata['url'],
+        "VIDEO_PLATFORM": platform,
+        "VIDEO_CHANNEL": metadata['channelName'],
+        "VIDEO_TITLE": metadata['videoTitle'],
+        "VIDEO_POST_DATETIME": metadata['videoPostDate'],
+        "VIDEO_LANGUAGE": language
+    }
+
+
+def render_custom_kg(video_id, metadata, language):
+    """Render the custom KG JSON for one video from the compiled schema."""
+    values = metadata_values(video_id, metadata, language)
+    source_id = values["METADATA_FILE"]
+    custom_kg = {}
+    for section, items in COMPILED_SCHEMA.items():
+        rendered = []
+        for item in items:
+            fields = {key: format_map(values) if format_map else constant for key, format_map, constant in item}
+            fields["source_id"] = source_id
+            rendered.append(fields)
+        custom_kg[section] = rendered
+    return custom_kg
+
+
+def _channel_entity_description():
+    """Return the constant description of the {VIDEO_CHANNEL} entity, which identifies it in rendered KG files."""
+    for item in KG_SCHEMA["entities"]:
+        if item["entity_name"] == "{VIDEO_CHANNEL}" and "{" not in item["description"]:
+            return item["description"]
+    return None
+
+
+CHANNEL_ENTITY_DESCRIPTION = _channel_entity_description()
+
+
+def kg_channel(custom_kg):
+    """Return the channel name of a rendered KG file, or None if it cannot be found."""
+    for entity in custom_kg.get("entities", []):
+        if entity.get("description") == CHANNEL_ENTITY_DESCRIPTION:
+            return entity["entity_name"]
+    return None
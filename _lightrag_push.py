@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _lightrag_push.py ./ --url http://localhost:9621 --batch-size 20 --concurrency 4
+
+# Pushes the transcripts (<video_id>.txt) and custom KG payloads (<video_id>_metadata.json) in a directory
+# to a LightRAG-compatible HTTP server, instead of uploading them by hand.
+
+# Transcripts are sent in batches to POST <url>/documents/texts as {"texts": [...], "file_sources": [...]}.
+# KG payloads are merged in batches (deduplicated like _kg_bundle.py does) and sent to POST <url><kg path> as {"custom_kg": {...}}.
+# The KG path is configurable because the stock LightRAG server has no custom KG endpoint; point it at whatever accepts one.
+
+# Each worker thread keeps its HTTP connection alive between requests, and at most --concurrency requests are in flight.
+# Failed requests (connection errors, 429 and 5xx) are retried with exponential backoff.
+# Every acknowledged document is appended to the --state file, and documents found there are skipped on the next run,
+# so an interrupted push resumes where it stopped.
+
+# Try it against the stub server: python3 _lightrag_stub.py --delay 0.5
+
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+from _kg_bundle import Bundle
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ConnectionPool:
+    """One persistent HTTP connection per thread, reopened when the server closes it."""
+
+    def __init__(self, base_url, timeout=300, headers=None):
+        parsed = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.prefix = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", "Connection": "keep-alive", **(headers or {})}
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+            self.local.connection = connection
+        return connection
+
+    def _reset(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+        self.local.connection = None
+
+    def post_json(self, path, payload):
+        """POST a JSON payload and return (status, response body)."""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request("POST", self.prefix + path, body=body, headers=self.headers)
+                response = connection.getresponse()
+                data = response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    self._reset()
+                return response.status, data
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError):
+                # A kept-alive connection may have been closed by the server in the meantime: reconnect once
+                self._reset()
+                if attempt:
+                    raise
+            except OSError:
+                self._reset()
+                raise
+
+
+class AckLog:
+    """The documents acknowledged by the server, appended to a JSONL file as they are acknowledged."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.acked = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self.acked.add(json.loads(line)["id"])
+
+    def add(self, document_ids):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for document_id in document_ids:
+                    f.write(json.dumps({"id": document_id, "time": time.time()}) + "\n")
+            self.acked.update(document_ids)
+
+
+def find_documents(directory):
+    """Return (text documents, KG documents) as lists of (document id, path)."""
+    texts = []
+    kgs = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith("_metadata.json"):
+            kgs.append((f"kg:{name[:-len('_metadata.json')]}", path))
+        elif name.endswith(".txt") and name.count(".") == 1:
+            # <video_id>.txt only, not derived files like <video_id>.filtered.txt
+            texts.append((f"text:{name[:-len('.txt')]}", path))
+    return texts, kgs
+
+
+def text_payload(batch):
+    texts = []
+    file_sources = []
+    for _, path in batch:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+        file_sources.append(os.path.basename(path))
+    return {"texts": texts, "file_sources": file_sources}
+
+
+def kg_payload(batch):
+    bundle = Bundle()
+    for _, path in batch:
+        with open(path, "r", encoding="utf-8") as f:
+            bundle.add(json.load(f))
+    return {"custom_kg": bundle.custom_kg()}
+
+
+def send_batch(pool, path, payload, retries, backoff):
+    """
+    Send one batch, retrying on connection errors and retryable statuses.
+
+    Returns:
+        int: The number of retries it took.
+    """
+    for attempt in range(retries + 1):
+        try:
+            status, data = pool.post_json(path, payload)
+            if 200 <= status < 300:
+                return attempt
+            if status not in RETRY_STATUSES:
+                raise RuntimeError(f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}")
+            error = f"HTTP {status}"
+        except (OSError, http.client.HTTPException) as e:
+            error = str(e)
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt)
+    raise RuntimeError(f"giving up after {retries + 1} attempts: {error}")
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Push transcripts and custom KG payloads to a LightRAG-compatible HTTP server.")
+    parser.add_argument("directory", help="The directory with <video_id>.txt and <video_id>_metadata.json files.")
+    parser.add_argument("--url", default="http://localhost:9621", help="The base URL of the server.")
+    parser.add_argument("--texts-path", default="/documents/texts", help="The endpoint for batches of transcripts.")
+    parser.add_argument("--kg-path", default="/documents/custom_kg", help="The endpoint for custom KG payloads.")
+    parser.add_argument("--api-key", default=os.getenv("LIGHTRAG_API_KEY"), help="Sent as X-API-Key. Defaults to the LIGHTRAG_API_KEY environment variable.")
+    parser.add_argument("--batch-size", type=int, default=20, help="The number of documents per request.")
+    parser.add_argument("--concurrency", type=int, default=4, help="The maximum number of requests in flight.")
+    parser.add_argument("--retries", type=int, default=5, help="How many times a failed request is retried.")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Seconds before the first retry. Doubles with each retry.")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for a response.")
+    parser.add_argument("--state", default="lightrag_push_state.jsonl", help="The log of acknowledged documents used to resume.")
+    parser.add_argument("--no-texts", action="store_true", help="Do not push transcripts.")
+    parser.add_argument("--no-kg", action="store_true", help="Do not push custom KG payloads.")
+    args = parser.parse_args()
+
+    if args.batch_size < 1 or args.concurrency < 1:
+        print("Error: --batch-size and --concurrency must be at least 1.")
+        exit(1)
+
+    ack_log = AckLog(args.state)
+    texts, kgs = find_documents(args.directory)
+    kinds = []
+    if not args.no_texts:
+        kinds.append((args.texts_path, text_payload, [document for document in texts if document[0] not in ack_log.acked]))
+    if not args.no_kg:
+        kinds.append((args.kg_path, kg_payload, [document for document in kgs if document[0] not in ack_log.acked]))
+
+    batches = []
+    for path, make_payload, documents in kinds:
+        for i in range(0, len(documents), args.batch_size):
+            batches.append((path, make_payload, documents[i:i + args.batch_size]))
+    pending = sum(len(batch) for _, _, batch in batches)
+    print(f"{pending} documents to push in {len(batches)} requests ({len(ack_log.acked)} already acknowledged).")
+    if not batches:
+        return
+
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    pool = ConnectionPool(args.url, timeout=args.timeout, headers=headers)
+
+    def push(path, make_payload, batch):
+        retries = send_batch(pool, path, make_payload(batch), args.retries, args.backoff)
+        ack_log.add([document_id for document_id, _ in batch])
+        return retries
+
+    started = time.time()
+    pushed = 0
+    total_retries = 0
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {executor.submit(push, *batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future][2]
+            try:
+                total_retries += future.result()
+                pushed += len(batch)
+                print(f"Acknowledged {pushed}/{pending} documents")
+            except (RuntimeError, OSError, ValueError) as e:
+                print(f"Error pushing {batch[0][0]} .. {batch[-1][0]}: {e}")
+                failures += len(batch)
+
+    elapsed = time.time() - started
+    rate = pushed / elapsed if elapsed > 0 else float('inf')
+    print(f"Pushed {pushed} documents in {elapsed:.1f} seconds ({rate:.1f} documents/second, {total_retries} retries, {failures} failed).")
+    if failures:
+        print(f"Run the same command again to retry the {failures} documents which were not acknowledged.")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
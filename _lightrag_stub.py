@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# A stand-in for a LightRAG server, for trying out _lightrag_push.py without a real server.
+# Every request is recorded as one line of JSONL (time, path, client port, document count, body size),
+# so connection reuse (the same client port across requests), batching and concurrency can be checked afterwards.
+
+# The following is a sample run command. Each request takes 0.5 seconds and every 10th request fails with a 503.
+# python3 _lightrag_stub.py --port 9621 --delay 0.5 --fail-every 10 --log stub_requests.jsonl
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive between requests
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        server = self.server
+
+        with server.lock:
+            server.request_count += 1
+            request_number = server.request_count
+
+        time.sleep(server.delay)
+
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            payload = {}
+        documents = len(payload.get("texts", [])) or len(payload.get("custom_kg", {}).get("chunks", []))
+
+        failed = server.fail_every and request_number % server.fail_every == 0
+        record = {
+            "time": time.time(),
+            "request": request_number,
+            "path": self.path,
+            "client_port": self.client_address[1],
+            "documents": documents,
+            "bytes": length,
+            "status": 503 if failed else 200,
+        }
+        with server.lock:
+            server.log_file.write(json.dumps(record) + "\n")
+            server.log_file.flush()
+
+        response = json.dumps({"status": "failure" if failed else "success", "message": f"request {request_number}"}).encode()
+        self.send_response(503 if failed else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass  # requests are recorded in the JSONL log instead
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Run a stub LightRAG-compatible server that records requests and simulates slow responses.")
+    parser.add_argument("--host", default="127.0.0.1", help="The address to listen on.")
+    parser.add_argument("--port", type=int, default=9621, help="The port to listen on.")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering each request.")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with a 503 (0 to never fail).")
+    parser.add_argument("--log", default="stub_requests.jsonl", help="Where to record the requests.")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.delay = args.delay
+    server.fail_every = args.fail_every
+    with open(args.log, "a", encoding="utf-8") as log_file:
+        server.log_file = log_file
+        print(f"Stub LightRAG server listening on http://{args.host}:{args.port} (delay {args.delay}s), recording to {args.log}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# Memory admission for _process_channel_videos02.py: workers only start a video while the estimated peak memory of
+# the videos in progress fits the budget, so a few long videos at once cannot get the machine OOM-killed.
+
+# A video's peak is estimated as base + per_hour * hours of audio: the Whisper model and pyannote pipeline take about the
+# same memory whatever the video, and the decoded audio, segmentation scores and embeddings grow with its duration.
+# The defaults below are for the medium model on CPU. Every finished video's peak RSS (from os.wait4) is added to
+# .memory_stats.json and the two coefficients are refitted from the measurements, so the estimate follows the machine.
+# _merged08.py --memory-log appends each stage's peak RSS and stall count, which the runner summarizes at the end of a run.
+
+import json
+import os
+import resource
+import threading
+
+import numpy as np
+
+# Peak RSS in MB of _merged08.py before any measurement: Whisper model + pyannote, and the growth per hour of audio
+MODEL_BASE_MB = {"tiny": 1500, "base": 1800, "small": 2800, "medium": 5500, "large": 9500}
+PER_HOUR_MB = 1200
+SAFETY_MARGIN = 1.15  # estimates are raised by this factor
+MAX_OBSERVATIONS = 200  # the most recent measurements used for the fit
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, or the physical memory where that cannot be read."""
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1 << 20)
+
+
+def parse_iso_duration(text):
+    """Parse a YouTube contentDetails duration such as "PT1H2M3S" (or "P1DT2H") into seconds."""
+    seconds = 0
+    number = ""
+    in_time = False
+    units = {"D": 86400, "H": 3600, "S": 1}
+    for char in text or "":
+        if char.isdigit() or char == ".":
+            number += char
+        elif char == "T":
+            in_time = True
+        elif char == "M":
+            seconds += float(number or 0) * (60 if in_time else 30 * 86400)
+            number = ""
+        elif char in units:
+            seconds += float(number or 0) * units[char]
+            number = ""
+    return seconds
+
+
+class MemoryModel:
+    """Peak memory estimates learned from measured peaks, saved as JSON."""
+
+    def __init__(self, path, model="medium"):
+        self.path = path
+        self.base = MODEL_BASE_MB.get(model, MODEL_BASE_MB["medium"])
+        self.per_hour = PER_HOUR_MB
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self.observations = data.get("observations", [])
+        self.fit()
+
+    def fit(self):
+        """Refit base and per_hour to the measurements. With too few distinct durations, per_hour keeps its default."""
+        if not self.observations:
+            return
+        hours = np.array([observation["hours"] for observation in self.observations])
+        peaks = np.array([observation["peak_mb"] for observation in self.observations])
+        if len(self.observations) >= 3 and np.ptp(hours) >= 0.25:
+            self.per_hour = max(float(np.polyfit(hours, peaks, 1)[0]), 0.0)
+        # The line through the measurements would underestimate half of them: its base is raised to cover them all
+        self.base = float(np.max(peaks - self.per_hour * hours))
+
+    def estimate(self, seconds):
+        """The estimated peak memory in MB of a video of this many seconds (the duration may be unknown: 0)."""
+        return (self.base + self.per_hour * seconds / 3600) * SAFETY_MARGIN
+
+    def observe(self, video_id, seconds, peak_mb):
+        self.observations = (self.observations + [{"video_id": video_id, "hours": round(seconds / 3600, 4), "peak_mb": round(peak_mb)}])[-MAX_OBSERVATIONS:]
+        self.fit()
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"base_mb": round(self.base), "per_hour_mb": round(self.per_hour), "observations": self.observations}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+class MemoryGate:
+    """
+    Admit jobs while the sum of their estimated peaks fits the budget.
+
+    One job is always admitted when nothing is running, so a video estimated above the budget still gets processed (alone).
+    """
+
+    def __init__(self, budget_mb):
+        self.budget_mb = budget_mb
+        self.in_use = 0.0
+        self.running = 0
+        self.changed = threading.Condition()
+
+    def acquire(self, estimate_mb):
+        with self.changed:
+            self.changed.wait_for(lambda: self.running == 0 or self.in_use + estimate_mb <= self.budget_mb)
+            self.in_use += estimate_mb
+            self.running += 1
+
+    def release(self, estimate_mb):
+        with self.changed:
+            self.in_use -= estimate_mb
+            self.running -= 1
+            self.changed.notify_all()
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """The peak resident set size so far in MB (ru_maxrss is in kilobytes on Linux)."""
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def record_stage(path, video_id, stage, stalls=0):
+    """
+    Append the peak RSS of this process and of its largest finished child (e.g., the whisper CLI) after a stage,
+    with the number of stalled commands killed so far (see _supervisor.py).
+
+    The peak only grows, so a stage's own peak is its value when it is higher than the previous stage's.
+    """
+    if not path:
+        return
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"video_id": video_id, "stage": stage, "peak_rss_mb": round(peak_rss_mb()),
+                            "children_peak_rss_mb": round(peak_rss_mb(resource.RUSAGE_CHILDREN)), "stalls": stalls}) + "\n")
+
+
+def summarize_stages(path):
+    """
+    Summarize a --memory-log file.
+
+    Returns:
+        (stages, stalls): {"stage", "videos", "median_mb", "max_mb"} dicts in the order the stages first appear, using for
+        each record the larger of the process's and its children's peak; and the number of stalled commands killed.
+    """
+    stages = {}
+    stalls = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                stages.setdefault(record["stage"], []).append(max(record["peak_rss_mb"], record["children_peak_rss_mb"]))
+                # The count is cumulative per run of _merged08.py
+                stalls[record["video_id"]] = max(stalls.get(record["video_id"], 0), record.get("stalls", 0))
+    except FileNotFoundError:
+        return [], 0
+    return [
+        {"stage": stage, "videos": len(peaks), "median_mb": round(float(np.median(peaks))), "max_mb": max(peaks)}
+        for stage, peaks in stages.items()
+    ], sum(stalls.values())
@@ -1,15 +1,49 @@
+import os
 import subprocess
 import json
 from datetime import datetime
-import os
-from pyannote.audio import Pipeline
-from collections import defaultdict
 import argparse
+import torch
+import whisper
+from _kg_template import render_custom_kg
+from _fingerprint import (FingerprintIndex, FINGERPRINT_SECONDS, decode_audio, audio_duration, resample, compute_fingerprint,
+                          save_fingerprint, fingerprint_path, copy_outputs)
+from _stream_audio import AudioBuffer, AudioStream, SAMPLE_RATE
+from _transcribe import transcribe_stream, transcribe_file, checkpoint_path
+from _memory_budget import record_stage
+from _supervisor import run_supervised, stall_count
+from _artifacts import AUDIO_POLICIES, MP4_DIR, finish_audio
+from _diarize import load_pipeline, diarize, diarize_windowed, embedding_cache_path
+from _speakers import (turns_from_annotation, find_primary_speaker, primary_speaker_label,
+                       label_transcript, write_rttm, write_transcript_json, write_segment_txt)
 
 # Set up command-line argument parsing
 parser = argparse.ArgumentParser(description="Process a video: download audio, transcribe, and save as JSON, segmented .txt, and metadata JSON.")
 parser.add_argument("video_url", help="The URL of the video to process.")
+parser.add_argument("--word-timestamps", action="store_true", help="Ask Whisper for word timestamps, assign speakers word by word and split segments where the speaker changes.")
+parser.add_argument("--no-dedup", action="store_true", help="Transcribe even if the audio duplicates a video which has already been processed.")
+parser.add_argument("--stream", action="store_true", help="Transcription only: stream the audio through ffmpeg into memory instead of writing a .wav file.")
+parser.add_argument("--max-buffer-mb", type=int, default=256, help="With --stream, the audio held in memory before it spills to a temporary file.")
+parser.add_argument("--spool-dir", default=None, help="With --stream, where spilled audio goes (default: the system temporary directory).")
+parser.add_argument("--resumable", action="store_true", help="Checkpoint transcription and diarization and resume from the checkpoints when run again after a crash.")
+parser.add_argument("--diarization-window", type=float, default=0, help="Diarize in overlapping windows of this many seconds, linking the speakers across windows, so memory does not grow with the length of the video (default: 0, the whole recording at once).")
+parser.add_argument("--diarization-overlap", type=float, default=120.0, help="With --diarization-window, the overlap between consecutive windows in seconds.")
+parser.add_argument("--asr-threads", type=int, default=None, help="The torch threads used for transcription (default: torch's own choice, one per core).")
+parser.add_argument("--diar-threads", type=int, default=None, help="The torch threads used for diarization (default: torch's own choice, one per core).")
+parser.add_argument("--memory-log", default=None, help="Append the peak memory after each stage to this JSON lines file (see _memory_budget.py).")
+parser.add_argument("--stall-timeout", type=float, default=600.0, help="Kill and restart yt-dlp or whisper when it makes no progress for this many seconds.")
+parser.add_argument("--stall-retries", type=int, default=2, help="How many times a stalled yt-dlp or whisper is started again before giving up.")
+parser.add_argument("--audio-policy", choices=AUDIO_POLICIES, default="keep", help="What to do with the .wav once the video is done: keep it, delete it, compress it to .opus, or move it to --mp4-dir for _wav_to_mp4_03.py (see _artifacts.py).")
+parser.add_argument("--mp4-dir", default=MP4_DIR, help="With --audio-policy keep-for-mp4, the folder _wav_to_mp4_03.py converts.")
+parser.add_argument("--checkpoint-every", type=float, default=60.0, help="With --resumable, seconds between transcription checkpoints.")
 args = parser.parse_args()
+if args.stream and args.word_timestamps:
+    parser.error("--word-timestamps needs the whisper CLI, which reads a file; it cannot be combined with --stream.")
+if args.resumable and args.word_timestamps:
+    parser.error("--word-timestamps needs the whisper CLI, which cannot checkpoint; it cannot be combined with --resumable.")
+
+# yt-dlp and whisper run under _supervisor.py, which kills and restarts them when their output and files stop changing
+supervision = {"stall_timeout": args.stall_timeout, "retries": args.stall_retries}
 
 # Use the provided video URL
 url = args.video_url
@@ -19,7 +53,7 @@ print(f"Starting processing for video: {url}")
 
 # Step 1: Get metadata using yt-dlp
 try:
-    result = subprocess.run(['yt-dlp', '--dump-json', url], capture_output=True, text=True, check=True)
+    result = run_supervised(['yt-dlp', '--dump-json', url], capture_output=True, text=True, check=True, **supervision)
     info = json.loads(result.stdout)
     metadata = {
         "channelName": info['uploader'],
@@ -35,39 +69,185 @@ except subprocess.CalledProcessError as e:
 # Step 2: Download audio using yt-dlp
 video_id = info['id']
 audio_filename = f"{video_id}.wav"
+if args.stream:
+    # yt-dlp -> ffmpeg -> 16 kHz mono PCM in memory (spilling to a temporary file past --max-buffer-mb), see _stream_audio.py
+    # The download runs in the background: fingerprinting and transcription start as soon as their audio has arrived.
+    audio_stream = AudioStream(url, AudioBuffer(args.max_buffer_mb << 20, args.spool_dir), **supervision)
+    audio_buffer = audio_stream.buffer
+    print("Audio streaming started")
+
+    def finish_stream():
+        """Wait for the end of the download and exit if yt-dlp or ffmpeg failed or stalled."""
+        try:
+            audio_stream.wait()
+        except subprocess.CalledProcessError as e:
+            print(f"Error streaming audio: {e}\n{e.stderr}")
+            exit(1)
+        spilled = " (spilled to disk)" if audio_buffer.spilled else ""
+        print(f"Audio streamed: {audio_buffer.duration / 60:.1f} minutes{spilled}")
+elif args.resumable and os.path.exists(audio_filename):
+    # yt-dlp renames the .wav into place only once it is complete, so an existing one is from an earlier run
+    print(f"Using the audio downloaded by an earlier run: {audio_filename}")
+else:
+    try:
+        # The partial download and the extracted audio grow while yt-dlp's progress lines may pause
+        run_supervised(['yt-dlp', '--newline', '-x', '--audio-format', 'wav', '--output', audio_filename, url], check=True,
+                       watch_glob=f"{video_id}.*", **supervision)
+        print(f"Audio downloaded successfully: {audio_filename}")
+    except subprocess.CalledProcessError as e:
+        print(f"Error downloading audio: {e}")
+        exit(1)
+
+record_stage(args.memory_log, video_id, "download", stalls=stall_count())
+
+# The .wav is cleaned up according to --audio-policy once nothing in this script needs it any more:
+# after Step 12, or when Step 2b finds a duplicate (see _artifacts.py)
+def clean_up_audio():
+    if args.stream:
+        return
+    try:
+        print(f"Audio {finish_audio(audio_filename, args.audio_policy, args.mp4_dir)}")
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Error applying the audio policy {args.audio_policy}, keeping {audio_filename}: {e}")
+
+# Step 2b: Check the audio fingerprint against the videos already processed in this directory
+# A re-upload of the same audio gets a copy of the earlier transcript with its own metadata, skipping Whisper and pyannote.
+# Partial overlaps (clips of a longer video, compilations) are reported and transcribed as usual.
 try:
-    subprocess.run(['yt-dlp', '-x', '--audio-format', 'wav', '--output', audio_filename, url], check=True)
-    print(f"Audio downloaded successfully: {audio_filename}")
-except subprocess.CalledProcessError as e:
-    print(f"Error downloading audio: {e}")
-    exit(1)
+    if args.stream:
+        # Only the first minutes are needed. The download is still running, so the duration comes from the metadata.
+        audio_buffer.wait_for(FINGERPRINT_SECONDS * SAMPLE_RATE)
+        if audio_buffer.error is not None:
+            # The stream stalled or failed: a fingerprint of what arrived would be wrong
+            finish_stream()
+        audio_seconds = float(info.get('duration') or 0)
+        fingerprint = compute_fingerprint(resample(audio_buffer.read(0, FINGERPRINT_SECONDS * SAMPLE_RATE), SAMPLE_RATE))
+    else:
+        audio_seconds = audio_duration(audio_filename)
+        fingerprint = compute_fingerprint(decode_audio(audio_filename))
+    matches = [match for match in FingerprintIndex(".").match(fingerprint, audio_seconds) if match['video_id'] != video_id]
+    for match in matches:
+        print(f"Audio fingerprint: {match['kind']} of {match['video_id']} at {match['offset']}s "
+              f"({match['matched_seconds']}s matched, bit error rate {match['bit_error_rate']})")
+    save_fingerprint(fingerprint_path(".", video_id), fingerprint, audio_seconds)
+except (subprocess.CalledProcessError, ValueError, OSError) as e:
+    print(f"Error fingerprinting audio, continuing without deduplication: {e}")
+    matches = []
+
+duplicates = [match['video_id'] for match in matches if match['kind'] == 'duplicate']
+if duplicates and not args.no_dedup:
+    for source_id in duplicates:
+        if copy_outputs(source_id, video_id, metadata):
+            if args.stream:
+                audio_stream.stop()
+            print(f"Duplicate of {source_id}: transcript copied to {video_id}.json, {video_id}.txt and {video_id}_metadata.json")
+            clean_up_audio()
+            exit(0)
+    print(f"No finished transcript to copy from {', '.join(duplicates)}. Transcribing.")
+
+record_stage(args.memory_log, video_id, "fingerprint", stalls=stall_count())
 
 # Step 3: Run Whisper to transcribe the audio
+# A transcript already written by _transcribe.py (batched transcription) is used as is.
+# A finished <video_id>.json from an earlier run of this script has a 'metadata' key and is transcribed again.
 whisper_output = f"{video_id}.json"
-try:
-    subprocess.run(['whisper', audio_filename, '--model', 'medium', '--output_format', 'json'], check=True)
+
+def has_raw_transcript(path):
+    """Return True if path holds whisper output which has not been processed by this script yet."""
+    try:
+        with open(path, 'r') as f:
+            return 'metadata' not in json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+# With --resumable the Whisper Python API is used (see _transcribe.py): its progress is saved to <video_id>.transcribe.ckpt.json
+# at most every --checkpoint-every seconds, and a new run continues from there.
+checkpoint_options = {}
+# Set by _process_channel_videos02.py when several of these processes share the machine, see _cpu_topology.py
+if args.asr_threads:
+    torch.set_num_threads(args.asr_threads)
+if args.resumable:
+    checkpoint_options = {"checkpoint_path": checkpoint_path(".", video_id), "checkpoint_every": args.checkpoint_every, "checkpoint_key": "medium"}
+
+if has_raw_transcript(whisper_output):
+    print(f"Using existing transcription: {whisper_output}")
+elif args.stream:
+    # The whisper CLI only reads files, so the streamed audio goes through the Whisper Python API (see _transcribe.py).
+    # Each 30 second window is transcribed as soon as it has been downloaded, and finished segments are appended
+    # to <video_id>.partial.jsonl, so a long video can be followed while it downloads.
+    # Each window is prompted with the previous text, as the whisper CLI does.
+    partial_output = f"{video_id}.partial.jsonl"
+    open(partial_output, 'w').close()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = whisper.load_model('medium', device=device)
+    result = transcribe_stream(model, video_id, audio_buffer, condition_on_previous_text=True, partial_path=partial_output,
+                               **checkpoint_options)
+    del model
+    # A failed download must not leave a truncated transcript behind for the next run to reuse
+    finish_stream()
+    with open(whisper_output, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.remove(partial_output)
+    if args.resumable and os.path.exists(checkpoint_options["checkpoint_path"]):
+        os.remove(checkpoint_options["checkpoint_path"])
     print(f"Transcription completed: {whisper_output}")
-except subprocess.CalledProcessError as e:
-    print(f"Error running Whisper: {e}")
-    exit(1)
+elif args.resumable:
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = whisper.load_model('medium', device=device)
+    result = transcribe_file(model, video_id, audio_filename, condition_on_previous_text=True, **checkpoint_options)
+    del model
+    with open(whisper_output, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    if os.path.exists(checkpoint_options["checkpoint_path"]):
+        os.remove(checkpoint_options["checkpoint_path"])
+    print(f"Transcription completed: {whisper_output}")
+else:
+    try:
+        whisper_command = ['whisper', audio_filename, '--model', 'medium', '--output_format', 'json']
+        if args.word_timestamps:
+            whisper_command += ['--word_timestamps', 'True']
+        if args.asr_threads:
+            whisper_command += ['--threads', str(args.asr_threads)]
+        # Whisper prints each segment as it is transcribed
+        run_supervised(whisper_command, check=True, **supervision)
+        print(f"Transcription completed: {whisper_output}")
+    except subprocess.CalledProcessError as e:
+        print(f"Error running Whisper: {e}")
+        exit(1)
 
-# Step 4: Perform diarization using pyannote
-pipeline = Pipeline.from_pretrained(
-    "pyannote/speaker-diarization",
-    use_auth_token=os.environ["HuggingFace_API_KEY"]
-)
-diarization = pipeline(audio_filename)
+if args.stream:
+    finish_stream()
+record_stage(args.memory_log, video_id, "transcribe", stalls=stall_count())
 
-# Calculate total speaking time for each speaker
-speaker_times = defaultdict(float)
-for turn, _, speaker in diarization.itertracks(yield_label=True):
-    duration = turn.end - turn.start
-    speaker_times[speaker] += duration
+# Step 4: Perform diarization using pyannote
+# The segmentation scores and speaker embeddings are cached so _recluster.py can tune the clustering later without recomputing them.
+if args.diar_threads:
+    torch.set_num_threads(args.diar_threads)
+pipeline = load_pipeline()
+if args.diarization_window:
+    # Windowed diarization of very long videos writes no embedding cache (_recluster.py does not apply);
+    # with --resumable each finished window is saved to <video_id>.diarization.windows.json
+    windows_checkpoint = f"{video_id}.diarization.windows.json" if args.resumable else None
+    # Streamed audio is read window by window from the buffer, never as one waveform
+    diarization = diarize_windowed(pipeline, audio_buffer if args.stream else audio_filename, video_id,
+                                   window=args.diarization_window, overlap=args.diarization_overlap, checkpoint_path=windows_checkpoint)
+    if windows_checkpoint and os.path.exists(windows_checkpoint):
+        os.remove(windows_checkpoint)
+else:
+    # With --resumable the cache doubles as a checkpoint: a new run continues after the last finished stage (segmentation or embeddings)
+    diarization = diarize(pipeline, audio_buffer.waveform() if args.stream else audio_filename, video_id,
+                          cache_path=embedding_cache_path(video_id), resume=args.resumable)
+diarization_turns = turns_from_annotation(diarization)
+record_stage(args.memory_log, video_id, "diarize", stalls=stall_count())
+# Persist the turns so _relabel.py can rebuild the speaker labels without running Whisper and pyannote again
+rttm_output = f"{video_id}.rttm"
+write_rttm(rttm_output, video_id, diarization_turns)
+print(f"Diarization turns saved: {rttm_output}")
 
 # Identify the primary speaker
-primary_speaker = max(speaker_times, key=speaker_times.get)
+primary_speaker = find_primary_speaker(diarization_turns)
 # Use the first name or channel name as the speaker label
-primary_speaker_name = metadata['channelName'].split()[0]  # e.g., "Max" from "Max Gulhane MD"
+primary_speaker_name = primary_speaker_label(metadata['channelName'])  # e.g., "Max" from "Max Gulhane MD"
 print(f"Primary speaker identified: {primary_speaker} (labeled as {primary_speaker_name})")
 
 # Step 5: Load the Whisper JSON output
@@ -88,299 +268,38 @@ for segment in whisper_data['segments']:
     segment.pop('tokens', None)
 
 # Step 7: Assign speakers to each transcription segment
-diarization_turns = list(diarization.itertracks(yield_label=True))
-
-def assign_speaker(segment_start, segment_end, turns):
-    """Assign a speaker to a segment based on maximum overlap with diarization turns."""
-    overlap_durations = defaultdict(float)
-    for turn, _, speaker in turns:
-        turn_start = turn.start
-        turn_end = turn.end
-        overlap_start = max(segment_start, turn_start)
-        overlap_end = min(segment_end, turn_end)
-        if overlap_start < overlap_end:
-            overlap_duration = overlap_end - overlap_start
-            overlap_durations[speaker] += overlap_duration
-    if overlap_durations:
-        assigned_speaker = max(overlap_durations, key=overlap_durations.get)
-        return primary_speaker_name if assigned_speaker == primary_speaker else assigned_speaker
-    return "Unknown"
-
-# Add speaker labels to each segment
-for segment in whisper_data['segments']:
-    speaker = assign_speaker(segment['start'], segment['end'], diarization_turns)
-    segment['speaker'] = speaker
+# With word timestamps each word gets a speaker and segments are split where the speaker changes
+label_transcript(whisper_data, diarization_turns, primary_speaker, primary_speaker_name)
 
 # Step 8: Add metadata to the JSON
 whisper_data['metadata'] = metadata
 
-# Step 9: Reorder the keys to have 'language' and 'metadata' at the top
-final_data = {
-    "language": whisper_data["language"],
-    "metadata": whisper_data["metadata"],
-    "text": whisper_data["text"],
-    "segments": whisper_data["segments"]
-}
-
-# Step 10: Save the updated JSON transcript
-with open(whisper_output, 'w') as f:
-    json.dump(final_data, f, indent=4)
+# Steps 9 and 10: Save the updated JSON transcript with 'language' and 'metadata' at the top
+write_transcript_json(whisper_output, whisper_data)
 print(f"Updated JSON transcript saved: {whisper_output}")
 
 # Step 11: Generate segmented .txt file for transcript segments
 txt_output = f"{video_id}.txt"
 try:
-    # Build segments with rounded timestamps
-    segments_lines = []
-    for segment in whisper_data['segments']:
-        start = round(segment['start'], 2)
-        end = round(segment['end'], 2)
-        text = segment['text'].strip()
-        speaker = segment['speaker']
-        segment_line = f"[{start} > {end}] ({speaker}) {text}"
-        segments_lines.append(segment_line)
-
-    # Write to .txt file
-    with open(txt_output, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(segments_lines))
+    write_segment_txt(txt_output, whisper_data['segments'])
     print(f"Segmented .txt file saved: {txt_output}")
 except Exception as e:
     print(f"Error generating .txt file: {e}")
 
 # Step 12: Generate metadata .json file in custom KG format
+# The KG template is shared with _meta_only.py (see _kg_template.py)
 metadata_json_output = f"{video_id}_metadata.json"
 try:
-    # Extract platform from URL
-    platform = metadata['url'].split('/')[2].split('?')[0]
-    # Prepare metadata values
-    metadata_values = {
-        "VIDEO_URL": metadata['url'],
-        "VIDEO_PLATFORM": platform,
-        "VIDEO_CHANNEL": metadata['channelName'],
-        "VIDEO_TITLE": metadata['videoTitle'],
-        "VIDEO_POST_DATETIME": metadata['videoPostDate'],
-        "VIDEO_LANGUAGE": whisper_data['language']
-    }
-    # Construct custom KG JSON
-    custom_kg = {
-        "chunks": [
-            {
-                "content": (
-                    f"The video URL is {metadata_values['VIDEO_URL']}\n"
-                    f"The video platform is {metadata_values['VIDEO_PLATFORM']}\n"
-                    f"The video channel is {metadata_values['VIDEO_CHANNEL']}\n"
-                    f"The video title is {metadata_values['VIDEO_TITLE']}\n"
-                    f"The video was posted on {metadata_values['VIDEO_POST_DATETIME']}\n"
-                    f"The video language is {metadata_values['VIDEO_LANGUAGE']}"
-                ),
-                "source_id": f"{video_id}_metadata.json"
-            }
-        ],
-        "entities": [
-            {
-                "entity_name": "source-document-global-hub",
-                "entity_type": "source-document-global-hub",
-                "description": "The source-document-global-hub joins all source documents via edge relationships. source-document-global-hub can be referenced to list all source documents",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": "metadata-global-hub",
-                "entity_type": "metadata-global-hub",
-                "description": "The metadata-global-hub joins all metadata-hub entities via edge relationships. metadata-global-hub can be referenced to list all metadata-hubs",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": f"{video_id}_metadata.json",
-                "entity_type": "metadata-hub",
-                "description": f"{video_id}_metadata.json is a meta-data-hub. All metadata for the source document {video_id}.txt can be located by referencing {video_id}_metadata.json",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": f"{video_id}.txt",
-                "entity_type": "source-document",
-                "description": f"{video_id}.txt is the file name of a source document used to populate this index with information. {video_id}.txt contains a video transcript",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_URL'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "URL for source video",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_PLATFORM'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "video platform which hosted the source video.",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_CHANNEL'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "Video channel which published the source video.",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_TITLE'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "Video title for source video",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_POST_DATETIME'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "Date source video was posted.",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_LANGUAGE'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "Language spoken in the source video",
-                "source_id": f"{video_id}_metadata.json"
-            }
-        ],
-        "relationships": [
-            {
-                "src_id": metadata_values['VIDEO_URL'],
-                "tgt_id": metadata_values['VIDEO_PLATFORM'],
-                "description": f"The source video found at the URL {metadata_values['VIDEO_URL']} was hosted by {metadata_values['VIDEO_PLATFORM']} platform",
-                "keywords": "source video URL host platform",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_URL'],
-                "tgt_id": metadata_values['VIDEO_CHANNEL'],
-                "description": f"The source video found at URL {metadata_values['VIDEO_URL']} was produced by the {metadata_values['VIDEO_CHANNEL']} video channel",
-                "keywords": "source video URL channel produced",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_URL'],
-                "tgt_id": metadata_values['VIDEO_TITLE'],
-                "description": f"The source video at URL {metadata_values['VIDEO_URL']} is titled {metadata_values['VIDEO_TITLE']}",
-                "keywords": "source video URL title",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_URL'],
-                "tgt_id": metadata_values['VIDEO_POST_DATETIME'],
-                "description": f"The source video at URL {metadata_values['VIDEO_URL']} was posted at the date and time of {metadata_values['VIDEO_POST_DATETIME']}",
-                "keywords": "source video URL posted date time",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_PLATFORM'],
-                "tgt_id": metadata_values['VIDEO_CHANNEL'],
-                "description": f"{metadata_values['VIDEO_PLATFORM']} was the platform hosting the {metadata_values['VIDEO_CHANNEL']} channel",
-                "keywords": "platform hosting channel",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_CHANNEL'],
-                "tgt_id": metadata_values['VIDEO_TITLE'],
-                "description": f"The {metadata_values['VIDEO_CHANNEL']} channel produced the video titled {metadata_values['VIDEO_TITLE']}",
-                "keywords": "channel content creator produced video",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_TITLE'],
-                "tgt_id": metadata_values['VIDEO_POST_DATETIME'],
-                "description": f"The video titled {metadata_values['VIDEO_TITLE']} was posted on {metadata_values['VIDEO_POST_DATETIME']}",
-                "keywords": "titled video posted date time",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_TITLE'],
-                "tgt_id": metadata_values['VIDEO_LANGUAGE'],
-                "description": f"The video titled {metadata_values['VIDEO_TITLE']} was presented in the {metadata_values['VIDEO_LANGUAGE']} language",
-                "keywords": "titled video spoken language",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": "metadata-global-hub",
-                "tgt_id": f"{video_id}_metadata.json",
-                "description": f"{video_id}_metadata.json is an element of the set metadata-global-hub",
-                "keywords": "element of metadata-global-hub",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": "source-document-global-hub",
-                "tgt_id": f"{video_id}.txt",
-                "description": f"{video_id}.txt is an element of the set source-document-global-hub",
-                "keywords": "element of source-document-global-hub",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": f"{video_id}.txt",
-                "description": f"{video_id}_metadata.json is the metadata hub for the source document {video_id}.txt",
-                "keywords": f"metadata for {video_id}.txt",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_URL'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the URL {metadata_values['VIDEO_URL']}",
-                "keywords": f"URL {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_PLATFORM'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the video platform {metadata_values['VIDEO_PLATFORM']}",
-                "keywords": f"video platform {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_CHANNEL'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the video channel {metadata_values['VIDEO_CHANNEL']}",
-                "keywords": f"video channel {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_TITLE'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the video titled {metadata_values['VIDEO_TITLE']}",
-                "keywords": f"video title {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_POST_DATETIME'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the video posting time and date of {metadata_values['VIDEO_POST_DATETIME']}",
-                "keywords": f"posting date time {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_LANGUAGE'],
-                "description": f"{video_id}_metadata.json is the metadata hub for {metadata_values['VIDEO_LANGUAGE']}, the spoken language in the video",
-                "keywords": f"{metadata_values['VIDEO_LANGUAGE']} spoken language {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            }
-        ]
-    }
+    custom_kg = render_custom_kg(video_id, metadata, whisper_data['language'])
 
     # Write to .json file
     with open(metadata_json_output, 'w', encoding='utf-8') as f:
         json.dump(custom_kg, f, indent=4)
     print(f"Metadata JSON file saved: {metadata_json_output}")
 except Exception as e:
-    print(f"Error generating metadata .json file: {e}")
\ No newline at end of file
+    print(f"Error generating metadata .json file: {e}")
+
+# Step 13: Every step is done with the audio
+clean_up_audio()
+
+record_stage(args.memory_log, video_id, "outputs", stalls=stall_count())
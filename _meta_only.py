@@ -1,283 +1,211 @@
 # Run this script with the following command:
-# python3 generate_metadata_json.py <video_id>.json
+# python3 _meta_only.py <video_id>.json
+
+# Or, to regenerate the KG files for a whole directory (or glob) in parallel:
+# python3 _meta_only.py ./ --workers 8
+# python3 _meta_only.py "./*.json" --output-dir ./kg
 
 # This script relies on the file <video_id>.json which must be created by _merge??.py.
 # <video_id>.json is an argument for the name of the input file.
 # Use the actual name of the file which was created by _merge??.py.
 
 # Sometimes I need to tweek the output of <video_id>_metadata.json after _merge??.py has been run.
-# I could modify the dictionary (custom_kg) in _merge??.py and run it again, but the run time would just as long as the first time it was run.
-# This by tweeking the dictionary (custom_kg) in this script we greatly reduce the time required to get the same result.
+# I could modify the KG template and run _merge??.py again, but the run time would just as long as the first time it was run.
+# The KG template (KG_SCHEMA) lives in _kg_template.py and is shared with _merged08.py.
+# After tweeking it, running this script regenerates the same result in a fraction of the time.
+
+# In batch mode only the 'language' and 'metadata' fields at the top of each transcript are parsed, not the full transcript.
+# A <video_id>_metadata.json which is newer than both its transcript and _kg_template.py is skipped unless --force is given.
+# With --delta-state only the KG items which changed since the last export are written to a delta for LightRAG (see _kg_delta.py).
 
 
 
 import json
 import argparse
 import os
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import _kg_template
+from _kg_template import render_custom_kg
+from _kg_bundle import find_kg_files
+from _kg_delta import export_delta, STATE_FILE
+from _transcripts import is_transcript_name
+
+HEADER_KEYS = ("language", "metadata")
 
-# Set up command-line argument parsing
-parser = argparse.ArgumentParser(description="Generate metadata JSON from an existing video transcript JSON.")
-parser.add_argument("json_file", help="Path to the video transcript JSON file (e.g., <video_id>.json).")
-args = parser.parse_args()
 
-# Get the input JSON file
-json_file = args.json_file
-video_id = os.path.splitext(os.path.basename(json_file))[0]  # Extract video_id from filename
+def read_header(json_file, block_size=4096):
+    """
+    Read only the 'language' and 'metadata' fields of a transcript JSON.
 
-# Step 1: Load the transcript JSON
-try:
+    _merge??.py writes these two keys before 'text' and 'segments', so the file is parsed key by key
+    from the start and reading stops as soon as both are found. The rest of the transcript is never read.
+
+    Returns:
+        dict: The header fields which were found.
+    """
+    decoder = json.JSONDecoder()
+    header = {}
     with open(json_file, 'r', encoding='utf-8') as f:
-        transcript_data = json.load(f)
-    print(f"Loaded transcript JSON: {json_file}")
-except FileNotFoundError:
-    print(f"Error: {json_file} not found.")
-    exit(1)
-except json.JSONDecodeError:
-    print(f"Error: Failed to decode JSON from {json_file}.")
-    exit(1)
-
-# Step 2: Extract metadata and language
-try:
-    metadata = transcript_data['metadata']
-    language = transcript_data['language']
-except KeyError as e:
-    print(f"Error: Missing key {e} in {json_file}. Ensure it contains 'metadata' and 'language'.")
-    exit(1)
-
-# Step 3: Generate metadata .json file in custom KG format
-metadata_json_output = f"{video_id}_metadata.json"
-try:
-    # Extract platform from URL
-    platform = metadata['url'].split('/')[2].split('?')[0]
-    # Prepare metadata values
-    metadata_values = {
-        "VIDEO_URL": metadata['url'],
-        "VIDEO_PLATFORM": platform,
-        "VIDEO_CHANNEL": metadata['channelName'],
-        "VIDEO_TITLE": metadata['videoTitle'],
-        "VIDEO_POST_DATETIME": metadata['videoPostDate'],
-        "VIDEO_LANGUAGE": language
-    }
-    # Construct custom KG JSON
-    custom_kg = {
-        "chunks": [
-            {
-                "content": (
-                    f"The video URL is {metadata_values['VIDEO_URL']}\n"
-                    f"The video platform is {metadata_values['VIDEO_PLATFORM']}\n"
-                    f"The video channel is {metadata_values['VIDEO_CHANNEL']}\n"
-                    f"The video title is {metadata_values['VIDEO_TITLE']}\n"
-                    f"The video was posted on {metadata_values['VIDEO_POST_DATETIME']}\n"
-                    f"The video language is {metadata_values['VIDEO_LANGUAGE']}"
-                ),
-                "source_id": f"{video_id}_metadata.json"
-            }
-        ],
-        "entities": [
-            {
-                "entity_name": "source-document-global-hub",
-                "entity_type": "source-document-global-hub",
-                "description": "The source-document-global-hub joins all source documents via edge relationships. source-document-global-hub can be referenced to list all source documents",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": "metadata-global-hub",
-                "entity_type": "metadata-global-hub",
-                "description": "The metadata-global-hub joins all metadata-hub entities via edge relationships. metadata-global-hub can be referenced to list all metadata-hubs",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": f"{video_id}_metadata.json",
-                "entity_type": "metadata-hub",
-                "description": f"{video_id}_metadata.json is a meta-data-hub. All metadata for the source document {video_id}.txt can be located by referencing {video_id}_metadata.json",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": f"{video_id}.txt",
-                "entity_type": "source-document",
-                "description": f"{video_id}.txt is the file name of a source document used to populate this index with information. {video_id}.txt contains a video transcript",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_URL'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "URL for source video",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_PLATFORM'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "video platform which hosted the source video.",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_CHANNEL'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "Video channel which published the source video.",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_TITLE'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "Video title for source video",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_POST_DATETIME'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "Date source video was posted.",
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "entity_name": metadata_values['VIDEO_LANGUAGE'],
-                "entity_type": f"metadata-for-{video_id}.txt",
-                "description": "Language spoken in the source video",
-                "source_id": f"{video_id}_metadata.json"
-            }
-        ],
-        "relationships": [
-            {
-                "src_id": metadata_values['VIDEO_URL'],
-                "tgt_id": metadata_values['VIDEO_PLATFORM'],
-                "description": f"The source video found at the URL {metadata_values['VIDEO_URL']} was hosted by {metadata_values['VIDEO_PLATFORM']} platform",
-                "keywords": "source video URL host platform",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_URL'],
-                "tgt_id": metadata_values['VIDEO_CHANNEL'],
-                "description": f"The source video found at URL {metadata_values['VIDEO_URL']} was produced by the {metadata_values['VIDEO_CHANNEL']} video channel",
-                "keywords": "source video URL channel produced",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_URL'],
-                "tgt_id": metadata_values['VIDEO_TITLE'],
-                "description": f"The source video at URL {metadata_values['VIDEO_URL']} is titled {metadata_values['VIDEO_TITLE']}",
-                "keywords": "source video URL title",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_URL'],
-                "tgt_id": metadata_values['VIDEO_POST_DATETIME'],
-                "description": f"The source video at URL {metadata_values['VIDEO_URL']} was posted at the date and time of {metadata_values['VIDEO_POST_DATETIME']}",
-                "keywords": "source video URL posted date time",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_PLATFORM'],
-                "tgt_id": metadata_values['VIDEO_CHANNEL'],
-                "description": f"{metadata_values['VIDEO_PLATFORM']} was the platform hosting the {metadata_values['VIDEO_CHANNEL']} channel",
-                "keywords": "platform hosting channel",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_CHANNEL'],
-                "tgt_id": metadata_values['VIDEO_TITLE'],
-                "description": f"The {metadata_values['VIDEO_CHANNEL']} channel produced the video titled {metadata_values['VIDEO_TITLE']}",
-                "keywords": "channel content creator produced video",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_TITLE'],
-                "tgt_id": metadata_values['VIDEO_POST_DATETIME'],
-                "description": f"The video titled {metadata_values['VIDEO_TITLE']} was posted on {metadata_values['VIDEO_POST_DATETIME']}",
-                "keywords": "titled video posted date time",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": metadata_values['VIDEO_TITLE'],
-                "tgt_id": metadata_values['VIDEO_LANGUAGE'],
-                "description": f"The video titled {metadata_values['VIDEO_TITLE']} was presented in the {metadata_values['VIDEO_LANGUAGE']} language",
-                "keywords": "titled video spoken language",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": "metadata-global-hub",
-                "tgt_id": f"{video_id}_metadata.json",
-                "description": f"{video_id}_metadata.json is an element of the set metadata-global-hub",
-                "keywords": "element of metadata-global-hub",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": "source-document-global-hub",
-                "tgt_id": f"{video_id}.txt",
-                "description": f"{video_id}.txt is an element of the set source-document-global-hub",
-                "keywords": "element of source-document-global-hub",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": f"{video_id}.txt",
-                "description": f"{video_id}_metadata.json is the metadata hub for the source document {video_id}.txt",
-                "keywords": f"metadata for {video_id}.txt",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_URL'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the URL {metadata_values['VIDEO_URL']}",
-                "keywords": f"URL {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_PLATFORM'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the video platform {metadata_values['VIDEO_PLATFORM']}",
-                "keywords": f"video platform {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_CHANNEL'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the video channel {metadata_values['VIDEO_CHANNEL']}",
-                "keywords": f"video channel {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_TITLE'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the video titled {metadata_values['VIDEO_TITLE']}",
-                "keywords": f"video title {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_POST_DATETIME'],
-                "description": f"{video_id}_metadata.json is the metadata hub for the video posting time and date of {metadata_values['VIDEO_POST_DATETIME']}",
-                "keywords": f"posting date time {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            },
-            {
-                "src_id": f"{video_id}_metadata.json",
-                "tgt_id": metadata_values['VIDEO_LANGUAGE'],
-                "description": f"{video_id}_metadata.json is the metadata hub for {metadata_values['VIDEO_LANGUAGE']}, the spoken language in the video",
-                "keywords": f"{metadata_values['VIDEO_LANGUAGE']} spoken language {video_id}_metadata.json",
-                "weight": 7.0,
-                "source_id": f"{video_id}_metadata.json"
-            }
-        ]
-    }
-
-    # Write to .json file
-    with open(metadata_json_output, 'w', encoding='utf-8') as f:
-        json.dump(custom_kg, f, indent=4)
-    print(f"Metadata JSON file saved: {metadata_json_output}")
-except Exception as e:
-    print(f"Error generating metadata .json file: {e}")
\ No newline at end of file
+        buffer = f.read(block_size)
+        position = 0
+        eof = False
+
+        def skip(chars):
+            # Skip whitespace and the given separator characters
+            nonlocal position
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] in chars):
+                position += 1
+
+        while True:
+            skip("{,")
+            if position < len(buffer) and buffer[position] == '}':
+                break
+            # A key and its value are decoded together, so an item cut by the end of the buffer is read again whole
+            item_start = position
+            try:
+                key, position = decoder.raw_decode(buffer, position)
+                skip(":")
+                value, end = decoder.raw_decode(buffer, position)
+                if end == len(buffer) and not eof:
+                    # A number at the end of the buffer may continue in the next block
+                    raise ValueError("value may be truncated")
+                position = end
+            except ValueError:
+                if eof:
+                    raise json.JSONDecodeError("Unexpected end of file", buffer, item_start)
+                # Growing the reads with the item keeps a large value (e.g., the segments of raw Whisper output) linear to read
+                more = f.read(max(block_size, len(buffer) - item_start))
+                eof = not more
+                buffer = buffer[item_start:] + more
+                position = 0
+                continue
+            if key in HEADER_KEYS:
+                header[key] = value
+                if len(header) == len(HEADER_KEYS):
+                    break
+    return header
+
+
+def is_current(output_path, json_file, template_mtime):
+    """Return True if output_path is newer than both the transcript and the KG template."""
+    try:
+        output_mtime = os.path.getmtime(output_path)
+    except OSError:
+        return False
+    return output_mtime > os.path.getmtime(json_file) and output_mtime > template_mtime
+
+
+def generate_metadata_json(json_file, output_dir=".", template_mtime=None, force=False):
+    """
+    Generate <video_id>_metadata.json for one transcript.
+
+    Returns:
+        str: "written", "skipped" (output already current), "ignored" (not a transcript) or an error message.
+    """
+    video_id = os.path.splitext(os.path.basename(json_file))[0]  # Extract video_id from filename
+    metadata_json_output = os.path.join(output_dir, f"{video_id}_metadata.json")
+    if not force and template_mtime is not None and is_current(metadata_json_output, json_file, template_mtime):
+        return "skipped"
+
+    try:
+        header = read_header(json_file)
+        # Other JSON with a video id's name (e.g., a calibration.json from older runs) has neither key
+        if not header:
+            return "ignored"
+        metadata = header['metadata']
+        language = header['language']
+    except FileNotFoundError:
+        return f"Error: {json_file} not found."
+    except json.JSONDecodeError:
+        return f"Error: Failed to decode JSON from {json_file}."
+    except KeyError as e:
+        return f"Error: Missing key {e} in {json_file}. Ensure it contains 'metadata' and 'language'."
+
+    try:
+        custom_kg = render_custom_kg(video_id, metadata, language)
+        # Write to .json file
+        with open(metadata_json_output, 'w', encoding='utf-8') as f:
+            json.dump(custom_kg, f, indent=4)
+    except Exception as e:
+        return f"Error generating metadata .json file for {json_file}: {e}"
+    return "written"
+
+
+def expand_inputs(inputs):
+    """Expand directories and glob patterns into transcript files, leaving out KG files and derived files."""
+    json_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "*.json"))
+        elif glob.has_magic(item):
+            matches = glob.glob(item)
+        else:
+            json_files.append(item)
+            continue
+        json_files.extend(sorted(path for path in matches if is_transcript_name(path)))
+    return json_files
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Generate metadata JSON from existing video transcript JSON files.")
+    parser.add_argument("json_files", nargs="+", help="Path to the video transcript JSON file (e.g., <video_id>.json), a directory or a glob pattern.")
+    parser.add_argument("--output-dir", default=".", help="Where to write <video_id>_metadata.json.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="The number of files processed in parallel in batch mode.")
+    parser.add_argument("--force", action="store_true", help="Regenerate outputs even when they are newer than the transcript and the template.")
+    parser.add_argument("--delta-state", default=None, help=f"In batch mode, export the KG items which changed since the last export (see _kg_delta.py) using this state file, e.g., {STATE_FILE}.")
+    parser.add_argument("--delta-dir", default="kg_deltas", help="Where to write the KG delta.")
+    args = parser.parse_args()
+
+    batch = len(args.json_files) > 1 or any(os.path.isdir(item) or glob.has_magic(item) for item in args.json_files)
+    json_files = expand_inputs(args.json_files)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Single file: always regenerate, as before
+    if not batch:
+        json_file = json_files[0]
+        status = generate_metadata_json(json_file, args.output_dir, force=True)
+        if status == "ignored":
+            print(f"Error: {json_file} is not a transcript: it has neither 'language' nor 'metadata'.")
+            exit(1)
+        if status != "written":
+            print(status)
+            exit(1)
+        video_id = os.path.splitext(os.path.basename(json_file))[0]
+        print(f"Metadata JSON file saved: {os.path.join(args.output_dir, f'{video_id}_metadata.json')}")
+        return
+
+    # Batch mode: changes to the KG template make every output stale
+    template_mtime = os.path.getmtime(_kg_template.__file__)
+    started = time.time()
+    counts = {"written": 0, "skipped": 0, "ignored": 0, "failed": 0}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        statuses = executor.map(
+            generate_metadata_json, json_files,
+            [args.output_dir] * len(json_files), [template_mtime] * len(json_files), [args.force] * len(json_files),
+            chunksize=64,
+        )
+        for status in statuses:
+            if status in counts:
+                counts[status] += 1
+            else:
+                print(status)
+                counts["failed"] += 1
+
+    elapsed = time.time() - started
+    rate = len(json_files) / elapsed if elapsed > 0 else float('inf')
+    print(f"Processed {len(json_files)} files in {elapsed:.1f} seconds ({rate:.0f} files/second): "
+          f"{counts['written']} written, {counts['skipped']} skipped, {counts['ignored']} not transcripts, {counts['failed']} failed.")
+
+    if args.delta_state:
+        export_delta(find_kg_files([args.output_dir]), args.delta_state, args.delta_dir)
+
+    if counts["failed"]:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,50 @@
 #!/usr/bin/env python3
 
-# Creates a list of all videos for a YouTube channel and passes each list item (a video) to _merged04.py for processing.
+# Creates a list of all videos for a YouTube channel and passes each list item (a video) to _merged08.py for processing.
 
 # The following is a sample run command.
 # The start index should be zero or where ever you want to start in the list of videos.
 # python3 _process_channel_videos02.py "https://www.youtube.com/@abrahamhickstips/videos" --start-index 0
 
+# Several videos can be processed side by side with --workers. Each worker gets a disjoint set of CPUs on one NUMA node
+# and _merged08.py is told to use that many threads (see _cpu_topology.py), so the workers do not oversubscribe the machine.
+# --calibrate runs the first videos with each workers x threads combination, prints the videos per hour of each,
+# and saves the best one to .calibration.json, which later runs use when --workers is not given.
+# Options the runner does not know are passed on to _merged08.py, e.g., --resumable.
+# python3 _process_channel_videos02.py "https://www.youtube.com/@abrahamhickstips/videos" --calibrate --calibrate-videos 4
+# python3 _process_channel_videos02.py "https://www.youtube.com/@abrahamhickstips/videos" --workers 4 --asr-threads 8 --diar-threads 4
+
+# Workers only start a video while the estimated peak memory of the videos in progress fits --memory-budget-mb
+# (default: 90% of the available memory). The estimates come from the video durations and are learned from the measured
+# peak RSS of finished videos (.memory_stats.json). Each stage's peak is logged to memory_stages.jsonl (see _memory_budget.py).
+
+# --audio-policy decides what happens to each .wav once its video is done (delete, compress, or move it to --mp4-dir for
+# _wav_to_mp4_03.py --delete-wav), and --spool-budget-gb pauses new videos while the audio on disk and the expected
+# downloads would exceed the budget (see _artifacts.py).
+# python3 _process_channel_videos02.py "https://www.youtube.com/@abrahamhickstips/videos" --workers 4 --audio-policy delete --spool-budget-gb 20
+
 import argparse
+import json
 import os
+import queue
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from _cpu_topology import numa_nodes, plan_workers, thread_environment, pin_to, describe_cpus
+from _memory_budget import MemoryModel, MemoryGate, available_memory_mb, parse_iso_duration, summarize_stages
+from _artifacts import AUDIO_POLICIES, MP4_DIR, SpoolGate
+
+SCRIPT = "_merged08.py"
+# Dot-files, so the scripts that scan the working directory for transcripts never pick them up
+CALIBRATION_FILE = ".calibration.json"
+MEMORY_STATS_FILE = ".memory_stats.json"
+MEMORY_LOG_FILE = "memory_stages.jsonl"
+
 def get_uploads_playlist_id(youtube, handle):
     """
     Retrieve the uploads playlist ID for a YouTube channel using its handle.
@@ -62,13 +95,209 @@ def get_uploads_playlist_id(youtube, handle):
         print(f"Error parsing API response: {e}")
         exit(1)
 
+def get_video_ids(youtube, uploads_playlist_id):
+    """Return the IDs of every video in the uploads playlist, newest first."""
+    video_ids = []
+    next_page_token = None
+    while True:
+        try:
+            playlistitems_response = youtube.playlistItems().list(
+                part="snippet",
+                playlistId=uploads_playlist_id,
+                maxResults=50,
+                pageToken=next_page_token
+            ).execute()
+            for item in playlistitems_response["items"]:
+                video_ids.append(item["snippet"]["resourceId"]["videoId"])
+            next_page_token = playlistitems_response.get("nextPageToken")
+            if not next_page_token:
+                break
+        except HttpError as e:
+            print(f"Error retrieving playlist items: {e}")
+            exit(1)
+    return video_ids
+
+def get_video_durations(youtube, video_ids):
+    """Return {video_id: seconds} from the videos' contentDetails, 50 videos per request. Unknown durations are left out."""
+    durations = {}
+    for i in range(0, len(video_ids), 50):
+        try:
+            videos_response = youtube.videos().list(
+                part="contentDetails",
+                id=",".join(video_ids[i:i + 50]),
+                maxResults=50
+            ).execute()
+        except HttpError as e:
+            print(f"Error retrieving video durations, estimating memory without them: {e}")
+            continue
+        for item in videos_response.get("items", []):
+            durations[item["id"]] = parse_iso_duration(item.get("contentDetails", {}).get("duration"))
+    return durations
+
+def video_id_of(video_url):
+    return video_url.split("v=")[-1]
+
+def stage_threads(cpus, asr_threads=None, diar_threads=None):
+    """The --asr-threads and --diar-threads of a worker: the requested counts, at most the worker's CPUs (default: all of them)."""
+    return min(asr_threads or len(cpus), len(cpus)), min(diar_threads or len(cpus), len(cpus))
+
+def run_videos(video_urls, plan, asr_threads=None, diar_threads=None, script_args=(), cwd=None, log_dir=None, first_number=1, total=None,
+               durations=None, memory_model=None, memory_gate=None, memory_log=None, spool_gate=None):
+    """
+    Process the videos with one worker per CPU set in plan, each running one _merged08.py at a time.
+
+    Args:
+        video_urls: The videos to process, in order.
+        plan: One list of CPU numbers per worker (see _cpu_topology.plan_workers).
+        asr_threads, diar_threads: The torch threads of the transcription and diarization stages (default: the worker's CPUs).
+        script_args: More options for _merged08.py.
+        cwd: The directory the outputs are written to (default: the current directory).
+        log_dir: When given, each video's output goes to <log_dir>/<video_id>.log instead of the console.
+        first_number, total: For the progress messages.
+        durations: {video_id: seconds}, for the memory estimates.
+        memory_model: A MemoryModel which estimates each video's peak memory and learns from the measured peak.
+        memory_gate: A MemoryGate which holds a video back until its estimate fits the memory budget.
+        memory_log: The --memory-log file of _merged08.py.
+        spool_gate: A SpoolGate which holds a video back until its download fits the disk budget.
+
+    Returns:
+        (processed, failed): The numbers of videos.
+    """
+    script = os.path.abspath(SCRIPT)
+    total = total or len(video_urls)
+    pending = queue.Queue()
+    for i, video_url in enumerate(video_urls):
+        pending.put((first_number + i, video_url))
+    lock = threading.Lock()
+    counts = {"processed": 0, "failed": 0}
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    def worker(cpus):
+        asr, diar = stage_threads(cpus, asr_threads, diar_threads)
+        command_options = ["--asr-threads", str(asr), "--diar-threads", str(diar), *script_args]
+        if memory_log:
+            command_options += ["--memory-log", os.path.abspath(memory_log)]
+        while True:
+            try:
+                number, video_url = pending.get_nowait()
+            except queue.Empty:
+                return
+            video_id = video_id_of(video_url)
+            seconds = (durations or {}).get(video_id, 0)
+            estimate = memory_model.estimate(seconds) if memory_model else 0
+            if spool_gate:
+                spool_gate.acquire(video_id, seconds)
+            if memory_gate:
+                memory_gate.acquire(estimate)
+            print(f"Processing video {number}/{total}: {video_url} (CPUs {describe_cpus(cpus)}, "
+                  f"{seconds / 60:.0f} minutes, estimated peak {estimate / 1024:.1f} GB)")
+            log = open(os.path.join(log_dir, video_id + ".log"), 'w') if log_dir else None
+            try:
+                process = subprocess.Popen(["python3", script, video_url, *command_options], cwd=cwd,
+                                           env=thread_environment(max(asr, diar)), preexec_fn=pin_to(cpus),
+                                           stdout=log, stderr=subprocess.STDOUT if log else None)
+                # wait4 reports the peak RSS of the process (and of its largest waited-for child, e.g., the whisper CLI)
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                peak_mb = usage.ru_maxrss / 1024
+            finally:
+                if log:
+                    log.close()
+                if memory_gate:
+                    memory_gate.release(estimate)
+                if spool_gate:
+                    spool_gate.release(video_id)
+            ok = process.returncode == 0
+            if not ok:
+                print(f"Error processing video {video_url}: {subprocess.CalledProcessError(process.returncode, process.args)}")
+            print(f"Finished video {number}/{total}: peak memory {peak_mb / 1024:.1f} GB (estimated {estimate / 1024:.1f} GB)")
+            with lock:
+                counts["processed" if ok else "failed"] += 1
+                # A failed run may have stopped before its peak, so only complete runs teach the model
+                if memory_model and ok:
+                    memory_model.observe(video_id, seconds, peak_mb)
+                    memory_model.save()
+
+    workers = [threading.Thread(target=worker, args=(cpus,)) for cpus in plan]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return counts["processed"], counts["failed"]
+
+def calibration_candidates(nodes, max_workers):
+    """Worker counts worth trying: powers of two and the number of NUMA nodes, up to max_workers and the CPU count."""
+    cpus = sum(len(node) for node in nodes)
+    candidates = {len(nodes)} if len(nodes) <= max_workers else set()
+    workers = 1
+    while workers <= min(max_workers, cpus):
+        candidates.add(workers)
+        workers *= 2
+    return sorted(candidates)
+
+def calibrate(video_urls, nodes, script_args=(), work_dir=None, **memory_options):
+    """
+    Process the same videos with each candidate number of workers and measure the throughput.
+
+    Each trial runs in a new scratch directory, so no trial reuses the downloads, transcripts or fingerprints of another.
+    The memory_options (durations, memory_model, memory_gate, memory_log) are passed to run_videos().
+
+    Returns:
+        list: {"workers", "threads", "processed", "failed", "seconds", "videos_per_hour"} dicts, one per trial.
+    """
+    trials = []
+    for workers in calibration_candidates(nodes, len(video_urls)):
+        plan = plan_workers(workers, nodes)
+        threads = min(len(cpus) for cpus in plan)
+        print(f"Calibration: {len(plan)} workers x {threads} threads")
+        trial_dir = tempfile.mkdtemp(prefix=f"calibration_{len(plan)}x{threads}_", dir=work_dir)
+        started = time.time()
+        try:
+            processed, failed = run_videos(video_urls, plan, script_args=script_args, cwd=trial_dir, log_dir=trial_dir, **memory_options)
+        finally:
+            seconds = time.time() - started
+            shutil.rmtree(trial_dir, ignore_errors=True)
+        trials.append({
+            "workers": len(plan),
+            "threads": threads,
+            "processed": processed,
+            "failed": failed,
+            "seconds": round(seconds, 1),
+            "videos_per_hour": round(processed * 3600 / seconds, 2),
+        })
+    return trials
+
+def load_calibration(path, cpus):
+    """Return the calibrated number of workers, or None if there is no calibration for this many CPUs."""
+    try:
+        with open(path, 'r') as f:
+            calibration = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return calibration["workers"] if calibration.get("cpus") == cpus else None
+
 def main():
     # Set up command-line argument parsing
     parser = argparse.ArgumentParser(description="Process all videos from a YouTube channel's videos page.")
     parser.add_argument("channel_url", help="The URL of the channel's videos page, e.g., https://www.youtube.com/@abrahamhickstips/videos")
     parser.add_argument("--start-index", type=int, default=0, help="The 0-based index to start processing from.")
     parser.add_argument("--api-key", help="Your YouTube Data API key. Alternatively, set the YOUTUBE_API_KEY environment variable.")
-    args = parser.parse_args()
+    parser.add_argument("--workers", type=int, help="The number of videos processed side by side, each on its own CPUs (default: the calibrated number, else 1).")
+    parser.add_argument("--asr-threads", type=int, help="The threads of each worker's transcription stage (default: the worker's CPUs).")
+    parser.add_argument("--diar-threads", type=int, help="The threads of each worker's diarization stage (default: the worker's CPUs).")
+    parser.add_argument("--log-dir", default="logs", help="With several workers, where each video's output is written (<video_id>.log).")
+    parser.add_argument("--calibrate", action="store_true", help="Measure the videos per hour of each workers x threads combination on the first videos, save the best and exit.")
+    parser.add_argument("--calibrate-videos", type=int, default=4, help="The number of videos each calibration trial processes.")
+    parser.add_argument("--calibration-file", default=CALIBRATION_FILE, help="Where the calibration is saved and read from.")
+    parser.add_argument("--memory-budget-mb", type=float, help="The memory the videos in progress may use together (default: 90%% of the available memory).")
+    parser.add_argument("--memory-stats", default=MEMORY_STATS_FILE, help="Where the measured peak memory of each video is kept for the estimates.")
+    parser.add_argument("--audio-policy", choices=AUDIO_POLICIES, default="keep", help="What _merged08.py does with each .wav once its video is done.")
+    parser.add_argument("--mp4-dir", default=MP4_DIR, help="With --audio-policy keep-for-mp4, the folder _wav_to_mp4_03.py converts.")
+    parser.add_argument("--spool-budget-gb", type=float, help="Pause starting videos while the audio on disk plus the expected downloads would exceed this many GB.")
+    parser.add_argument("--memory-log", default=MEMORY_LOG_FILE, help="Where _merged08.py logs the peak memory after each stage.")
+    # Everything else is for _merged08.py
+    args, script_args = parser.parse_known_args()
 
     # Validate start_index
     if args.start_index < 0:
@@ -95,24 +324,7 @@ def main():
     uploads_playlist_id = get_uploads_playlist_id(youtube, handle)
 
     # Retrieve all video IDs from the uploads playlist
-    video_ids = []
-    next_page_token = None
-    while True:
-        try:
-            playlistitems_response = youtube.playlistItems().list(
-                part="snippet",
-                playlistId=uploads_playlist_id,
-                maxResults=50,
-                pageToken=next_page_token
-            ).execute()
-            for item in playlistitems_response["items"]:
-                video_ids.append(item["snippet"]["resourceId"]["videoId"])
-            next_page_token = playlistitems_response.get("nextPageToken")
-            if not next_page_token:
-                break
-        except HttpError as e:
-            print(f"Error retrieving playlist items: {e}")
-            exit(1)
+    video_ids = get_video_ids(youtube, uploads_playlist_id)
 
     # Construct video URLs
     video_urls = [f"https://www.youtube.com/watch?v={video_id}" for video_id in video_ids]
@@ -122,14 +334,55 @@ def main():
         print(f"Start index {args.start_index} is greater than or equal to the number of videos ({len(video_urls)}). Nothing to process.")
         exit(0)
 
+    nodes = numa_nodes()
+    cpus = sum(len(node) for node in nodes)
+    print(f"{cpus} CPUs on {len(nodes)} NUMA node{'s' if len(nodes) > 1 else ''}")
+
+    # Admit videos by estimated peak memory (see _memory_budget.py)
+    durations = get_video_durations(youtube, video_ids[args.start_index:])
+    memory_model = MemoryModel(args.memory_stats)
+    memory_budget = args.memory_budget_mb or 0.9 * available_memory_mb()
+    print(f"Memory budget {memory_budget / 1024:.1f} GB, estimated peak {memory_model.base / 1024:.1f} GB "
+          f"+ {memory_model.per_hour / 1024:.1f} GB per hour of audio")
+    memory_options = {"durations": durations, "memory_model": memory_model, "memory_gate": MemoryGate(memory_budget), "memory_log": args.memory_log}
+
+    if args.calibrate:
+        sample = video_urls[args.start_index:args.start_index + max(1, args.calibrate_videos)]
+        # The scratch directories are removed after each trial, so nothing goes to the .mp4 queue
+        trials = calibrate(sample, nodes, script_args + ["--audio-policy", "delete"], **memory_options)
+        for trial in trials:
+            print(f"{trial['workers']:>3} workers x {trial['threads']:>3} threads: {trial['videos_per_hour']:>7.2f} videos/hour "
+                  f"({trial['processed']} processed, {trial['failed']} failed in {trial['seconds']} seconds)")
+        best = max(trials, key=lambda trial: trial['videos_per_hour'])
+        with open(args.calibration_file, 'w') as f:
+            json.dump({"cpus": cpus, "nodes": len(nodes), "workers": best['workers'], "threads": best['threads'], "trials": trials}, f, indent=4)
+        print(f"Best: {best['workers']} workers x {best['threads']} threads. Saved to {args.calibration_file}")
+        return
+
+    workers = args.workers or load_calibration(args.calibration_file, cpus) or 1
+    plan = plan_workers(workers, nodes)
+    for i, worker_cpus in enumerate(plan):
+        asr, diar = stage_threads(worker_cpus, args.asr_threads, args.diar_threads)
+        print(f"Worker {i + 1}: CPUs {describe_cpus(worker_cpus)}, {asr} transcription threads, {diar} diarization threads")
+    # One worker prints to the console as before; several would interleave, so each video gets a log file
+    log_dir = args.log_dir if len(plan) > 1 else None
+
+    # Downloads wait for room in the working directory (and the .mp4 queue, which only _wav_to_mp4_03.py empties)
+    spool_gate = None
+    if args.spool_budget_gb:
+        mp4_queue = [args.mp4_dir] if args.audio_policy == "keep-for-mp4" else []
+        spool_gate = SpoolGate(["."] + mp4_queue, args.spool_budget_gb * (1 << 30), wait_on=mp4_queue)
+
     # Process each video starting from the specified index
-    for i, video_url in enumerate(video_urls[args.start_index:], start=args.start_index):
-        print(f"Processing video {i+1}/{len(video_urls)}: {video_url}")
-        try:
-            subprocess.run(["python3", "_merged04.py", video_url], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error processing video {video_url}: {e}")
-            continue
+    script_args += ["--audio-policy", args.audio_policy, "--mp4-dir", os.path.abspath(args.mp4_dir)]
+    processed, failed = run_videos(video_urls[args.start_index:], plan, args.asr_threads, args.diar_threads, script_args,
+                                   log_dir=log_dir, first_number=args.start_index + 1, total=len(video_urls), spool_gate=spool_gate, **memory_options)
+    print(f"Processed {processed} videos ({failed} failed).")
+    stages, stalls = summarize_stages(args.memory_log)
+    for stage in stages:
+        print(f"  {stage['stage']:<12} peak memory: median {stage['median_mb'] / 1024:.1f} GB, max {stage['max_mb'] / 1024:.1f} GB ({stage['videos']} videos)")
+    if stalls:
+        print(f"  {stalls} stalled yt-dlp/whisper commands were killed and restarted (see _supervisor.py)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
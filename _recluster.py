@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _recluster.py <video_id>.json [<video_id>.json ...] --threshold 0.7 --max-speakers 3
+
+# This script relies on the files <video_id>.json and <video_id>.diarization.npz which are created by _merged08.py.
+
+# Tuning diarization (clustering threshold, number of speakers) used to mean running pyannote end to end again.
+# The segmentation and embedding inference is the same every time, so _merged08.py caches it in <video_id>.diarization.npz.
+# This script re-clusters the cached embeddings with new settings in seconds,
+# then re-assigns speakers and rewrites <video_id>.rttm, <video_id>.json and <video_id>.txt just as _merged08.py does.
+
+import argparse
+import json
+import os
+
+from _diarize import load_pipeline, recluster, embedding_cache_path
+from _speakers import (turns_from_annotation, find_primary_speaker, primary_speaker_label,
+                       label_transcript, write_rttm, write_transcript_json, write_segment_txt)
+
+
+def configure_pipeline(pipeline, threshold=None, min_duration_off=None):
+    """Instantiate the pipeline with new clustering settings, keeping every other parameter."""
+    params = pipeline.parameters(instantiated=True)
+    if threshold is not None:
+        params["clustering"]["threshold"] = threshold
+    if min_duration_off is not None:
+        params["segmentation"]["min_duration_off"] = min_duration_off
+    pipeline.instantiate(params)
+
+
+def relabel_video(pipeline, json_file, num_speakers=None, min_speakers=None, max_speakers=None):
+    """Re-cluster one video from its cache and rewrite its .json and .txt outputs."""
+    base = os.path.splitext(json_file)[0]
+    video_id = os.path.basename(base)
+    cache_path = os.path.join(os.path.dirname(json_file), embedding_cache_path(video_id))
+
+    with open(json_file, 'r') as f:
+        transcript_data = json.load(f)
+
+    diarization = recluster(pipeline, cache_path, num_speakers=num_speakers, min_speakers=min_speakers, max_speakers=max_speakers)
+    diarization_turns = turns_from_annotation(diarization)
+    write_rttm(f"{base}.rttm", video_id, diarization_turns)
+
+    primary_speaker = find_primary_speaker(diarization_turns)
+    primary_speaker_name = primary_speaker_label(transcript_data['metadata']['channelName'])
+    print(f"{video_id}: {len(diarization.labels())} speakers, primary speaker {primary_speaker} (labeled as {primary_speaker_name})")
+
+    label_transcript(transcript_data, diarization_turns, primary_speaker, primary_speaker_name)
+    write_transcript_json(json_file, transcript_data)
+    write_segment_txt(f"{base}.txt", transcript_data['segments'])
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Re-cluster cached diarization embeddings and rebuild the speaker labels of processed videos.")
+    parser.add_argument("json_files", nargs="+", help="Processed transcript files (<video_id>.json) with a <video_id>.diarization.npz next to them.")
+    parser.add_argument("--threshold", type=float, default=None, help="Clustering threshold. Lower values split speakers more readily.")
+    parser.add_argument("--min-duration-off", type=float, default=None, help="Fill gaps in a speaker's speech shorter than this many seconds.")
+    parser.add_argument("--num-speakers", type=int, default=None, help="The exact number of speakers, when known.")
+    parser.add_argument("--min-speakers", type=int, default=None, help="The minimum number of speakers.")
+    parser.add_argument("--max-speakers", type=int, default=None, help="The maximum number of speakers.")
+    args = parser.parse_args()
+
+    # Loading the pipeline loads its models, but no inference is run on the audio
+    pipeline = load_pipeline()
+    configure_pipeline(pipeline, threshold=args.threshold, min_duration_off=args.min_duration_off)
+
+    failures = 0
+    for json_file in args.json_files:
+        try:
+            relabel_video(pipeline, json_file, num_speakers=args.num_speakers, min_speakers=args.min_speakers, max_speakers=args.max_speakers)
+        except FileNotFoundError as e:
+            print(f"Error: {e.filename} not found.")
+            failures += 1
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Error: Could not read {json_file}: {e}")
+            failures += 1
+        except ValueError as e:
+            print(f"Error: {e}")
+            failures += 1
+
+    if failures:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
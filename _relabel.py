@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _relabel.py <directory or <video_id>.json> [...] --workers 8
+
+# This script relies on the files <video_id>.json and <video_id>.rttm which are created by _merged08.py.
+
+# _meta_only.py exists because tweaking the KG file used to mean a full rerun. Speaker labels had the same problem.
+# After changing how the primary speaker is named (see _speakers.py) or deciding that two speakers are really one person,
+# this script re-runs only the speaker assignment, the JSON rewrite and the .txt generation from the saved diarization turns.
+# Whisper and pyannote are not needed. Videos are relabeled in parallel.
+
+# Merge speakers with --merge, e.g., --merge SPEAKER_02=SPEAKER_00 relabels SPEAKER_02's turns as SPEAKER_00.
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from _speakers import (read_rttm, find_primary_speaker, primary_speaker_label,
+                       label_transcript, write_transcript_json, write_segment_txt)
+
+
+def find_transcripts(paths):
+    """Return every <video_id>.json among the given files and directories which has a <video_id>.rttm next to it."""
+    json_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            if os.path.exists(os.path.splitext(candidate)[0] + ".rttm"):
+                json_files.append(candidate)
+            elif not os.path.isdir(path):
+                print(f"Skipping {candidate}: no .rttm file found next to it.")
+    return json_files
+
+
+def relabel(json_file, merges, primary_name=None):
+    """
+    Rebuild the speaker labels of one processed video from its .rttm file.
+
+    Args:
+        json_file: The processed transcript (<video_id>.json).
+        merges: A dict mapping a raw speaker label to the label it is merged into.
+        primary_name: The label for the primary speaker, instead of the one derived from the channel name.
+
+    Returns:
+        str: A one line summary for the progress output.
+    """
+    base = os.path.splitext(json_file)[0]
+    turns = [(start, end, merges.get(speaker, speaker)) for start, end, speaker in read_rttm(f"{base}.rttm")]
+
+    with open(json_file, 'r') as f:
+        transcript_data = json.load(f)
+
+    primary_speaker = find_primary_speaker(turns)
+    primary_speaker_name = primary_name or primary_speaker_label(transcript_data['metadata']['channelName'])
+
+    label_transcript(transcript_data, turns, primary_speaker, primary_speaker_name)
+    write_transcript_json(json_file, transcript_data)
+    write_segment_txt(f"{base}.txt", transcript_data['segments'])
+    return f"{os.path.basename(json_file)}: primary speaker {primary_speaker} (labeled as {primary_speaker_name})"
+
+
+def parse_merges(values):
+    """Turn ["SPEAKER_02=SPEAKER_00", ...] into {"SPEAKER_02": "SPEAKER_00", ...}."""
+    merges = {}
+    for value in values:
+        source, _, target = value.partition("=")
+        if not source or not target:
+            print(f"Error: Invalid --merge value {value!r}. Expected SOURCE=TARGET.")
+            exit(1)
+        merges[source] = target
+    return merges
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Rebuild speaker labels, JSON and .txt transcripts from saved diarization turns.")
+    parser.add_argument("paths", nargs="+", help="Directories of processed videos or individual <video_id>.json files.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="The number of videos relabeled in parallel.")
+    parser.add_argument("--merge", action="append", default=[], help="Merge one speaker into another: SOURCE=TARGET. Can be repeated.")
+    parser.add_argument("--primary-name", default=None, help="Label for the primary speaker instead of the first word of the channel name.")
+    args = parser.parse_args()
+
+    merges = parse_merges(args.merge)
+    json_files = find_transcripts(args.paths)
+    if not json_files:
+        print("No processed videos with .rttm files found. Nothing to relabel.")
+        exit(0)
+
+    started = time.time()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(relabel, json_file, merges, args.primary_name): json_file for json_file in json_files}
+        for future in as_completed(futures):
+            try:
+                print(future.result())
+            except (OSError, json.JSONDecodeError, KeyError, ValueError) as e:
+                print(f"Error relabeling {futures[future]}: {e}")
+                failures += 1
+
+    elapsed = time.time() - started
+    print(f"Relabeled {len(json_files) - failures} of {len(json_files)} videos in {elapsed:.1f} seconds.")
+    if failures:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _search.py "insulin resistance" --db transcripts.db --limit 20
+
+# Searches the full-text index built by _search_index.py.
+# The query uses FTS5 syntax: words are ANDed, "quoted phrases", OR, NOT, prefix* and NEAR(a b, 5) are supported.
+# Each match is printed with its timestamps in milliseconds and a link to that moment of the video.
+
+import argparse
+import json
+import sqlite3
+
+from _search_index import connect
+
+
+def search(connection, query, channel=None, speaker=None, after=None, before=None, order="rank", limit=20):
+    """
+    Return matching segments, best first (or newest first with order="date").
+
+    Returns:
+        list: {"video_id", "start_ms", "end_ms", "speaker", "text", "channel", "title", "url", "post_date"} dicts.
+    """
+    conditions = ["segments MATCH ?"]
+    parameters = [query]
+    if speaker:
+        conditions.append("segments.speaker = ?")
+        parameters.append(speaker)
+    if channel:
+        conditions.append("videos.channel = ?")
+        parameters.append(channel)
+    if after:
+        conditions.append("videos.post_date >= ?")
+        parameters.append(after)
+    if before:
+        conditions.append("videos.post_date < ?")
+        parameters.append(before)
+    order_by = "videos.post_date DESC, segments.start_ms" if order == "date" else "segments.rank"
+    parameters.append(limit)
+
+    rows = connection.execute(
+        f"""
+        SELECT segments.video_id, segments.start_ms, segments.end_ms, segments.speaker,
+               snippet(segments, 0, '[', ']', '...', 32),
+               videos.channel, videos.title, videos.url, videos.post_date
+        FROM segments JOIN videos ON videos.video_id = segments.video_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {order_by}
+        LIMIT ?
+        """,
+        parameters,
+    )
+    keys = ("video_id", "start_ms", "end_ms", "speaker", "text", "channel", "title", "url", "post_date")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def format_ms(ms):
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Search the transcript segments indexed by _search_index.py.")
+    parser.add_argument("query", help="An FTS5 query, e.g., 'insulin AND \"fasting glucose\"'.")
+    parser.add_argument("--db", default="transcripts.db", help="The SQLite database built by _search_index.py.")
+    parser.add_argument("--channel", help="Only search videos of this channel.")
+    parser.add_argument("--speaker", help="Only match segments of this speaker (e.g., Max or SPEAKER_01).")
+    parser.add_argument("--after", help="Only videos posted on or after this date (YYYY-MM-DD).")
+    parser.add_argument("--before", help="Only videos posted before this date (YYYY-MM-DD).")
+    parser.add_argument("--order", choices=["rank", "date"], default="rank", help="Best matches first, or newest videos first.")
+    parser.add_argument("--limit", type=int, default=20, help="The maximum number of matches.")
+    parser.add_argument("--json", action="store_true", help="Print the matches as JSON lines.")
+    args = parser.parse_args()
+
+    connection = connect(args.db)
+    try:
+        matches = search(connection, args.query, args.channel, args.speaker, args.after, args.before, args.order, args.limit)
+    except sqlite3.OperationalError as e:
+        # Malformed FTS5 queries end up here
+        print(f"Error searching: {e}")
+        exit(1)
+    finally:
+        connection.close()
+
+    for match in matches:
+        if args.json:
+            print(json.dumps(match, ensure_ascii=False))
+            continue
+        print(f"{match['channel']} | {match['title']} | {match['post_date']}")
+        print(f"  [{format_ms(match['start_ms'])} > {format_ms(match['end_ms'])}] ({match['speaker']}) {match['text']}")
+        print(f"  {match['url']}&t={match['start_ms'] // 1000}s")
+    if not args.json:
+        print(f"{len(matches)} matches.")
+
+
+if __name__ == "__main__":
+    main()
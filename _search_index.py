@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _search_index.py ./ --db transcripts.db
+
+# Builds a SQLite FTS5 full-text index of every segment of the merged transcripts (<video_id>.json),
+# so the corpus can be searched with _search.py instead of grepping the .txt files.
+
+# Tables:
+#   videos     one row per transcript: video_id, channel, title, url, post_date, language,
+#              the modification time of the transcript and the rowid range of its segments
+#   segments   FTS5 table of the segment text and speaker, with video_id, start_ms and end_ms stored unindexed
+# Each segment's rowid is assigned per video in one contiguous range, so a changed transcript is replaced by deleting
+# its rowid range (a cheap primary-key delete, unlike a WHERE on an unindexed column which scans the whole table).
+
+# Updates are incremental: transcripts whose modification time matches the videos table are skipped,
+# changed ones are re-indexed and, with --prune, videos whose transcript is gone are removed.
+# Transcripts are streamed one at a time and committed in batches, so memory stays flat however large the corpus is.
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from _transcripts import find_transcripts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    channel TEXT,
+    title TEXT,
+    url TEXT,
+    post_date TEXT,
+    language TEXT,
+    mtime REAL,
+    first_rowid INTEGER,
+    last_rowid INTEGER
+);
+CREATE INDEX IF NOT EXISTS videos_channel ON videos (channel);
+CREATE INDEX IF NOT EXISTS videos_post_date ON videos (post_date);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5 (
+    text,
+    speaker,
+    video_id UNINDEXED,
+    start_ms UNINDEXED,
+    end_ms UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def connect(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def delete_video(connection, video_id):
+    row = connection.execute("SELECT first_rowid, last_rowid FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+    if row is None:
+        return
+    if row[0] is not None:
+        connection.execute("DELETE FROM segments WHERE rowid BETWEEN ? AND ?", row)
+    connection.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+
+
+def index_transcript(connection, json_file, video_id, mtime):
+    """
+    Replace the rows of one transcript.
+
+    Returns:
+        int: The number of segments indexed.
+    """
+    with open(json_file, 'r', encoding='utf-8') as f:
+        transcript_data = json.load(f)
+    metadata = transcript_data['metadata']
+
+    delete_video(connection, video_id)
+    first_rowid = connection.execute("SELECT coalesce(max(rowid), 0) + 1 FROM segments").fetchone()[0]
+    rows = [
+        (first_rowid + number, segment['text'].strip(), segment.get('speaker'), video_id,
+         int(round(segment['start'] * 1000)), int(round(segment['end'] * 1000)))
+        for number, segment in enumerate(transcript_data['segments'])
+    ]
+    connection.executemany("INSERT INTO segments (rowid, text, speaker, video_id, start_ms, end_ms) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    connection.execute(
+        "INSERT INTO videos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (video_id, metadata.get('channelName'), metadata.get('videoTitle'), metadata.get('url'), metadata.get('videoPostDate'),
+         transcript_data.get('language'), mtime, first_rowid if rows else None, first_rowid + len(rows) - 1 if rows else None),
+    )
+    return len(rows)
+
+
+def update_index(connection, json_files, prune=False, commit_every=100):
+    """
+    Index new and changed transcripts.
+
+    Returns:
+        dict: Counts of indexed, skipped, removed and failed videos and of indexed segments.
+    """
+    counts = {"indexed": 0, "skipped": 0, "removed": 0, "failed": 0, "segments": 0}
+    indexed_mtimes = dict(connection.execute("SELECT video_id, mtime FROM videos"))
+    seen = set()
+    pending = 0
+    for json_file in json_files:
+        video_id = os.path.basename(json_file).split('.')[0]
+        seen.add(video_id)
+        mtime = os.path.getmtime(json_file)
+        if indexed_mtimes.get(video_id) == mtime:
+            counts["skipped"] += 1
+            continue
+        try:
+            counts["segments"] += index_transcript(connection, json_file, video_id, mtime)
+            counts["indexed"] += 1
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            # Raw Whisper output without metadata ends up here
+            print(f"Skipping {json_file}: {e}")
+            counts["failed"] += 1
+            continue
+        pending += 1
+        if pending >= commit_every:
+            connection.commit()
+            pending = 0
+
+    if prune:
+        for video_id in set(indexed_mtimes) - seen:
+            delete_video(connection, video_id)
+            counts["removed"] += 1
+    connection.commit()
+    return counts
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Build or update a SQLite FTS5 full-text index of the merged transcripts.")
+    parser.add_argument("inputs", nargs="+", help="Directories, glob patterns or merged <video_id>.json files.")
+    parser.add_argument("--db", default="transcripts.db", help="The SQLite database to create or update.")
+    parser.add_argument("--prune", action="store_true", help="Remove videos whose transcript is no longer among the inputs.")
+    parser.add_argument("--optimize", action="store_true", help="Merge the FTS5 index segments after updating (faster queries, slower update).")
+    args = parser.parse_args()
+
+    json_files = find_transcripts(args.inputs)
+    started = time.time()
+    connection = connect(args.db)
+    try:
+        counts = update_index(connection, json_files, prune=args.prune)
+        if args.optimize:
+            connection.execute("INSERT INTO segments (segments) VALUES ('optimize')")
+            connection.commit()
+    finally:
+        connection.close()
+
+    elapsed = time.time() - started
+    print(f"Indexed {counts['segments']} segments from {counts['indexed']} videos in {elapsed:.1f} seconds "
+          f"({counts['skipped']} unchanged, {counts['removed']} removed, {counts['failed']} failed). Index: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
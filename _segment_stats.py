@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# Run this script with the following commands:
+# python3 _segment_stats.py speaking-time --store segment_store
+# python3 _segment_stats.py logprob --store segment_store --bins 10
+# python3 _segment_stats.py wpm --store segment_store --channel "Max Gulhane MD"
+
+# Corpus statistics over the columnar store written by _segment_store.py.
+# Every query loads the columns once and aggregates them with NumPy (bincount over group codes), without reading any transcript.
+#   speaking-time   hours spoken per speaker per channel, and the speaker's share of the channel
+#   logprob         the distribution of Whisper's avg_logprob per channel (percentiles and a histogram)
+#   wpm             words per minute per channel per month of posting
+
+import argparse
+import json
+
+import numpy as np
+
+from _segment_store import load_store
+
+
+def group_codes(*codes):
+    """Combine several code arrays into one code per distinct combination. Returns (inverse codes, unique combinations)."""
+    combined = np.stack(codes, axis=1)
+    unique, inverse = np.unique(combined, axis=0, return_inverse=True)
+    return inverse.ravel(), unique
+
+
+def speaking_time(columns, dictionary, row_channel):
+    groups, keys = group_codes(row_channel, columns["speaker"])
+    seconds = np.bincount(groups, weights=columns["end"] - columns["start"], minlength=len(keys))
+    channel_seconds = np.bincount(keys[:, 0], weights=seconds)
+    order = np.lexsort((-seconds, keys[:, 0]))
+    return [
+        {
+            "channel": dictionary.channels[keys[i, 0]],
+            "speaker": dictionary.speakers[keys[i, 1]],
+            "hours": round(float(seconds[i]) / 3600, 2),
+            "share": round(float(seconds[i] / channel_seconds[keys[i, 0]]), 3),
+        }
+        for i in order
+    ]
+
+
+def logprob_distribution(columns, dictionary, row_channel, bins):
+    logprob = columns["avg_logprob"]
+    known = ~np.isnan(logprob)
+    edges = np.histogram_bin_edges(logprob[known], bins=bins) if known.any() else np.linspace(-1, 0, bins + 1)
+    results = []
+    for channel in np.unique(row_channel[known]):
+        values = logprob[known & (row_channel == channel)]
+        percentiles = np.percentile(values, [5, 25, 50, 75, 95]).round(3).tolist()
+        results.append({
+            "channel": dictionary.channels[channel],
+            "segments": int(len(values)),
+            "mean": round(float(values.mean()), 3),
+            "percentiles": dict(zip(("p5", "p25", "p50", "p75", "p95"), percentiles)),
+            "histogram": {"edges": [round(edge, 3) for edge in edges.tolist()], "counts": np.histogram(values, bins=edges)[0].tolist()},
+        })
+    return results
+
+
+def words_per_minute(columns, dictionary, row_channel):
+    # The month of posting of each video, as a code into the sorted distinct months
+    video_months = np.array([(video["post_date"] or "unknown")[:7] for video in dictionary.videos])
+    months, video_month_codes = np.unique(video_months, return_inverse=True)
+    groups, keys = group_codes(row_channel, video_month_codes[columns["video"]])
+    words = np.bincount(groups, weights=columns["words"], minlength=len(keys))
+    minutes = np.bincount(groups, weights=columns["end"] - columns["start"], minlength=len(keys)) / 60
+    videos = np.bincount(np.unique(np.stack([groups, columns["video"]], axis=1), axis=0)[:, 0], minlength=len(keys))
+    return [
+        {
+            "channel": dictionary.channels[keys[i, 0]],
+            "month": str(months[keys[i, 1]]),
+            "videos": int(videos[i]),
+            "wpm": round(float(words[i] / minutes[i]), 1) if minutes[i] else None,
+        }
+        for i in range(len(keys))
+    ]
+
+
+def print_table(rows):
+    if not rows:
+        print("No segments.")
+        return
+    names = list(rows[0])
+    widths = [max(len(name), *(len(str(row[name])) for row in rows)) for name in names]
+    print("  ".join(name.ljust(width) for name, width in zip(names, widths)))
+    for row in rows:
+        print("  ".join(str(row[name]).ljust(width) for name, width in zip(names, widths)))
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Corpus statistics from the columnar segment store.")
+    parser.add_argument("query", choices=["speaking-time", "logprob", "wpm"], help="The statistic to compute.")
+    parser.add_argument("--store", default="segment_store", help="The store directory written by _segment_store.py.")
+    parser.add_argument("--channel", help="Only include this channel.")
+    parser.add_argument("--bins", type=int, default=10, help="The number of histogram bins for logprob.")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON.")
+    args = parser.parse_args()
+
+    columns, dictionary = load_store(args.store)
+    video_channel = np.array([video["channel"] for video in dictionary.videos], dtype=np.int64)
+    row_channel = video_channel[columns["video"]] if len(columns["video"]) else np.zeros(0, dtype=np.int64)
+    if args.channel:
+        if args.channel not in dictionary.channel_codes:
+            print(f"Error: no channel named {args.channel} in {args.store}.")
+            exit(1)
+        keep = row_channel == dictionary.channel_codes[args.channel]
+        columns = {name: values[keep] for name, values in columns.items()}
+        row_channel = row_channel[keep]
+    if not len(row_channel):
+        print("No segments.")
+        return
+
+    if args.query == "speaking-time":
+        result = speaking_time(columns, dictionary, row_channel)
+    elif args.query == "logprob":
+        result = logprob_distribution(columns, dictionary, row_channel, args.bins)
+    else:
+        result = words_per_minute(columns, dictionary, row_channel)
+
+    if args.json:
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+    elif args.query == "logprob":
+        for row in result:
+            print(f"{row['channel']}: {row['segments']} segments, mean {row['mean']}, percentiles {row['percentiles']}")
+            peak = max(row['histogram']['counts']) or 1
+            for low, count in zip(row['histogram']['edges'], row['histogram']['counts']):
+                print(f"  {low:>8.3f}  {'#' * round(40 * count / peak)} {count}")
+    else:
+        print_table(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+# Run this script with the following command:
+# python3 _segment_store.py ./ --store segment_store
+
+# Compacts every segment of the merged transcripts (<video_id>.json) into a columnar store for corpus-wide statistics
+# (see _segment_stats.py), so they do not have to parse thousands of pretty-printed JSON files.
+
+# The store is a directory of:
+#   part-<n>.npz       one NumPy array per column, one element per segment:
+#                      video, speaker (int32 codes), start, end, avg_logprob, no_speech_prob, compression_ratio (float32),
+#                      words (int32)
+#   dictionary.json    the values behind the codes: speakers, channels, and for each video its id, channel code, title,
+#                      post date, the modification time of its transcript and the part holding its rows
+# Each run appends one part with the new and changed transcripts. Rows of a changed video stay in their old part
+# but are masked out when loading, since the dictionary points to the newer part. --compact rewrites everything as one part.
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from _transcripts import find_transcripts
+
+COLUMNS = {
+    "video": np.int32,
+    "speaker": np.int32,
+    "start": np.float32,
+    "end": np.float32,
+    "avg_logprob": np.float32,
+    "no_speech_prob": np.float32,
+    "compression_ratio": np.float32,
+    "words": np.int32,
+}
+
+
+class Dictionary:
+    """Codes for speakers, channels and videos, saved as dictionary.json."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {"speakers": [], "channels": [], "videos": []}
+        self.speakers = data["speakers"]
+        self.channels = data["channels"]
+        self.videos = data["videos"]
+        self.speaker_codes = {speaker: code for code, speaker in enumerate(self.speakers)}
+        self.channel_codes = {channel: code for code, channel in enumerate(self.channels)}
+        self.video_codes = {video["video_id"]: code for code, video in enumerate(self.videos)}
+
+    def speaker_code(self, speaker):
+        if speaker not in self.speaker_codes:
+            self.speaker_codes[speaker] = len(self.speakers)
+            self.speakers.append(speaker)
+        return self.speaker_codes[speaker]
+
+    def video_code(self, video_id, metadata, mtime, part):
+        channel = metadata.get('channelName')
+        if channel not in self.channel_codes:
+            self.channel_codes[channel] = len(self.channels)
+            self.channels.append(channel)
+        entry = {
+            "video_id": video_id,
+            "channel": self.channel_codes[channel],
+            "title": metadata.get('videoTitle'),
+            "post_date": metadata.get('videoPostDate'),
+            "mtime": mtime,
+            "part": part,
+        }
+        if video_id in self.video_codes:
+            self.videos[self.video_codes[video_id]] = entry
+        else:
+            self.video_codes[video_id] = len(self.videos)
+            self.videos.append(entry)
+        return self.video_codes[video_id]
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"speakers": self.speakers, "channels": self.channels, "videos": self.videos}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def part_number(path):
+    return int(os.path.basename(path)[len("part-"):-len(".npz")])
+
+
+def segment_rows(segments):
+    """Return the column values of one transcript's segments as (speaker, start, end, ...) tuples, in COLUMNS order."""
+    return [
+        (segment.get('speaker'), segment['start'], segment['end'], segment.get('avg_logprob', np.nan),
+         segment.get('no_speech_prob', np.nan), segment.get('compression_ratio', np.nan), len(segment['text'].split()))
+        for segment in segments
+    ]
+
+
+def append_part(store_dir, json_files, dictionary):
+    """
+    Write the new and changed transcripts as the next part.
+
+    Returns:
+        (videos, rows, failed): The number of videos and segments appended, and the number of unreadable files.
+    """
+    parts = glob.glob(os.path.join(store_dir, "part-*.npz"))
+    part = max((part_number(path) for path in parts), default=0) + 1
+    columns = {name: [] for name in COLUMNS}
+    videos = 0
+    failed = 0
+    for json_file in json_files:
+        video_id = os.path.basename(json_file).split('.')[0]
+        mtime = os.path.getmtime(json_file)
+        known = dictionary.video_codes.get(video_id)
+        if known is not None and dictionary.videos[known]["mtime"] == mtime:
+            continue
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                transcript_data = json.load(f)
+            metadata = transcript_data['metadata']
+            rows = segment_rows(transcript_data['segments'])
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            # Raw Whisper output without metadata ends up here
+            print(f"Skipping {json_file}: {e}")
+            failed += 1
+            continue
+        video = dictionary.video_code(video_id, metadata, mtime, part)
+        for row in rows:
+            columns["video"].append(video)
+            columns["speaker"].append(dictionary.speaker_code(row[0]))
+            for name, value in zip(list(COLUMNS)[2:], row[1:]):
+                columns[name].append(value)
+        videos += 1
+
+    if videos:
+        path = os.path.join(store_dir, f"part-{part:06d}.npz")
+        tmp_path = os.path.join(store_dir, f".tmp-{os.getpid()}.npz")  # outside the part-*.npz pattern
+        np.savez(tmp_path, **{name: np.array(values, dtype=COLUMNS[name]) for name, values in columns.items()})
+        os.replace(tmp_path, path)
+        # The dictionary is saved last: a part without dictionary entries pointing to it is ignored when loading
+        dictionary.save()
+    return videos, len(columns["video"]), failed
+
+
+def load_store(store_dir):
+    """
+    Load the live rows of every part.
+
+    Returns:
+        (columns, dictionary): A dict of column arrays, and the Dictionary.
+    """
+    dictionary = Dictionary(os.path.join(store_dir, "dictionary.json"))
+    current_part = np.array([video["part"] for video in dictionary.videos], dtype=np.int64)
+    loaded = {name: [] for name in COLUMNS}
+    for path in sorted(glob.glob(os.path.join(store_dir, "part-*.npz"))):
+        with np.load(path) as part:
+            # Keep the rows of videos whose latest version is in this part
+            # (codes past the dictionary come from a part written by a run that stopped before saving the dictionary)
+            video = part["video"]
+            known = video < len(current_part)
+            live = known & (current_part[np.where(known, video, 0)] == part_number(path)) if len(current_part) else np.zeros(len(video), dtype=bool)
+            for name in COLUMNS:
+                loaded[name].append(part[name][live])
+    columns = {name: np.concatenate(arrays) if arrays else np.zeros(0, dtype=COLUMNS[name]) for name, arrays in loaded.items()}
+    return columns, dictionary
+
+
+def compact(store_dir):
+    """Rewrite the live rows of all parts as a single part."""
+    columns, dictionary = load_store(store_dir)
+    old_parts = glob.glob(os.path.join(store_dir, "part-*.npz"))
+    part = max((part_number(path) for path in old_parts), default=0) + 1
+    path = os.path.join(store_dir, f"part-{part:06d}.npz")
+    tmp_path = os.path.join(store_dir, f".tmp-{os.getpid()}.npz")  # outside the part-*.npz pattern
+    np.savez(tmp_path, **columns)
+    os.replace(tmp_path, path)
+    for video in dictionary.videos:
+        video["part"] = part
+    dictionary.save()
+    for old_path in old_parts:
+        os.remove(old_path)
+    return len(columns["video"])
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Append the merged transcripts' segments to a columnar store for corpus statistics.")
+    parser.add_argument("inputs", nargs="*", help="Directories, glob patterns or merged <video_id>.json files.")
+    parser.add_argument("--store", default="segment_store", help="The store directory.")
+    parser.add_argument("--compact", action="store_true", help="Rewrite the store as a single part, dropping the rows of replaced videos.")
+    args = parser.parse_args()
+
+    os.makedirs(args.store, exist_ok=True)
+    started = time.time()
+    if args.inputs:
+        dictionary = Dictionary(os.path.join(args.store, "dictionary.json"))
+        videos, rows, failed = append_part(args.store, find_transcripts(args.inputs), dictionary)
+        print(f"Appended {rows} segments from {videos} new or changed videos in {time.time() - started:.1f} seconds ({failed} failed).")
+    if args.compact:
+        rows = compact(args.store)
+        print(f"Compacted {rows} segments into one part in {time.time() - started:.1f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# Speaker assignment and transcript output shared by _merged08.py and the tools which rebuild its outputs
+# (_recluster.py, _relabel.py) without running Whisper and pyannote again.
+
+# Diarization turns are plain (start, end, speaker) tuples so they can come from a live pyannote run or from a cache on disk.
+# They are persisted per video as <video_id>.rttm with pyannote's raw labels (SPEAKER_00, ...),
+# so the primary speaker and its name can be worked out again later.
+
+import json
+from collections import defaultdict
+
+import numpy as np
+
+
+def turns_from_annotation(diarization):
+    """Convert a pyannote Annotation into a list of (start, end, speaker) tuples."""
+    return [(turn.start, turn.end, speaker) for turn, _, speaker in diarization.itertracks(yield_label=True)]
+
+
+def write_rttm(path, uri, turns):
+    """Write diarization turns in RTTM format, like archive/annote02.py does."""
+    with open(path, 'w') as rttm_file:
+        for start, end, speaker in turns:
+            duration = end - start
+            rttm_file.write(f"SPEAKER {uri} 1 {start:.3f} {duration:.3f} <NA> <NA> {speaker} <NA> <NA>\n")
+
+
+def read_rttm(path):
+    """Read diarization turns from an RTTM file as (start, end, speaker) tuples."""
+    turns = []
+    with open(path, 'r') as rttm_file:
+        for line in rttm_file:
+            fields = line.split()
+            if not fields or fields[0] != "SPEAKER":
+                continue
+            start = float(fields[3])
+            duration = float(fields[4])
+            turns.append((start, start + duration, fields[7]))
+    return turns
+
+
+def find_primary_speaker(turns):
+    """Return the speaker with the most total speaking time, or None if there are no turns."""
+    speaker_times = defaultdict(float)
+    for start, end, speaker in turns:
+        speaker_times[speaker] += end - start
+    if not speaker_times:
+        return None
+    return max(speaker_times, key=speaker_times.get)
+
+
+def primary_speaker_label(channel_name):
+    """Use the first name or channel name as the speaker label, e.g., "Max" from "Max Gulhane MD"."""
+    return channel_name.split()[0]
+
+
+def assign_speaker(segment_start, segment_end, turns, primary_speaker, primary_speaker_name):
+    """Assign a speaker to a segment based on maximum overlap with diarization turns."""
+    overlap_durations = defaultdict(float)
+    for turn_start, turn_end, speaker in turns:
+        overlap_start = max(segment_start, turn_start)
+        overlap_end = min(segment_end, turn_end)
+        if overlap_start < overlap_end:
+            overlap_duration = overlap_end - overlap_start
+            overlap_durations[speaker] += overlap_duration
+    if overlap_durations:
+        assigned_speaker = max(overlap_durations, key=overlap_durations.get)
+        return primary_speaker_name if assigned_speaker == primary_speaker else assigned_speaker
+    return "Unknown"
+
+
+def label_segments(segments, turns, primary_speaker, primary_speaker_name):
+    """Add a 'speaker' label to each transcription segment."""
+    for segment in segments:
+        segment['speaker'] = assign_speaker(segment['start'], segment['end'], turns, primary_speaker, primary_speaker_name)
+
+
+def speaker_overlaps(starts, ends, turns):
+    """
+    Compute how long each speaker talks during each of many intervals, without looping over the intervals.
+
+    For every speaker the turns are merged into sorted, non-overlapping intervals with a cumulative speaking time,
+    so the speaking time up to any moment t is found with one np.searchsorted. The overlap with [start, end]
+    is then coverage(end) - coverage(start). Cost is O((intervals + turns) log turns) instead of O(intervals * turns).
+
+    Args:
+        starts, ends: Arrays with the start and end of each interval (e.g., each word).
+        turns: Diarization turns as (start, end, speaker) tuples.
+
+    Returns:
+        (speakers, overlaps): The speakers in order of first appearance,
+        and an (intervals, speakers) array of overlap durations in seconds.
+    """
+    speakers = list(dict.fromkeys(speaker for _, _, speaker in turns))
+    overlaps = np.zeros((len(starts), len(speakers)))
+    for k, speaker in enumerate(speakers):
+        speaker_turns = sorted((start, end) for start, end, label in turns if label == speaker)
+        # Merge overlapping turns of the same speaker
+        merged = [list(speaker_turns[0])]
+        for start, end in speaker_turns[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        merged = np.array(merged)
+        turn_starts, turn_lengths = merged[:, 0], merged[:, 1] - merged[:, 0]
+        spoken_before = np.concatenate(([0.0], np.cumsum(turn_lengths)))
+
+        def coverage(t):
+            # Speaking time of this speaker between 0 and t
+            index = np.searchsorted(turn_starts, t, side='right') - 1
+            clipped = np.maximum(index, 0)
+            partial = np.clip(t - turn_starts[clipped], 0.0, turn_lengths[clipped])
+            return np.where(index >= 0, spoken_before[clipped] + partial, 0.0)
+
+        overlaps[:, k] = coverage(ends) - coverage(starts)
+    return speakers, overlaps
+
+
+def assign_word_speakers(starts, ends, turns):
+    """
+    Assign a speaker to each word by maximum overlap with diarization turns.
+
+    Words which fall into a gap between turns get the speaker of the most recent turn to end before them
+    (or the first turn, for words before any turn), so pauses do not break a speaker's sentence apart.
+
+    Returns:
+        list: One raw speaker label per word, or "Unknown" for every word when there are no turns.
+    """
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    if not turns:
+        return ["Unknown"] * len(starts)
+
+    speakers, overlaps = speaker_overlaps(starts, ends, turns)
+    best = np.argmax(overlaps, axis=1)
+
+    unassigned = overlaps[np.arange(len(starts)), best] <= 0.0
+    if unassigned.any():
+        ordered = sorted(turns)
+        turn_starts = np.array([start for start, _, _ in ordered])
+        turn_ends = np.array([end for _, end, _ in ordered])
+        turn_speakers = np.array([speakers.index(speaker) for _, _, speaker in ordered])
+        # Index of the turn with the latest end among the first i turns
+        running_end = np.maximum.accumulate(turn_ends)
+        latest = np.maximum.accumulate(np.where(turn_ends == running_end, np.arange(len(ordered)), 0))
+        previous = np.searchsorted(turn_starts, starts[unassigned], side='right') - 1
+        best[unassigned] = turn_speakers[latest[np.maximum(previous, 0)]]
+
+    return [speakers[k] for k in best]
+
+
+def split_segments_by_speaker(segments, turns, primary_speaker, primary_speaker_name):
+    """
+    Assign a speaker to every word and split each Whisper segment where the speaker changes.
+
+    Segments need Whisper's word timestamps ('words'). Every new segment keeps the 'parent_id' of the Whisper segment
+    it came from, so pieces of a previously split segment are joined again before being split with new turns.
+
+    Returns:
+        list: The new segments, renumbered, each with a 'speaker' label.
+    """
+    # Join pieces which came from the same Whisper segment
+    groups = []
+    for segment in segments:
+        parent_id = segment.get('parent_id', segment['id'])
+        if groups and groups[-1][0].get('parent_id', groups[-1][0]['id']) == parent_id:
+            groups[-1][1].extend(segment['words'])
+        else:
+            groups.append((segment, list(segment['words'])))
+
+    all_words = [word for _, words in groups for word in words]
+    labels = assign_word_speakers([word['start'] for word in all_words], [word['end'] for word in all_words], turns)
+
+    def speaker_name(label):
+        return primary_speaker_name if label == primary_speaker else label
+
+    new_segments = []
+
+    def add_segment(template, words, speaker):
+        segment = {
+            'id': len(new_segments),
+            'parent_id': template.get('parent_id', template['id']),
+            'start': words[0]['start'] if words else template['start'],
+            'end': words[-1]['end'] if words else template['end'],
+            'text': ''.join(word['word'] for word in words) if words else template['text'],
+        }
+        # Keep the Whisper segment's scores (avg_logprob, no_speech_prob, ...)
+        for key, value in template.items():
+            if key not in segment and key not in ('words', 'speaker'):
+                segment[key] = value
+        segment['words'] = words
+        segment['speaker'] = speaker
+        new_segments.append(segment)
+
+    position = 0
+    for template, words in groups:
+        if not words:
+            add_segment(template, words, assign_speaker(template['start'], template['end'], turns, primary_speaker, primary_speaker_name))
+            continue
+        word_labels = labels[position:position + len(words)]
+        position += len(words)
+        piece_start = 0
+        for i in range(1, len(words) + 1):
+            if i == len(words) or word_labels[i] != word_labels[piece_start]:
+                add_segment(template, words[piece_start:i], speaker_name(word_labels[piece_start]))
+                piece_start = i
+    return new_segments
+
+
+def label_transcript(data, turns, primary_speaker, primary_speaker_name):
+    """
+    Label the segments of a transcript with speakers.
+
+    Transcripts made with word timestamps are labeled word by word and split at speaker changes.
+    Others get one speaker per segment.
+    """
+    segments = data['segments']
+    if segments and all('words' in segment for segment in segments):
+        data['segments'] = split_segments_by_speaker(segments, turns, primary_speaker, primary_speaker_name)
+    else:
+        label_segments(segments, turns, primary_speaker, primary_speaker_name)
+
+
+def write_transcript_json(path, data):
+    """Save the transcript with 'language' and 'metadata' at the top."""
+    final_data = {
+        "language": data["language"],
+        "metadata": data["metadata"],
+        "text": data["text"],
+        "segments": data["segments"]
+    }
+    with open(path, 'w') as f:
+        json.dump(final_data, f, indent=4)
+
+
+def write_segment_txt(path, segments):
+    """Write one "[start > end] (speaker) text" line per segment, with rounded timestamps."""
+    segments_lines = []
+    for segment in segments:
+        start = round(segment['start'], 2)
+        end = round(segment['end'], 2)
+        text = segment['text'].strip()
+        speaker = segment['speaker']
+        segment_line = f"[{start} > {end}] ({speaker}) {text}"
+        segments_lines.append(segment_line)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(segments_lines))
@@ -0,0 +1,240 @@
+# Streamed audio acquisition for transcription-only runs (_merged08.py --stream).
+
+# yt-dlp writes the best audio stream to stdout, ffmpeg decodes it from stdin to 16 kHz mono 16-bit PCM on stdout,
+# and a reader thread appends the PCM to an AudioBuffer. No .wav is written and read back.
+# The buffer is held in memory up to max_memory bytes (a SpooledTemporaryFile) and spills to a temporary file beyond that,
+# so a multi-hour video does not hold the download in RAM twice.
+# Consumers read sample ranges while the download is still running (wait_for), or everything once it has finished.
+# _transcribe.StreamingVideoState transcribes each 30 second window as soon as it has arrived.
+# Like the .wav download, the stream is killed and restarted when no audio arrives for --stall-timeout seconds (see _supervisor.py).
+
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from _supervisor import ProcessStalled, count_stall, STALL_TIMEOUT, RETRIES
+
+SAMPLE_RATE = 16000  # what Whisper and pyannote expect
+BYTES_PER_SAMPLE = 2
+
+
+class AudioBuffer:
+    """16 kHz mono int16 PCM, held in memory up to max_memory bytes and spilled to a temporary file beyond that."""
+
+    def __init__(self, max_memory=256 << 20, spool_dir=None):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory, dir=spool_dir)
+        self.size = 0
+        self.finished = False
+        self.error = None
+        self.changed = threading.Condition()
+
+    def __len__(self):
+        """The number of complete samples received so far."""
+        return self.size // BYTES_PER_SAMPLE
+
+    @property
+    def duration(self):
+        return len(self) / SAMPLE_RATE
+
+    @property
+    def spilled(self):
+        return self.file._rolled
+
+    def append(self, data):
+        with self.changed:
+            self.file.seek(0, 2)
+            self.file.write(data)
+            self.size += len(data)
+            self.changed.notify_all()
+
+    def finish(self, error=None):
+        with self.changed:
+            self.finished = True
+            self.error = error
+            self.changed.notify_all()
+
+    def wait_for(self, samples, timeout=None):
+        """
+        Block until at least samples samples have arrived or the stream has ended.
+
+        Returns:
+            int: The number of samples available.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: len(self) >= samples or self.finished, timeout=timeout)
+            return len(self)
+
+    def read(self, start, count):
+        """Return up to count samples from start as float32 in [-1, 1), the format whisper.load_audio() returns."""
+        with self.changed:
+            count = max(0, min(count, len(self) - start))
+            self.file.seek(start * BYTES_PER_SAMPLE)
+            data = self.file.read(count * BYTES_PER_SAMPLE)
+        return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+    def samples(self):
+        return self.read(0, len(self))
+
+    def waveform(self):
+        """Return the audio as a pyannote {"waveform", "sample_rate"} dict."""
+        import torch
+        return {"waveform": torch.from_numpy(self.samples())[None], "sample_rate": SAMPLE_RATE}
+
+    def close(self):
+        self.file.close()
+
+
+class AudioStream:
+    """
+    Download and decode a video's audio into an AudioBuffer in the background.
+
+    yt-dlp and ffmpeg are watched like the commands of _supervisor.py: when no audio has arrived for stall_timeout seconds,
+    both are killed and started again, up to retries times, skipping the audio already received. A last stall ends the
+    buffer with ProcessStalled, so consumers waiting in AudioBuffer.wait_for() are released.
+    """
+
+    def __init__(self, url, buffer=None, chunk_size=1 << 16, stall_timeout=STALL_TIMEOUT, retries=RETRIES):
+        self.url = url
+        self.buffer = buffer if buffer is not None else AudioBuffer()
+        self.chunk_size = chunk_size
+        self.stall_timeout = stall_timeout
+        self.retries = retries
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _start(self):
+        # stderr goes to temporary files: a full stderr pipe nobody reads would stall the processes
+        self.download_log = tempfile.TemporaryFile()
+        self.decode_log = tempfile.TemporaryFile()
+        self.download = subprocess.Popen(
+            ['yt-dlp', '-f', 'bestaudio/best', '--quiet', '--no-progress', '--output', '-', self.url],
+            stdout=subprocess.PIPE, stderr=self.download_log,
+        )
+        self.decode = subprocess.Popen(
+            ['ffmpeg', '-nostdin', '-v', 'error', '-i', 'pipe:0', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', 'pipe:1'],
+            stdin=self.download.stdout, stdout=subprocess.PIPE, stderr=self.decode_log,
+        )
+        # Only ffmpeg holds the read end now, so yt-dlp gets SIGPIPE if ffmpeg exits early
+        self.download.stdout.close()
+
+    def _kill(self):
+        for process in (self.download, self.decode):
+            for stop in (process.terminate, process.kill):
+                if process.poll() is not None:
+                    break
+                stop()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    continue
+
+    def _pump(self, skip):
+        """
+        Append the decoded audio to the buffer, leaving out the first skip bytes (received by an earlier attempt).
+
+        Returns:
+            bool: Whether the processes were killed for making no progress.
+        """
+        last_progress = [time.monotonic()]
+        done = threading.Event()
+        stalled = [False]
+
+        def watchdog():
+            while not done.wait(min(1.0, self.stall_timeout / 10)):
+                if time.monotonic() - last_progress[0] > self.stall_timeout:
+                    stalled[0] = True
+                    self._kill()
+                    return
+
+        watcher = threading.Thread(target=watchdog, daemon=True)
+        watcher.start()
+        try:
+            for chunk in iter(lambda: self.decode.stdout.read(self.chunk_size), b''):
+                last_progress[0] = time.monotonic()
+                if skip:
+                    skipped = min(skip, len(chunk))
+                    chunk, skip = chunk[skipped:], skip - skipped
+                if chunk:
+                    self.buffer.append(chunk)
+        finally:
+            done.set()
+            watcher.join()
+            self.decode.stdout.close()
+        return stalled[0]
+
+    def _result(self):
+        """Wait for both processes and return the error to report, or None."""
+        decode_code = self.decode.wait()
+        download_code = self.download.wait()
+        # When ffmpeg fails first, yt-dlp dies of SIGPIPE: report ffmpeg then, otherwise yt-dlp's own failure
+        if download_code and download_code != -signal.SIGPIPE:
+            error = self._error(download_code, 'yt-dlp', self.download_log)
+        elif decode_code:
+            error = self._error(decode_code, 'ffmpeg', self.decode_log)
+        elif download_code:
+            error = self._error(download_code, 'yt-dlp', self.download_log)
+        else:
+            error = None
+        self.download_log.close()
+        self.decode_log.close()
+        return error
+
+    def _run(self):
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                with self.lock:
+                    if self.stopped:
+                        break
+                    self._start()
+                # A restarted download decodes the same audio from the beginning again
+                stalled = self._pump(self.buffer.size)
+                error = self._result()
+                if not stalled or self.stopped:
+                    break
+                count_stall()
+                if attempt < self.retries:
+                    print(f"The audio stream made no progress for {self.stall_timeout:.0f} seconds: "
+                          f"killed, starting again ({attempt + 1}/{self.retries})")
+                    time.sleep(min(60, 5 * 2 ** attempt))
+                    continue
+                error = ProcessStalled(None, ['yt-dlp', self.url], stderr=error.stderr if error is not None else None)
+                error.stall_timeout = self.stall_timeout
+        finally:
+            self.buffer.finish(error)
+
+    @staticmethod
+    def _error(returncode, name, log):
+        log.seek(0)
+        return subprocess.CalledProcessError(returncode, name, stderr=log.read().decode(errors='replace'))
+
+    def stop(self):
+        """Stop downloading, e.g., when the first minutes show the video is a duplicate."""
+        with self.lock:
+            self.stopped = True
+            if hasattr(self, 'download'):
+                for process in (self.download, self.decode):
+                    if process.poll() is None:
+                        process.terminate()
+        self.thread.join()
+
+    def wait(self):
+        """
+        Wait for the download to finish.
+
+        Returns:
+            AudioBuffer: The complete audio.
+
+        Raises:
+            subprocess.CalledProcessError: If yt-dlp or ffmpeg failed, or ProcessStalled if they stopped making progress.
+        """
+        self.thread.join()
+        if self.buffer.error is not None:
+            raise self.buffer.error
+        return self.buffer
@@ -0,0 +1,175 @@
+# Supervised external commands (yt-dlp, whisper, ffmpeg) for _merged08.py and _wav_to_mp4_03.py.
+
+# subprocess.run() waits forever for a download that has stopped receiving data or an ffmpeg that hangs, and with it
+# the whole channel run. run_supervised() runs the command in its own process group and watches for progress:
+#   - any output on stdout or stderr (yt-dlp's progress, Whisper's segment lines), or only output lines matching
+#     progress_pattern whose value changed (ffmpeg -progress pipe:1 prints out_time_us=... even while stuck),
+#   - growth of the files matching watch_glob (a download, or yt-dlp's silent audio extraction).
+# A command without progress for stall_timeout seconds is killed with its children and started again, up to retries times.
+# Stalls are counted (stall_count()) so the run metrics can report them, and a last stall raises ProcessStalled,
+# a CalledProcessError, so the callers' error handling stays the same.
+
+import glob
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+STALL_TIMEOUT = 600.0  # seconds without progress
+RETRIES = 2
+FFMPEG_PROGRESS = rb"out_time_us=(\d+)"
+
+stalls = 0
+stalls_lock = threading.Lock()
+
+
+class ProcessStalled(subprocess.CalledProcessError):
+    """The command made no progress for stall_timeout seconds on every attempt."""
+
+    def __str__(self):
+        return f"Command '{self.cmd}' made no progress for {self.stall_timeout:.0f} seconds and was killed."
+
+
+def stall_count():
+    """The number of stalled commands killed by this process so far."""
+    return stalls
+
+
+def count_stall():
+    global stalls
+    with stalls_lock:
+        stalls += 1
+
+
+def file_sizes(pattern):
+    total = 0
+    for path in glob.glob(pattern):
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def kill_group(process):
+    """Terminate the command and everything it started (e.g., the ffmpeg under yt-dlp), then kill what is left."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            process.wait(timeout=10)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def run_once(command, stall_timeout, capture_output, echo, progress_pattern, watch_glob, cwd):
+    """Run the command once. Returns (returncode, stdout bytes, stderr bytes, stalled)."""
+    # Python children (whisper, yt-dlp) block-buffer a piped stdout, which would hide their progress for minutes
+    environment = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, env=environment,
+                               start_new_session=True)
+    last_progress = [time.monotonic()]
+    captured = {"stdout": [], "stderr": []}
+    pattern = re.compile(progress_pattern) if progress_pattern else None
+    last_value = [None]
+
+    def read(stream, name, console):
+        pending = b""
+        for chunk in iter(lambda: stream.read1(1 << 16), b""):
+            if capture_output:
+                captured[name].append(chunk)
+            if echo:
+                console.buffer.write(chunk)
+                console.flush()
+            if pattern is None:
+                last_progress[0] = time.monotonic()
+                continue
+            # Only a changed value counts, so the lines are split and only complete ones are matched
+            lines = re.split(rb"[\r\n]", pending + chunk)
+            pending = lines.pop()
+            for line in lines:
+                match = pattern.search(line)
+                if match and match.group(match.lastindex or 0) != last_value[0]:
+                    last_value[0] = match.group(match.lastindex or 0)
+                    last_progress[0] = time.monotonic()
+
+    readers = [
+        threading.Thread(target=read, args=(process.stdout, "stdout", sys.stdout), daemon=True),
+        threading.Thread(target=read, args=(process.stderr, "stderr", sys.stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    stalled = False
+    size = file_sizes(watch_glob) if watch_glob else 0
+    try:
+        while process.poll() is None:
+            time.sleep(min(1.0, stall_timeout / 10))
+            if watch_glob:
+                current = file_sizes(watch_glob)
+                if current != size:
+                    size = current
+                    last_progress[0] = time.monotonic()
+            if time.monotonic() - last_progress[0] > stall_timeout:
+                stalled = True
+                kill_group(process)
+                break
+    except BaseException:
+        # Ctrl+C does not reach a command in its own session
+        kill_group(process)
+        raise
+    for reader in readers:
+        reader.join(timeout=10)
+    process.stdout.close()
+    process.stderr.close()
+    return process.wait(), b"".join(captured["stdout"]), b"".join(captured["stderr"]), stalled
+
+
+def run_supervised(command, stall_timeout=STALL_TIMEOUT, retries=RETRIES, check=False, capture_output=False, text=False,
+                   progress_pattern=None, watch_glob=None, cwd=None):
+    """
+    Run a command like subprocess.run(), killing and restarting it when it stops making progress.
+
+    Args:
+        command: The command line.
+        stall_timeout: Seconds without progress after which the command is killed.
+        retries: How many times a stalled command is started again.
+        check: Raise CalledProcessError if the command fails.
+        capture_output: Return stdout and stderr instead of passing them through to the console.
+        text: Decode the captured output.
+        progress_pattern: A bytes regex. When given, only output lines where its (first group's) value changed count as progress.
+        watch_glob: Files whose growing size counts as progress.
+        cwd: The working directory.
+
+    Returns:
+        subprocess.CompletedProcess: The last attempt.
+
+    Raises:
+        ProcessStalled: If the last attempt stalled too (whatever check is).
+        subprocess.CalledProcessError: If check and the command failed.
+    """
+    for attempt in range(retries + 1):
+        returncode, stdout, stderr, stalled = run_once(command, stall_timeout, capture_output, not capture_output,
+                                                       progress_pattern, watch_glob, cwd)
+        if not stalled:
+            break
+        count_stall()
+        if attempt < retries:
+            print(f"{os.path.basename(command[0])} made no progress for {stall_timeout:.0f} seconds: "
+                  f"killed, starting again ({attempt + 1}/{retries})")
+            time.sleep(min(60, 5 * 2 ** attempt))
+    if text:
+        stdout, stderr = stdout.decode(errors="replace"), stderr.decode(errors="replace")
+    if stalled:
+        error = ProcessStalled(returncode, command, stdout, stderr)
+        error.stall_timeout = stall_timeout
+        raise error
+    if check and returncode:
+        raise subprocess.CalledProcessError(returncode, command, stdout, stderr)
+    return subprocess.CompletedProcess(command, returncode, stdout if capture_output else None, stderr if capture_output else None)
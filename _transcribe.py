@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+
+# Transcribes .wav files with the Whisper Python API instead of the whisper CLI.
+# The model is loaded once and 30 second windows from several files are decoded together in one forward pass.
+# This keeps the model busy when a channel is full of short clips which would otherwise be transcribed one at a time with batch size 1.
+
+# The output is <video_id>.json in the same format the whisper CLI writes (text, segments, language).
+# _merged08.py picks up an existing <video_id>.json instead of running the whisper CLI again.
+
+# The following is a sample run command.
+# python3 _transcribe.py ./temp/*.wav --model medium --batch-size 8
+
+# Note: whisper.decode() shares one prompt and one language token across a batch.
+# For that reason windows are only batched together with windows of the same language, and by default every window is
+# decoded without conditioning on the previous window's text (like whisper --condition_on_previous_text False).
+# The whisper CLI conditions on the previous text by default, so these transcripts can differ from the CLI's.
+# Running with --batch-size 1 goes through exactly the same code path, so batching never changes the per-video output.
+# --condition-on-previous-text prompts each window with the text before it, as the CLI does, and so decodes the files
+# one window at a time (no batching across files).
+
+# With --feature-cache the log-mel features of every file are saved as a float16 .npy file,
+# keyed by a hash of the audio file and the feature parameters. The hash is remembered per path, size and modification time,
+# so an unchanged file is not read again just to find its features.
+# Re-running with another model or other decoding options loads the features from disk (memory-mapped with --mmap)
+# so a parameter sweep over a whole channel only costs decoder time.
+# python3 _transcribe.py ./temp/*.wav --model small --feature-cache ./mel_cache --mmap
+
+# With --checkpoint-dir the seek position and finished segments of every file are saved at most every --checkpoint-every seconds,
+# and a restarted run continues each file from its checkpoint instead of from the start (e.g., on preemptible machines).
+# python3 _transcribe.py ./temp/*.wav --checkpoint-dir ./checkpoints --checkpoint-every 60
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import HOP_LENGTH, N_FFT, N_FRAMES, N_SAMPLES, SAMPLE_RATE
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+
+# Same defaults as the whisper CLI
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+BEST_OF = 5
+BEAM_SIZE = 5
+PROMPT_TOKENS = 223  # the most previous text tokens whisper.decode() uses as the prompt (n_text_ctx // 2 - 1)
+
+
+class VideoState:
+    """Seek position and finished segments for one file while it is being transcribed."""
+
+    def __init__(self, video_id, mel, language=None, partial_path=None, checkpoint_path=None, checkpoint_every=60.0, checkpoint_key=None):
+        self.video_id = video_id
+        self.mel = mel
+        self.language = language
+        self.seek = 0
+        self.segments = []
+        self.prompt = []  # the previous text tokens, as whisper.transcribe() keeps them
+        self.partial_path = partial_path
+        self.emitted = 0
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_key = checkpoint_key
+        self.checkpointed = time.time()
+
+    @property
+    def content_frames(self):
+        return self.mel.shape[-1] - N_FRAMES
+
+    def emit(self):
+        """Append the segments finished since the last call to partial_path, one JSON object per line."""
+        if self.partial_path is None or self.emitted == len(self.segments):
+            return
+        with open(self.partial_path, 'a', encoding='utf-8') as f:
+            for segment in self.segments[self.emitted:]:
+                f.write(json.dumps(segment, ensure_ascii=False) + '\n')
+        self.emitted = len(self.segments)
+
+    def checkpoint(self, force=False):
+        """Save the seek position and finished segments to checkpoint_path, at most once every checkpoint_every seconds."""
+        if self.checkpoint_path is None or not force and time.time() - self.checkpointed < self.checkpoint_every:
+            return
+        data = {
+            "video_id": self.video_id,
+            "key": self.checkpoint_key,
+            "language": self.language,
+            "seek": self.seek,
+            "segments": self.segments,
+            "prompt": self.prompt,
+        }
+        # Write to a temporary name first so being killed mid-write never corrupts the last good checkpoint
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.checkpointed = time.time()
+
+    def restore(self):
+        """
+        Resume from checkpoint_path if it holds a checkpoint of this video with the same key.
+
+        Returns:
+            bool: Whether a checkpoint was restored.
+        """
+        if self.checkpoint_path is None:
+            return False
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if data.get("video_id") != self.video_id or data.get("key") != self.checkpoint_key:
+            return False
+        self.language = data["language"]
+        self.seek = data["seek"]
+        self.segments = data["segments"]
+        self.prompt = data.get("prompt", [])
+        print(f"Resuming {self.video_id} from its checkpoint at {self.seek * HOP_LENGTH / SAMPLE_RATE / 60:.1f} minutes")
+        return True
+
+    def clear_checkpoint(self):
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    @property
+    def done(self):
+        return self.seek >= self.content_frames
+
+    def next_window(self):
+        """Return (mel_segment, segment_size) for the window starting at the current seek position."""
+        segment_size = min(N_FRAMES, self.content_frames - self.seek)
+        mel_segment = self.mel[:, self.seek:self.seek + N_FRAMES]
+        mel_segment = torch.as_tensor(np.asarray(mel_segment, dtype=np.float32))
+        return whisper.pad_or_trim(mel_segment, N_FRAMES), segment_size
+
+    def result(self):
+        text = "".join(segment["text"] for segment in self.segments)
+        return {"text": text, "segments": self.segments, "language": self.language}
+
+
+class StreamingVideoState(VideoState):
+    """
+    A VideoState fed by an AudioBuffer (see _stream_audio.py) which is still being downloaded.
+
+    The log-mel spectrogram is computed one 30 second window at a time, as soon as that window's audio has arrived,
+    so transcription runs alongside the download. Each window is normalized on its own (whisper normalizes over the
+    whole file), which only changes the floor of very quiet frames.
+    """
+
+    def __init__(self, video_id, buffer, n_mels, **kwargs):
+        super().__init__(video_id, None, **kwargs)
+        self.buffer = buffer
+        self.n_mels = n_mels
+
+    @property
+    def content_frames(self):
+        """The frames known so far, final once the download has finished."""
+        return len(self.buffer) // HOP_LENGTH
+
+    @property
+    def done(self):
+        # Blocks until the window at the seek position has fully arrived or the download has finished
+        self.buffer.wait_for(self.seek * HOP_LENGTH + N_SAMPLES)
+        return self.buffer.finished and self.seek >= self.content_frames
+
+    def next_window(self):
+        self.buffer.wait_for(self.seek * HOP_LENGTH + N_SAMPLES)
+        audio = self.buffer.read(self.seek * HOP_LENGTH, N_SAMPLES)
+        mel_segment = whisper.log_mel_spectrogram(audio, self.n_mels, padding=N_SAMPLES)
+        segment_size = min(N_FRAMES, self.content_frames - self.seek) if self.buffer.finished else N_FRAMES
+        return whisper.pad_or_trim(mel_segment, N_FRAMES), segment_size
+
+
+def compute_mel(model, audio_path):
+    """Load a file and compute its log-mel spectrogram, padded the same way whisper.transcribe() pads it."""
+    audio = whisper.load_audio(audio_path)
+    return whisper.log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+
+
+def hash_file(path, block_size=1 << 20):
+    """Return the sha256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash_of(cache_dir, audio_path):
+    """
+    Return the content hash of an audio file, looked up by its path, size and modification time.
+
+    Hashing a long .wav costs about as much as reading it, so the hash is only computed when the file is new or has
+    changed, and remembered in <cache_dir>/by-stat/ for the next run.
+    """
+    stat = os.stat(audio_path)
+    stat_key = hashlib.sha256(f"{os.path.abspath(audio_path)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode()).hexdigest()
+    stat_path = os.path.join(cache_dir, "by-stat", f"{stat_key}.txt")
+    try:
+        with open(stat_path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    content_hash = hash_file(audio_path)
+    os.makedirs(os.path.dirname(stat_path), exist_ok=True)
+    tmp_path = f"{stat_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content_hash)
+    os.replace(tmp_path, stat_path)
+    return content_hash
+
+
+def feature_cache_path(cache_dir, audio_hash, n_mels):
+    """Return the cache file for an audio hash and the feature parameters it was computed with."""
+    params = f"logmel-sr{SAMPLE_RATE}-fft{N_FFT}-hop{HOP_LENGTH}-mels{n_mels}-pad{N_SAMPLES}"
+    return os.path.join(cache_dir, f"{audio_hash}.{params}.npy")
+
+
+def load_features(model, audio_path, cache_dir=None, mmap=False):
+    """
+    Return the log-mel spectrogram of a file, using the feature cache when one is given.
+
+    Cached features are stored as float16. The features are always returned as the float16 values,
+    even right after computing them, so the first run and every re-run decode exactly the same input.
+
+    Args:
+        model: A loaded Whisper model (only model.dims.n_mels is used).
+        audio_path: The .wav file.
+        cache_dir: The feature cache directory, or None to compute the features without caching.
+        mmap: Whether to memory-map cached features instead of reading them into memory.
+
+    Returns:
+        A (n_mels, frames) tensor or array.
+    """
+    if cache_dir is None:
+        return compute_mel(model, audio_path)
+
+    cache_path = feature_cache_path(cache_dir, content_hash_of(cache_dir, audio_path), model.dims.n_mels)
+    if os.path.exists(cache_path):
+        print(f"Loaded cached features: {cache_path}")
+        return np.load(cache_path, mmap_mode='r' if mmap else None)
+
+    mel = compute_mel(model, audio_path).cpu().numpy().astype(np.float16)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary name first so an interrupted run never leaves a truncated cache file
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, mel)
+    os.replace(tmp_path, cache_path)
+    print(f"Cached features: {cache_path}")
+    return mel
+
+
+def detect_languages(model, states, fp16):
+    """Detect the language of every state whose language is not set, from its first window, in one batch."""
+    pending = [state for state in states if state.language is None]
+    if not pending:
+        return
+    dtype = torch.float16 if fp16 else torch.float32
+    mel_batch = torch.stack([state.next_window()[0] for state in pending]).to(model.device).to(dtype)
+    _, probs = model.detect_language(mel_batch)
+    for state, prob in zip(pending, probs):
+        state.language = max(prob, key=prob.get)
+        print(f"Detected language for {state.video_id}: {state.language}")
+
+
+def decode_with_fallback(model, mel_batch, decode_options):
+    """Decode a batch of windows, re-decoding only the windows that fail the quality checks at the next temperature."""
+    results = [None] * len(mel_batch)
+    remaining = list(range(len(mel_batch)))
+    for t in TEMPERATURES:
+        kwargs = {**decode_options}
+        if t > 0:
+            kwargs.pop("beam_size", None)
+            kwargs.pop("patience", None)
+        else:
+            kwargs.pop("best_of", None)
+        options = DecodingOptions(**kwargs, temperature=t)
+        decoded = model.decode(mel_batch[remaining], options)
+
+        still_failing = []
+        for index, decode_result in zip(remaining, decoded):
+            results[index] = decode_result
+            needs_fallback = False
+            if decode_result.compression_ratio > COMPRESSION_RATIO_THRESHOLD:
+                needs_fallback = True  # too repetitive
+            if decode_result.avg_logprob < LOGPROB_THRESHOLD:
+                needs_fallback = True  # average log probability is too low
+            if decode_result.no_speech_prob > NO_SPEECH_THRESHOLD:
+                needs_fallback = False  # silence
+            if needs_fallback:
+                still_failing.append(index)
+        remaining = still_failing
+        if not remaining:
+            break
+    return results
+
+
+def advance(state, result, segment_size, tokenizer, input_stride, time_precision):
+    """Turn one decoded window into segments and move the seek position, as whisper.transcribe() does."""
+    seek = state.seek
+    time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+    segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+    tokens = torch.tensor(result.tokens)
+
+    # Skip windows that are mostly silence
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob <= LOGPROB_THRESHOLD:
+        state.seek += segment_size
+        return
+
+    def new_segment(start, end, segment_tokens):
+        segment_tokens = segment_tokens.tolist()
+        text_tokens = [token for token in segment_tokens if token < tokenizer.eot]
+        return {
+            "seek": seek,
+            "start": start,
+            "end": end,
+            "text": tokenizer.decode(text_tokens),
+            "tokens": segment_tokens,
+            "temperature": result.temperature,
+            "avg_logprob": result.avg_logprob,
+            "compression_ratio": result.compression_ratio,
+            "no_speech_prob": result.no_speech_prob,
+        }
+
+    current_segments = []
+    timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+    single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+    consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0]
+    consecutive.add_(1)
+
+    if len(consecutive) > 0:
+        # The window contains several consecutive timestamp pairs
+        slices = consecutive.tolist()
+        if single_timestamp_ending:
+            slices.append(len(tokens))
+        last_slice = 0
+        for current_slice in slices:
+            sliced_tokens = tokens[last_slice:current_slice]
+            start_timestamp_pos = sliced_tokens[0].item() - tokenizer.timestamp_begin
+            end_timestamp_pos = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+            current_segments.append(new_segment(
+                time_offset + start_timestamp_pos * time_precision,
+                time_offset + end_timestamp_pos * time_precision,
+                sliced_tokens,
+            ))
+            last_slice = current_slice
+        if single_timestamp_ending:
+            state.seek += segment_size
+        else:
+            # Continue from the last timestamp that closed a segment
+            last_timestamp_pos = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+            state.seek += last_timestamp_pos * input_stride
+    else:
+        duration = segment_duration
+        timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+        if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+            last_timestamp_pos = timestamps[-1].item() - tokenizer.timestamp_begin
+            duration = last_timestamp_pos * time_precision
+        current_segments.append(new_segment(time_offset, time_offset + duration, tokens))
+        state.seek += segment_size
+
+    # Drop empty segments
+    current_segments = [
+        segment for segment in current_segments
+        if segment["start"] != segment["end"] and segment["text"].strip()
+    ]
+    for segment in current_segments:
+        segment["id"] = len(state.segments)
+        state.segments.append(segment)
+
+    # A window decoded at a high temperature is unreliable context: the prompt starts over from it
+    if result.temperature > 0.5:
+        state.prompt = []
+    state.prompt = (state.prompt + [token for segment in current_segments for token in segment["tokens"]])[-PROMPT_TOKENS:]
+
+
+def transcribe_batch(model, states, batch_size=8, fp16=False, condition_on_previous_text=False):
+    """
+    Transcribe several files at once, packing one window per file into each forward pass.
+
+    Args:
+        model: A loaded Whisper model.
+        states: A list of VideoState objects, one per file.
+        batch_size: The maximum number of windows decoded in one forward pass.
+        fp16: Whether to decode in half precision (only useful on a GPU).
+        condition_on_previous_text: Prompt each window with the file's previous text, like the whisper CLI.
+            Every file has its own prompt, so the windows are then decoded one at a time.
+
+    Returns:
+        dict: video_id -> whisper-style result dict (text, segments, language).
+    """
+    dtype = torch.float16 if fp16 else torch.float32
+    input_stride = N_FRAMES // model.dims.n_audio_ctx  # mel frames per output token: 2
+    time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE  # time per output token: 0.02 seconds
+
+    detect_languages(model, states, fp16)
+
+    while True:
+        active = [state for state in states if not state.done]
+        if not active:
+            break
+
+        # Only windows in the same language can share a batch because the language token is part of the prompt
+        by_language = {}
+        for state in active:
+            by_language.setdefault(state.language, []).append(state)
+
+        for language, group in by_language.items():
+            tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages, language=language, task="transcribe")
+            decode_options = {"task": "transcribe", "language": language, "best_of": BEST_OF, "beam_size": BEAM_SIZE, "fp16": fp16}
+            step = 1 if condition_on_previous_text else batch_size
+            for i in range(0, len(group), step):
+                batch_states = group[i:i + step]
+                windows = [state.next_window() for state in batch_states]
+                mel_batch = torch.stack([mel_segment for mel_segment, _ in windows]).to(model.device).to(dtype)
+                options = {**decode_options, "prompt": batch_states[0].prompt} if condition_on_previous_text else decode_options
+                results = decode_with_fallback(model, mel_batch, options)
+                # Demultiplex the batch back to the file each window came from
+                for state, (_, segment_size), result in zip(batch_states, windows, results):
+                    advance(state, result, segment_size, tokenizer, input_stride, time_precision)
+                    state.emit()
+                    state.checkpoint()
+
+    return {state.video_id: state.result() for state in states}
+
+
+def checkpoint_path(directory, video_id):
+    return os.path.join(directory, f"{video_id}.transcribe.ckpt.json")
+
+
+def transcribe_stream(model, video_id, buffer, condition_on_previous_text=False, **kwargs):
+    """
+    Transcribe an AudioBuffer (see _stream_audio.py) while it is being filled, window by window.
+
+    Finished segments are appended to partial_path (JSONL) as they are decoded, so a long video can be followed
+    before the download ends. With checkpoint_path the transcription resumes from the last checkpoint
+    (the download starts over, but windows before the checkpoint are not decoded again).
+
+    Args:
+        condition_on_previous_text: Prompt each window with the previous text, like the whisper CLI.
+        kwargs: The VideoState options (language, partial_path, checkpoint_path, checkpoint_every, checkpoint_key).
+
+    Returns:
+        dict: The whisper-style result (text, segments, language).
+    """
+    state = StreamingVideoState(video_id, buffer, model.dims.n_mels, **kwargs)
+    state.restore()
+    return transcribe_batch(model, [state], batch_size=1, fp16=model.device.type == "cuda",
+                            condition_on_previous_text=condition_on_previous_text)[video_id]
+
+
+def transcribe_file(model, video_id, audio_path, condition_on_previous_text=False, **kwargs):
+    """
+    Transcribe one audio file, resuming from checkpoint_path when given (see transcribe_stream for the options).
+
+    Returns:
+        dict: The whisper-style result (text, segments, language).
+    """
+    state = VideoState(video_id, compute_mel(model, audio_path), **kwargs)
+    state.restore()
+    return transcribe_batch(model, [state], batch_size=1, fp16=model.device.type == "cuda",
+                            condition_on_previous_text=condition_on_previous_text)[video_id]
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Transcribe .wav files with Whisper, batching windows from several files into one forward pass.")
+    parser.add_argument("audio_files", nargs="+", help="The .wav files to transcribe. The file name without extension is used as the video_id.")
+    parser.add_argument("--model", default="medium", help="The Whisper model to use.")
+    parser.add_argument("--batch-size", type=int, default=8, help="The number of 30 second windows decoded in one forward pass.")
+    parser.add_argument("--queue-size", type=int, default=32, help="The number of files held in memory and transcribed together.")
+    parser.add_argument("--language", default=None, help="Skip language detection and use this language for every file.")
+    parser.add_argument("--output-dir", default=".", help="Where to write <video_id>.json.")
+    parser.add_argument("--feature-cache", default=None, help="Directory for cached log-mel features. Re-runs load the features from here instead of recomputing them.")
+    parser.add_argument("--mmap", action="store_true", help="Memory-map cached features instead of reading them into memory.")
+    parser.add_argument("--checkpoint-dir", default=None, help="Save each file's progress here (<video_id>.transcribe.ckpt.json) and resume from it after a crash.")
+    parser.add_argument("--checkpoint-every", type=float, default=60.0, help="Seconds between checkpoints of a file.")
+    parser.add_argument("--condition-on-previous-text", action="store_true", help="Prompt each window with the previous text like the whisper CLI, decoding the files one window at a time.")
+    args = parser.parse_args()
+
+    if args.batch_size < 1 or args.queue_size < 1:
+        print("Error: --batch-size and --queue-size must be at least 1.")
+        exit(1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.checkpoint_dir is not None:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    fp16 = device == "cuda"
+    model = whisper.load_model(args.model, device=device)
+    print(f"Loaded Whisper model {args.model} on {device}")
+
+    started = time.time()
+    audio_seconds = 0.0
+    for i in range(0, len(args.audio_files), args.queue_size):
+        queue = args.audio_files[i:i + args.queue_size]
+        states = []
+        for audio_path in queue:
+            video_id = os.path.splitext(os.path.basename(audio_path))[0]
+            mel = load_features(model, audio_path, cache_dir=args.feature_cache, mmap=args.mmap)
+            state = VideoState(video_id, mel, language=args.language)
+            if args.checkpoint_dir is not None:
+                state.checkpoint_path = checkpoint_path(args.checkpoint_dir, video_id)
+                state.checkpoint_every = args.checkpoint_every
+                state.checkpoint_key = args.model
+                state.restore()
+            audio_seconds += state.content_frames * HOP_LENGTH / SAMPLE_RATE
+            states.append(state)
+
+        results = transcribe_batch(model, states, batch_size=args.batch_size, fp16=fp16,
+                                   condition_on_previous_text=args.condition_on_previous_text)
+
+        for state in states:
+            whisper_output = os.path.join(args.output_dir, f"{state.video_id}.json")
+            with open(whisper_output, 'w', encoding='utf-8') as f:
+                json.dump(results[state.video_id], f)
+            state.clear_checkpoint()
+            print(f"Transcription completed: {whisper_output}")
+
+    elapsed = time.time() - started
+    print(f"Transcribed {len(args.audio_files)} files ({audio_seconds / 60:.1f} minutes of audio) in {elapsed / 60:.1f} minutes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Finding the merged transcripts (<video_id>.json) among the other .json files of a working directory.
+
+# Shared by _chunker.py, _boilerplate.py, _meta_only.py, _search_index.py and _segment_store.py.
+# Kept free of heavy imports, so importing it has no side effects.
+
+import glob
+import os
+import re
+
+# A YouTube video id is 11 characters from [A-Za-z0-9_-]
+TRANSCRIPT_NAME = re.compile(r"[A-Za-z0-9_-]{11}\.json")
+
+
+def is_transcript_name(path):
+    """
+    True for <video_id>.json. False for <video_id>_metadata.json, derived files like <video_id>.filtered.json
+    and the state files written next to the transcripts (e.g., boilerplate_report.json).
+    """
+    return TRANSCRIPT_NAME.fullmatch(os.path.basename(path)) is not None
+
+
+def find_transcripts(inputs, filtered=False):
+    """
+    Expand directories and glob patterns into merged transcript files (<video_id>.json).
+
+    With filtered=True, <video_id>.filtered.json (written by _boilerplate.py) is used instead where it exists.
+    """
+    json_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(glob.glob(os.path.join(item, "*.json")))
+        elif glob.has_magic(item):
+            matches = sorted(glob.glob(item))
+        else:
+            matches = [item]
+        for path in matches:
+            if not is_transcript_name(path):
+                continue
+            filtered_path = os.path.splitext(path)[0] + ".filtered.json"
+            json_files.append(filtered_path if filtered and os.path.exists(filtered_path) else path)
+    return json_files
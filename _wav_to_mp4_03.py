@@ -1,5 +1,13 @@
+import argparse
+import hashlib
 import os
+import queue
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _supervisor import run_supervised, stall_count, ProcessStalled, FFMPEG_PROGRESS
 
 # Path to the folder containing your .wav files
 AUDIO_FOLDER = "./temp"
@@ -8,12 +16,70 @@ IMAGE_PATH = "_blank.jpg"
 # Output folder for .mp4 files (it will be created if it doesn't exist)
 OUTPUT_FOLDER = "mp4_files"
 
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+# The video track is the same frozen image for every file, so it is encoded once as a short clip
+# which every conversion loops and copies (-stream_loop -1 -c:v copy), encoding only the AAC audio.
+STILL_FRAMERATE = 2
+STILL_SECONDS = 60
+STILL_GOP = 20  # a keyframe every 10 seconds keeps seeking responsive
+
+# ffmpeg reports its position with -progress, and a conversion whose position stops advancing is killed and retried
+STALL_TIMEOUT = 120.0
+STALL_RETRIES = 2
+PROGRESS_OPTIONS = ["-progress", "pipe:1", "-nostats"]
+
+
+def run_ffmpeg(cmd, check=False, stall_timeout=STALL_TIMEOUT):
+    """Run ffmpeg under the stall supervisor. A conversion which stalls on every attempt fails like any other."""
+    try:
+        return run_supervised(cmd, stall_timeout=stall_timeout, retries=STALL_RETRIES, check=check, capture_output=True,
+                              progress_pattern=FFMPEG_PROGRESS)
+    except ProcessStalled as e:
+        if check:
+            raise
+        return subprocess.CompletedProcess(cmd, e.returncode, e.output, str(e).encode() + b"\n" + e.stderr)
+
+
+def still_track_path(image_path, output_folder):
+    """The cached still-image track for an image, named after its content and the encoding settings."""
+    digest = hashlib.sha1()
+    with open(image_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(f"{STILL_FRAMERATE}-{STILL_SECONDS}-{STILL_GOP}".encode())
+    return os.path.join(output_folder, f".still_{digest.hexdigest()[:12]}.mp4")
+
 
-def convert_wav_to_mp4(wav_path, image_path, output_path):
+def encode_still_track(image_path, output_folder, stall_timeout=STALL_TIMEOUT):
+    """Encode the still-image track once and return its path."""
+    still_path = still_track_path(image_path, output_folder)
+    if os.path.exists(still_path):
+        return still_path
+    tmp_path = f"{still_path}.{os.getpid()}.tmp.mp4"
     cmd = [
         "ffmpeg",
         "-y",
+        *PROGRESS_OPTIONS,
+        "-loop", "1",
+        "-framerate", str(STILL_FRAMERATE),
+        "-i", image_path,
+        "-t", str(STILL_SECONDS),
+        "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+        "-c:v", "libx264",
+        "-tune", "stillimage",
+        "-g", str(STILL_GOP),
+        "-pix_fmt", "yuv420p",
+        "-an",
+        tmp_path
+    ]
+    run_ffmpeg(cmd, check=True, stall_timeout=stall_timeout)
+    os.replace(tmp_path, still_path)
+    return still_path
+
+
+def convert_wav_to_mp4(wav_path, image_path, output_path, stall_timeout=STALL_TIMEOUT):
+    cmd = [
+        "ffmpeg",
+        "-y",
+        *PROGRESS_OPTIONS,
         "-loop", "1",
         "-framerate", "2",
         "-i", image_path,
@@ -28,19 +94,204 @@ def convert_wav_to_mp4(wav_path, image_path, output_path):
         "-movflags", "+faststart",
         output_path
     ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    result = run_ffmpeg(cmd, stall_timeout=stall_timeout)
     if result.returncode != 0:
         print(f"❌ ffmpeg failed for {wav_path}:\n{result.stderr.decode()}")
+    return result.returncode == 0
+
+
+def mux_wav_with_still(wav_path, still_path, output_path, stall_timeout=STALL_TIMEOUT):
+    """Loop the pre-encoded still track under the audio, copying the video and encoding only the audio."""
+    cmd = [
+        "ffmpeg",
+        "-y",
+        *PROGRESS_OPTIONS,
+        "-stream_loop", "-1",
+        "-i", still_path,
+        "-i", wav_path,
+        "-map", "0:v",
+        "-map", "1:a",
+        "-c:v", "copy",
+        "-c:a", "aac",
+        "-b:a", "192k",
+        "-shortest",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    result = run_ffmpeg(cmd, stall_timeout=stall_timeout)
+    if result.returncode != 0:
+        print(f"❌ ffmpeg failed for {wav_path}:\n{result.stderr.decode()}")
+    return result.returncode == 0
+
+
+def output_path_for(wav_path, output_folder):
+    return os.path.join(output_folder, os.path.splitext(os.path.basename(wav_path))[0] + ".mp4")
+
+
+def is_current(wav_path, output_path):
+    """True if the .mp4 exists and is newer than its .wav."""
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(wav_path)
+    except FileNotFoundError:
+        return False
+
+
+def convert_atomically(convert, wav_path, output_path):
+    """Convert to a temporary file and rename it, so an interrupted conversion never leaves an .mp4 which looks current."""
+    tmp_path = f"{output_path}.tmp.mp4"
+    if convert(wav_path, tmp_path):
+        os.replace(tmp_path, output_path)
+        return True
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return False
+
+
+def watch(audio_folder, submit, settle, poll_interval):
+    """
+    Submit every .wav in the folder once its size and modification time have not changed for settle seconds.
+
+    New files are noticed through filesystem notifications when watchdog is installed, otherwise by listing the folder
+    every poll_interval seconds. Runs until interrupted.
+    """
+    changed = queue.Queue()
+    observer = None
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        class WavHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # yt-dlp writes to a temporary name and renames it, so the destination of moves counts too
+                for path in (getattr(event, "dest_path", None), event.src_path):
+                    if path and str(path).endswith(".wav"):
+                        changed.put(str(path))
+
+        observer = Observer()
+        observer.schedule(WavHandler(), audio_folder, recursive=False)
+        observer.start()
+        print(f"Watching {audio_folder} for new .wav files (filesystem notifications). Press Ctrl+C to stop.")
+    except ImportError:
+        print(f"Watching {audio_folder} for new .wav files (polling every {poll_interval} seconds). Press Ctrl+C to stop.")
+
+    pending = {}  # path -> ((size, mtime), time first seen with that size and mtime)
+    submitted = {}  # path -> (size, mtime) when it was submitted, so an unchanged file is not submitted again
+    for filename in os.listdir(audio_folder):
+        if filename.endswith(".wav"):
+            changed.put(os.path.join(audio_folder, filename))
+    last_listing = time.time()
+    try:
+        while True:
+            if observer is None and time.time() - last_listing >= poll_interval:
+                for filename in os.listdir(audio_folder):
+                    if filename.endswith(".wav"):
+                        changed.put(os.path.join(audio_folder, filename))
+                last_listing = time.time()
+            while not changed.empty():
+                path = changed.get()
+                pending.setdefault(path, (None, 0))
+
+            now = time.time()
+            for path, (signature, since) in list(pending.items()):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    del pending[path]
+                    continue
+                current = (stat.st_size, stat.st_mtime)
+                if current != signature:
+                    pending[path] = (current, now)
+                elif now - since >= settle:
+                    del pending[path]
+                    if submitted.get(path) != current:
+                        submitted[path] = current
+                        submit(path)
+            time.sleep(min(1.0, poll_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+
+def main():
+    # Set up command-line argument parsing
+    parser = argparse.ArgumentParser(description="Convert .wav files to .mp4 files with a still image as the video track.")
+    parser.add_argument("--audio-folder", default=AUDIO_FOLDER, help="The folder containing the .wav files.")
+    parser.add_argument("--image", default=IMAGE_PATH, help="The still image used as the video background.")
+    parser.add_argument("--output-folder", default=OUTPUT_FOLDER, help="Where to write the .mp4 files.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="The number of ffmpeg processes running at once (default: one per core).")
+    parser.add_argument("--reencode", action="store_true", help="Encode the image with libx264 for every file, as before, instead of reusing one still track.")
+    parser.add_argument("--force", action="store_true", help="Convert even when the .mp4 is newer than its .wav.")
+    parser.add_argument("--delete-wav", action="store_true", help="Delete each .wav once its .mp4 has been written (e.g., for _merged08.py --audio-policy keep-for-mp4).")
+    parser.add_argument("--watch", action="store_true", help="Keep running and convert new .wav files as they are written.")
+    parser.add_argument("--settle", type=float, default=5.0, help="In watch mode, seconds a .wav must stay unchanged before it is converted.")
+    parser.add_argument("--stall-timeout", type=float, default=STALL_TIMEOUT, help="Kill and retry an ffmpeg whose position has not advanced for this many seconds.")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="In watch mode without watchdog, seconds between folder listings.")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_folder, exist_ok=True)
+
+    if args.reencode:
+        convert = lambda wav_path, output_path: convert_wav_to_mp4(wav_path, args.image, output_path, args.stall_timeout)
+    else:
+        try:
+            still_path = encode_still_track(args.image, args.output_folder, args.stall_timeout)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ ffmpeg failed encoding the still track from {args.image}:\n{e.stderr.decode()}")
+            exit(1)
+        convert = lambda wav_path, output_path: mux_wav_with_still(wav_path, still_path, output_path, args.stall_timeout)
+
+    # Each job is an ffmpeg process, so threads are enough to keep one process per core busy
+    started = time.time()
+    lock = threading.Lock()
+    counts = {"converted": 0, "skipped": 0, "failed": 0}
+    in_flight = set()
+
+    def run(wav_path, output_path):
+        # An exception would end up unseen in the executor's future, so it is reported and counted here
+        try:
+            ok = convert_atomically(convert, wav_path, output_path)
+            if ok:
+                print(f"Converted: {os.path.basename(wav_path)} -> {os.path.basename(output_path)}")
+                # The .mp4 is the audio's last consumer
+                if args.delete_wav:
+                    os.remove(wav_path)
+        except Exception as e:
+            print(f"❌ Converting {wav_path} failed: {e}")
+            ok = False
+        finally:
+            with lock:
+                in_flight.discard(wav_path)
+        with lock:
+            counts["converted" if ok else "failed"] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+
+        def submit(wav_path):
+            output_path = output_path_for(wav_path, args.output_folder)
+            with lock:
+                if wav_path in in_flight:
+                    return
+                if not args.force and is_current(wav_path, output_path):
+                    counts["skipped"] += 1
+                    return
+                in_flight.add(wav_path)
+            executor.submit(run, wav_path, output_path)
 
+        if args.watch:
+            watch(args.audio_folder, submit, args.settle, args.poll_interval)
+            print("Stopping: waiting for the conversions in progress.")
+        else:
+            # Loop through all .wav files in the folder
+            for filename in sorted(os.listdir(args.audio_folder)):
+                if filename.endswith(".wav"):
+                    submit(os.path.join(args.audio_folder, filename))
 
-# Loop through all .wav files in the folder
-for filename in os.listdir(AUDIO_FOLDER):
-    if filename.endswith(".wav"):
-        wav_path = os.path.join(AUDIO_FOLDER, filename)
-        output_filename = os.path.splitext(filename)[0] + ".mp4"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+    print(f"✅ Batch conversion complete: {counts['converted']} converted, {counts['skipped']} already current, "
+          f"{counts['failed']} failed in {time.time() - started:.1f} seconds ({stall_count()} stalled ffmpeg runs killed).")
 
-        print(f"Converting: {filename} -> {output_filename}")
-        convert_wav_to_mp4(wav_path, IMAGE_PATH, output_path)
 
-print("✅ Batch conversion complete.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import errno
+import os
+import threading
+import time
+
+import pytest
+
+import _artifacts
+from _artifacts import SpoolGate, finish_audio
+
+
+def write(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * size)
+
+
+def admit(gate, video_id, timeout=5.0):
+    """Run gate.acquire in a thread and return how long it took, or None if it did not return within timeout."""
+    started = time.monotonic()
+    thread = threading.Thread(target=gate.acquire, args=(video_id, 1), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return None if thread.is_alive() else time.monotonic() - started
+
+
+def test_idle_gate_ignores_audio_nobody_frees(tmp_path):
+    write(tmp_path / "left.wav", 10_000)
+    gate = SpoolGate([str(tmp_path), str(tmp_path / "temp")], 1000, wait_on=[str(tmp_path / "temp")], poll_interval=0.05)
+    assert admit(gate, "a") is not None
+
+
+def test_idle_gate_waits_for_the_queue_to_drain(tmp_path):
+    queue = tmp_path / "temp"
+    write(queue / "q.wav", 10_000)
+    gate = SpoolGate([str(tmp_path), str(queue)], 1000, wait_on=[str(queue)], poll_interval=0.05)
+    threading.Timer(0.3, os.remove, args=(queue / "q.wav",)).start()
+    waited = admit(gate, "a")
+    assert waited is not None and waited >= 0.25
+
+
+def test_idle_gate_gives_up_on_a_queue_that_does_not_shrink(tmp_path):
+    # No converter running: the queue never drains
+    queue = tmp_path / "temp"
+    write(queue / "q.wav", 10_000)
+    gate = SpoolGate([str(tmp_path), str(queue)], 1000, wait_on=[str(queue)], poll_interval=0.05, idle_wait=0.3)
+    waited = admit(gate, "a")
+    assert waited is not None and waited >= 0.25
+
+
+def test_busy_gate_waits_for_a_release(tmp_path):
+    gate = SpoolGate([str(tmp_path)], _artifacts.WAV_BYTES_PER_SECOND * 1.5, poll_interval=0.05)
+    gate.acquire("a", 1)
+    threading.Timer(0.3, gate.release, args=("a",)).start()
+    waited = admit(gate, "b")
+    assert waited is not None and waited >= 0.25
+
+
+def test_keep_for_mp4_moves_across_filesystems(tmp_path, monkeypatch):
+    wav_path = tmp_path / "abc.wav"
+    write(wav_path, 1000)
+    replace = os.replace
+
+    def cross_device(source, destination):
+        if str(source) == str(wav_path):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        replace(source, destination)
+
+    monkeypatch.setattr(_artifacts.os, "replace", cross_device)
+    finish_audio(str(wav_path), "keep-for-mp4", str(tmp_path / "media"))
+    assert not wav_path.exists()
+    assert (tmp_path / "media" / "abc.wav").stat().st_size == 1000
+    assert not (tmp_path / "media" / "abc.wav.part").exists()
+
+
+def test_move_failing_for_another_reason_keeps_the_wav(tmp_path, monkeypatch):
+    wav_path = tmp_path / "abc.wav"
+    write(wav_path, 1000)
+
+    def denied(source, destination):
+        raise PermissionError(errno.EACCES, "Permission denied")
+
+    monkeypatch.setattr(_artifacts.os, "replace", denied)
+    with pytest.raises(PermissionError):
+        finish_audio(str(wav_path), "keep-for-mp4", str(tmp_path / "media"))
+    assert wav_path.exists()
@@ -0,0 +1,48 @@
+from _kg_bundle import Bundle, GRAPH_FIELD_SEP
+
+
+def video_kg(video_id, description, weight=1.0, entity_type="person"):
+    return {
+        "chunks": [{"content": f"transcript of {video_id}", "source_id": video_id}],
+        "entities": [
+            {"entity_name": "Max Gulhane MD", "entity_type": entity_type, "description": description, "source_id": video_id},
+            {"entity_name": video_id, "entity_type": "video", "description": f"video {video_id}", "source_id": video_id},
+        ],
+        "relationships": [
+            {"src_id": "Max Gulhane MD", "tgt_id": "YouTube", "description": description, "keywords": "channel,platform",
+             "weight": weight, "source_id": video_id},
+        ],
+    }
+
+
+def test_bundle_merges_duplicates_with_sep():
+    bundle = Bundle()
+    bundle.add(video_kg("a", "A doctor"))
+    bundle.add(video_kg("b", "A doctor", weight=2.0, entity_type="organization"))
+    bundle.add(video_kg("c", "A podcaster", entity_type="person"))
+    kg = bundle.custom_kg()
+
+    assert len(kg["chunks"]) == 3
+    entities = {entity["entity_name"]: entity for entity in kg["entities"]}
+    assert set(entities) == {"Max Gulhane MD", "a", "b", "c"}
+    channel = entities["Max Gulhane MD"]
+    assert channel["source_id"] == GRAPH_FIELD_SEP.join(["a", "b", "c"])
+    # Repeated descriptions are kept once
+    assert channel["description"] == GRAPH_FIELD_SEP.join(["A doctor", "A podcaster"])
+    assert channel["entity_type"] == "person"
+
+    [relationship] = kg["relationships"]
+    assert relationship["weight"] == 4.0
+    assert relationship["keywords"] == "channel,platform"
+    assert relationship["source_id"] == GRAPH_FIELD_SEP.join(["a", "b", "c"])
+    assert (bundle.items_in, bundle.items_out) == (9, 5)
+
+
+def test_bundle_does_not_change_its_inputs():
+    kg = video_kg("a", "A doctor")
+    bundle = Bundle()
+    bundle.add(kg)
+    bundle.add(video_kg("b", "A podcaster"))
+    bundle.custom_kg()
+    assert kg["entities"][0]["source_id"] == "a"
+    assert kg["relationships"][0]["weight"] == 1.0
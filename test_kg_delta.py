@@ -0,0 +1,38 @@
+import json
+
+from _kg_delta import compute_delta, export_delta, load_state
+
+
+def write_kg(path, entities, chunks=("chunk",)):
+    kg = {
+        "chunks": [{"content": content, "source_id": path.stem} for content in chunks],
+        "entities": [{"entity_name": name, "description": description, "source_id": path.stem} for name, description in entities],
+        "relationships": [],
+    }
+    path.write_text(json.dumps(kg), encoding="utf-8")
+    return str(path)
+
+
+def test_delta_reports_added_changed_and_removed(tmp_path):
+    first = write_kg(tmp_path / "a_metadata.json", [("Max", "A doctor"), ("Sleep", "A topic")])
+    second = write_kg(tmp_path / "b_metadata.json", [("Insulin", "A hormone")])
+    delta, state = compute_delta([first, second], load_state(str(tmp_path / ".kg_state.json")))
+    assert delta["summary"] == {"added": 5, "changed": 0, "removed": 0}
+
+    # Changed description, removed entity, removed file, new entity
+    write_kg(tmp_path / "a_metadata.json", [("Max", "A physician"), ("Fasting", "A topic")])
+    delta, state = compute_delta([first], state)
+    assert delta["summary"] == {"added": 1, "changed": 1, "removed": 3}
+    assert [entity["entity_name"] for entity in delta["entities"]] == ["Max", "Fasting"]
+    assert delta["chunks"] == []
+    assert sorted(item["entity_name"] for item in delta["removed"]["entities"]) == ["Insulin", "Sleep"]
+    assert delta["removed"]["chunks"] == [{"source_id": "b_metadata", "index": 0}]
+
+
+def test_export_writes_nothing_when_unchanged(tmp_path):
+    kg_file = write_kg(tmp_path / "a_metadata.json", [("Max", "A doctor")])
+    state_path = str(tmp_path / ".kg_state.json")
+    output_dir = tmp_path / "deltas"
+    assert export_delta([kg_file], state_path, str(output_dir)) is not None
+    assert export_delta([kg_file], state_path, str(output_dir)) is None
+    assert len(list(output_dir.iterdir())) == 1
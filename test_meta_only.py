@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from _meta_only import read_header, expand_inputs, generate_metadata_json
+
+METADATA = {"channelName": "Max Gulhane MD", "videoTitle": "Insulin, sleep and \"fasting\"", "url": "https://www.youtube.com/watch?v=abc", "videoPostDate": "2024-05-01T00:00:00Z"}
+SEGMENTS = [{"id": i, "start": i * 2.5, "end": i * 2.5 + 2.0, "text": f" segment {i}", "speaker": "Max"} for i in range(50)]
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 4096])
+def test_read_header_across_blocks(tmp_path, block_size):
+    path = tmp_path / "abc.json"
+    path.write_text(json.dumps({"language": "en", "metadata": METADATA, "text": "text", "segments": SEGMENTS}, indent=4), encoding="utf-8")
+    assert read_header(path, block_size=block_size) == {"language": "en", "metadata": METADATA}
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 4096])
+def test_read_header_of_raw_whisper_output(tmp_path, block_size):
+    # Raw Whisper output has no metadata and ends with 'language'
+    path = tmp_path / "abc.json"
+    path.write_text(json.dumps({"text": "text", "segments": SEGMENTS, "language": "en"}), encoding="utf-8")
+    assert read_header(path, block_size=block_size) == {"language": "en"}
+
+
+def test_read_header_of_truncated_file(tmp_path):
+    path = tmp_path / "abc.json"
+    path.write_text(json.dumps({"language": "en", "metadata": METADATA})[:-20], encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        read_header(path, block_size=7)
+
+
+def test_batch_inputs_leave_out_state_files(tmp_path):
+    transcript = {"language": "en", "metadata": METADATA, "text": "text", "segments": SEGMENTS}
+    (tmp_path / "dQw4w9WgXcQ.json").write_text(json.dumps(transcript), encoding="utf-8")
+    (tmp_path / "dQw4w9WgXcQ.filtered.json").write_text(json.dumps(transcript), encoding="utf-8")
+    (tmp_path / "dQw4w9WgXcQ_metadata.json").write_text("{}", encoding="utf-8")
+    for name in ("kg_state.json", "memory_stats.json", "boilerplate_report.json"):
+        (tmp_path / name).write_text(json.dumps({"observations": []}), encoding="utf-8")
+    assert expand_inputs([str(tmp_path)]) == [str(tmp_path / "dQw4w9WgXcQ.json")]
+
+
+def test_other_json_with_a_video_id_name_is_ignored(tmp_path):
+    # calibration.json has 11 characters before .json, like a video id
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({"cpus": 8, "workers": 2, "threads": 4, "trials": []}), encoding="utf-8")
+    assert generate_metadata_json(str(path), str(tmp_path), template_mtime=0) == "ignored"
+    assert not (tmp_path / "calibration_metadata.json").exists()
@@ -0,0 +1,33 @@
+from _speakers import assign_word_speakers, split_segments_by_speaker
+
+TURNS = [(0.0, 5.0, "SPEAKER_00"), (5.5, 9.0, "SPEAKER_01"), (8.5, 12.0, "SPEAKER_00")]
+
+
+def test_words_get_the_speaker_they_overlap_most():
+    starts = [0.5, 4.6, 6.0, 8.6, 10.0]
+    ends = [1.0, 5.4, 7.0, 9.0, 11.0]
+    assert assign_word_speakers(starts, ends, TURNS) == ["SPEAKER_00", "SPEAKER_00", "SPEAKER_01", "SPEAKER_00", "SPEAKER_00"]
+
+
+def test_words_in_gaps_keep_the_previous_speaker():
+    # 5.1-5.4 falls between the turns: the turn which ended last before it is SPEAKER_00's.
+    # 12.5-13.0 is after every turn, and -1.0 before any: the first turn's speaker.
+    assert assign_word_speakers([5.1, 12.5, -1.0], [5.4, 13.0, -0.5], TURNS) == ["SPEAKER_00", "SPEAKER_00", "SPEAKER_00"]
+
+
+def test_words_without_turns_are_unknown():
+    assert assign_word_speakers([0.0, 1.0], [0.5, 1.5], []) == ["Unknown", "Unknown"]
+
+
+def test_segments_are_split_at_speaker_changes():
+    words = [{"word": " Hello", "start": 4.0, "end": 4.5}, {"word": " there.", "start": 4.5, "end": 4.9},
+             {"word": " Hi", "start": 6.0, "end": 6.5}, {"word": " Max.", "start": 6.5, "end": 7.0}]
+    segments = [{"id": 0, "start": 4.0, "end": 7.0, "text": " Hello there. Hi Max.", "avg_logprob": -0.2, "words": words}]
+    split = split_segments_by_speaker(segments, TURNS, "SPEAKER_00", "Max")
+    assert [(segment["text"], segment["speaker"]) for segment in split] == [(" Hello there.", "Max"), (" Hi Max.", "SPEAKER_01")]
+    assert [segment["parent_id"] for segment in split] == [0, 0]
+    assert split[1]["avg_logprob"] == -0.2
+
+    # Splitting again with other turns starts from the joined Whisper segment
+    again = split_segments_by_speaker(split, [(0.0, 10.0, "SPEAKER_00")], "SPEAKER_00", "Max")
+    assert [(segment["text"], segment["speaker"]) for segment in again] == [(" Hello there. Hi Max.", "Max")]